@@ -1,18 +1,62 @@
-from fastapi import FastAPI, UploadFile, Form
+from __future__ import annotations
+from fastapi import FastAPI, UploadFile, Form, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
 import uvicorn
 import os
-import pandas as pd
-from ml.app2 import treinar_modelo, avaliar_modelo, prever_novos_dados, carregar_modelo, normalizar_minmax, baixar_binario_do_blob
-from ml.azure_utils import upload_bytes
-from io import BytesIO
+from ml.sob_demanda import importar_sob_demanda
+from ml.azure_utils import (
+    upload_bytes_async, fechar_clientes_async, estatisticas_cache_modelos,
+    nova_sessao, sessao_valida, limpar_sessoes_expiradas, download_em_blocos,
+)
+from ml.registro import modelo_atual, listar_versoes, reverter_modelo, estatisticas_registro
+from ml.armazenamento import obter_armazenamento, url_valida
+from ml.codec import criptografar_bytes, descriptografar_blocos
+from ml.formato import serializar_dataframe
+from ml.validacao import CV_N_SPLITS, PRECISAO_DADOS
+from ml.graficos import GRAFICO_MODO, publicar_figura, iniciar_matplotlib
+from ml.cache_resultados import (
+    cache_ativo, chave_resultado, resumo_dados, impressao_modelo, obter_resultado,
+    guardar_modelo, guardar_resultado, estatisticas_cache_resultados,
+)
+from ml.telemetria import (
+    TELEMETRIA_ATIVA, medir, observar, iniciar_requisicao, server_timing, exportar_prometheus,
+)
+from jobs import GerenciadorJobs, FilaCheia, STATUS_FINAIS
+from estaticos import ArquivosEstaticos
+from ingestao import ErroIngestao, ler_csv_incremental
+from microlote import MicroLote, EstatisticasLatencia
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from azure.core.exceptions import ResourceNotFoundError
 from pathlib import Path
+import tempfile
+import mimetypes
+import hashlib
+from functools import partial
+import zlib
+import time
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# As bibliotecas pesadas (pandas, scikit-learn, matplotlib) só carregam no
+# primeiro uso, o que deixa a inicialização de cada instância bem mais rápida
+pd = importar_sob_demanda("pandas")
+app2 = importar_sob_demanda("ml.app2")
+streaming = importar_sob_demanda("ml.streaming")
 
 BASE_DIR = Path(__file__).parent
-FRONTEND_DIR = BASE_DIR / "frontend"
+# Pasta do frontend: FRONTEND_DIR, senão backend/frontend (imagem do deploy) ou ../frontend (repositório)
+FRONTEND_DIR = Path(os.getenv("FRONTEND_DIR") or next(
+    (pasta for pasta in (BASE_DIR / "frontend", BASE_DIR.parent / "frontend") if pasta.is_dir()),
+    BASE_DIR / "frontend",
+))
+# Faz o aquecimento (bibliotecas de ML, matplotlib) logo depois de subir, em segundo plano
+AQUECIMENTO = os.getenv("AQUECIMENTO", "0").lower() in ("1", "true", "sim")
 
 app = FastAPI(title="Projeto Integrador ML", version="1.0.0")
 
@@ -30,155 +74,500 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Servir arquivos estáticos do frontend
-app.mount("/static", StaticFiles(directory=FRONTEND_DIR), name="static")
+# Mede cada requisição (histograma por rota) e devolve as etapas medidas
+# durante ela no cabeçalho Server-Timing
+@app.middleware("http")
+async def medir_requisicao(request: Request, call_next):
+    if not TELEMETRIA_ATIVA:
+        return await call_next(request)
+    etapas = iniciar_requisicao()
+    inicio = time.perf_counter()
+    response = await call_next(request)
+    duracao = time.perf_counter() - inicio
+    rota = request.scope.get("route")
+    observar("http_requisicao_duracao_segundos", duracao, metodo=request.method,
+             rota=getattr(rota, "path", "desconhecida"), status=response.status_code)
+    response.headers["Server-Timing"] = server_timing(etapas, duracao)
+    return response
+
+# Servir arquivos estáticos do frontend (da memória, com ETag e gzip/brotli)
+estaticos = ArquivosEstaticos(FRONTEND_DIR)
+
+@app.get("/static/{nome:path}")
+def servir_estatico(nome: str, request: Request):
+    return estaticos.responder(nome, request)
 
 @app.get("/", response_class=HTMLResponse)
-def serve_index():
-    # Lendo o HTML
-    index_path = FRONTEND_DIR / "index.html"
-    with open(index_path, "r", encoding="utf-8") as f:
-        html_content = f.read()
-    return HTMLResponse(html_content)
+def serve_index(request: Request):
+    # O HTML é sempre revalidado (pelo ETag) para pegar versões novas na hora
+    return estaticos.responder("index.html", request, cache_control="no-cache")
+
+# Fila de jobs que executa treino, avaliação e previsão fora do event loop
+gerenciador_jobs = GerenciadorJobs()
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "message": "API está funcionando"}
+    return {
+        "status": "healthy", "message": "API está funcionando", "jobs_ativos": gerenciador_jobs.ativos(),
+        "armazenamento": obter_armazenamento().nome,
+    }
+
+# Cabeçalho com o ID da sessão (workspace) de cada usuário
+CABECALHO_SESSAO = "X-Sessao-Id"
+# Intervalo entre as limpezas de sessões expiradas (0 desliga)
+SESSOES_INTERVALO_LIMPEZA = int(os.getenv("SESSOES_INTERVALO_LIMPEZA", 3600))
+
+# Lê o ID da sessão do cabeçalho (ou do parâmetro ?sessao=); sem ele, cria uma nova
+def obter_sessao(request: Request) -> str:
+    sessao = request.headers.get(CABECALHO_SESSAO) or request.query_params.get("sessao")
+    if sessao is None:
+        return nova_sessao()
+    if not sessao_valida(sessao):
+        raise HTTPException(status_code=400, detail="ID de sessão inválido.")
+    return sessao
+
+# Igual ao obter_sessao, mas para rotas que só fazem sentido numa sessão existente
+def exigir_sessao(request: Request) -> str:
+    if not (request.headers.get(CABECALHO_SESSAO) or request.query_params.get("sessao")):
+        raise HTTPException(status_code=400, detail=f"Informe o cabeçalho {CABECALHO_SESSAO}.")
+    return obter_sessao(request)
+
+# Sessão informada (validada) ou None, sem criar uma nova
+def sessao_opcional(request: Request) -> Optional[str]:
+    if not (request.headers.get(CABECALHO_SESSAO) or request.query_params.get("sessao")):
+        return None
+    return obter_sessao(request)
+
+# Tarefa que apaga periodicamente as sessões sem uso
+async def limpar_sessoes_periodicamente():
+    while True:
+        await asyncio.sleep(SESSOES_INTERVALO_LIMPEZA)
+        try:
+            await asyncio.to_thread(limpar_sessoes_expiradas)
+        except Exception as e:
+            logger.error(f"Error cleaning expired sessions: {e}")
+
+@app.on_event("startup")
+async def iniciar_limpeza_sessoes():
+    if SESSOES_INTERVALO_LIMPEZA > 0:
+        app.state.tarefa_limpeza = asyncio.create_task(limpar_sessoes_periodicamente())
+
+# Função que mostra os contadores de acerto/erro dos caches
+@app.get("/cache/")
+def estatisticas_cache():
+    return {
+        "modelos": estatisticas_cache_modelos(), "resultados": estatisticas_cache_resultados(),
+        "registro": estatisticas_registro(),
+    }
+
+# Métricas no formato do Prometheus (durações por etapa e por rota, bytes e linhas)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metricas_prometheus():
+    return PlainTextResponse(exportar_prometheus(), media_type="text/plain; version=0.0.4")
 
 # Função que criptografa os dados
 def criptografar_df(df: pd.DataFrame) -> bytes:
-    buffer = BytesIO()
-    df.to_csv(buffer, index=False)
-    dados = buffer.getvalue()
-    criptografado = bytes([(b + 1) % 256 for b in dados])
-    return criptografado
+    # Grava no formato configurado (colunar por padrão) e cifra o binário
+    with medir("criptografia", linhas=len(df)) as etapa:
+        dados = criptografar_bytes(serializar_dataframe(df))
+        etapa.bytes = len(dados)
+    return dados
+
+# Lê o CSV enviado em pedaços, já separando X e y e validando no caminho
+# (campo inexistente ou coluna não numérica param a leitura com ErroIngestao).
+# `campos` é o campo alvo ou uma lista deles (y com uma coluna por alvo).
+# Com `dtype`, todas as colunas são lidas nesse tipo (ex.: PRECISAO_DADOS).
+async def ingerir_csv(file: UploadFile, campos=None, dtype=None):
+    await file.seek(0)
+    return await asyncio.to_thread(ler_csv_incremental, file.file, campos, dtype=dtype)
+
+# Função que criptografa e grava os DataFrames no Blob, com os uploads em paralelo
+async def persistir_async(dataframes: dict, sessao: str = None):
+    async def gravar(blob_name, df):
+        dados = await asyncio.to_thread(criptografar_df, df)
+        await upload_bytes_async(dados, blob_name, "uploads", sessao=sessao)
+    await asyncio.gather(*(gravar(blob_name, df) for blob_name, df in dataframes.items()))
+
+# Carrega as bibliotecas de ML e prepara o matplotlib antes do primeiro pedido
+def aquecer():
+    inicio = time.perf_counter()
+    app2.treinar_modelo, streaming.treinar_modelo_streaming, pd.DataFrame
+    iniciar_matplotlib()
+    logger.info(f"Warm-up finished in {time.perf_counter() - inicio:.2f}s")
+
+@app.on_event("startup")
+async def iniciar_aquecimento():
+    if AQUECIMENTO:
+        app.state.tarefa_aquecimento = asyncio.create_task(asyncio.to_thread(aquecer))
+
+# Fecha o cliente assíncrono do Blob e a fila de jobs ao desligar
+@app.on_event("shutdown")
+async def fechar_conexoes():
+    tarefa_limpeza = getattr(app.state, "tarefa_limpeza", None)
+    if tarefa_limpeza is not None:
+        tarefa_limpeza.cancel()
+    gerenciador_jobs.encerrar()
+    await fechar_clientes_async()
+
+# Monta a função do job: roda a etapa de ML e espera a gravação no Blob terminar
+def criar_job_ml(funcao, mensagem: str, persistencia: asyncio.Task, chave_cache: str = None,
+                 cache_modelo: bool = False):
+    loop = asyncio.get_running_loop()
+
+    async def aguardar_persistencia():
+        await persistencia
+
+    def executar(*args, progresso=None, **kwargs):
+        resultado = funcao(*args, progresso=progresso, **kwargs)
+        asyncio.run_coroutine_threadsafe(aguardar_persistencia(), loop).result()
+        return montar_resultado(resultado, mensagem, progresso, kwargs.get("sessao"), chave_cache, cache_modelo)
+    return executar
+
+# Resposta do job: as métricas na hora e o gráfico conforme o GRAFICO_MODO
+# ("async" deixa o grafico_url para uma tarefa posterior do job). Com chave de
+# cache, o gráfico e as métricas também ficam guardados para pedidos repetidos.
+def montar_resultado(resultado: dict, mensagem: str, progresso=None, sessao: str = None,
+                     chave_cache: str = None, cache_modelo: bool = False) -> dict:
+    metricas = resultado["metricas"]
+    resposta = {"message": mensagem, "metricas": metricas}
+    if chave_cache and cache_modelo:
+        guardar_modelo(chave_cache, sessao)
+
+    if GRAFICO_MODO == "desligado":
+        if chave_cache:
+            guardar_resultado(chave_cache, metricas, com_modelo=cache_modelo)
+        resposta["grafico_url"] = None
+        return resposta
+
+    if chave_cache:
+        renderizar = partial(guardar_resultado, chave_cache, metricas, resultado["figura"],
+                             resultado["nome_grafico"], cache_modelo)
+    else:
+        renderizar = partial(publicar_figura, resultado["figura"], resultado["nome_grafico"], sessao)
+    if GRAFICO_MODO == "async":
+        resposta["posteriores"] = {"grafico_url": renderizar}
+    else:
+        if progresso is not None:
+            progresso(0.95, "Gerando gráfico")
+        resposta["grafico_url"] = renderizar()
+    return resposta
+
+# Corpo da resposta com o ID do job para acompanhar em /jobs/{id}
+def resposta_job(job, sessao: str, mensagem: str, status_code: int) -> JSONResponse:
+    corpo = {
+        "message": mensagem,
+        "job_id": job.id,
+        "sessao": sessao,
+        # Com a sessão na URL, qualquer worker acha o estado gravado do job
+        "status_url": f"/jobs/{job.id}?sessao={sessao}",
+        "stream_url": f"/jobs/{job.id}/stream?sessao={sessao}",
+    }
+    if job.resultado is not None:
+        corpo["status"] = job.status
+        corpo["resultado"] = job.resultado
+    return JSONResponse(corpo, status_code=status_code, headers={CABECALHO_SESSAO: sessao})
+
+# Submete o job e responde com o ID para acompanhar em /jobs/{id}. Com a fila
+# cheia, cancela a `persistencia` do pedido: criada sem nenhum await antes
+# daqui, ela ainda não começou, e nada do pedido recusado vai para o Blob.
+def submeter_job(tipo: str, executar, *args, sessao: str, persistencia: asyncio.Task = None,
+                 **kwargs) -> JSONResponse:
+    try:
+        job = gerenciador_jobs.submeter(tipo, executar, *args, sessao=sessao, **kwargs)
+    except FilaCheia as e:
+        if persistencia is not None:
+            persistencia.cancel()
+        return JSONResponse({"error": str(e)}, status_code=503)
+    return resposta_job(job, sessao, "Processamento iniciado.", 202)
+
+# Chave de cache do treino/avaliação (None com o cache desligado)
+def chave_cache(tipo: str, dados, **parametros):
+    if not cache_ativo():
+        return None
+    with medir("cache_chave"):
+        return chave_resultado(tipo, resumo_dados(dados), precisao=PRECISAO_DADOS, **parametros)
+
+# A avaliação depende também do modelo da sessão; sem modelo, não usa o cache
+def chave_cache_avaliacao(dados, campo: str, sessao: str):
+    if not cache_ativo():
+        return None
+    try:
+        modelo = modelo_atual(sessao)
+    except Exception:
+        return None
+    with medir("cache_chave"):
+        return chave_resultado("avaliacao", resumo_dados(dados), campo=campo, modelo=impressao_modelo(modelo),
+                               precisao=PRECISAO_DADOS)
+
+# Se o mesmo pedido já foi processado, responde na hora com o resultado guardado
+async def responder_do_cache(chave: str, tipo: str, mensagem: str, sessao: str):
+    if chave is None:
+        return None
+    resultado = await asyncio.to_thread(obter_resultado, chave, sessao)
+    if resultado is None:
+        return None
+    job = gerenciador_jobs.registrar_concluido(tipo, {"message": mensagem, "cache": True, **resultado}, sessao)
+    return resposta_job(job, sessao, mensagem, 200)
+
+# Uploads acima desse tamanho são treinados em modo streaming (em blocos)
+STREAMING_LIMIAR_BYTES = int(float(os.getenv("STREAMING_LIMIAR_MB", 200)) * 1024 * 1024)
+
+# Copia o upload para um arquivo temporário próprio (o UploadFile é fechado
+# quando a resposta sai, mas o job continua lendo o arquivo depois disso)
+# (o hash do conteúdo é calculado durante a cópia, para a chave do cache)
+async def copiar_upload(file: UploadFile):
+    destino = tempfile.TemporaryFile()
+    resumo = hashlib.sha256()
+    with medir("upload_recebimento") as etapa:
+        while bloco := await file.read(1024 * 1024):
+            destino.write(bloco)
+            resumo.update(bloco)
+            etapa.bytes += len(bloco)
+    destino.seek(0)
+    return destino, resumo
+
+# Job do treino em streaming: lê o CSV em blocos e fecha o arquivo no final
+def executar_treino_streaming(arquivo, campo: str, progresso=None, chave_cache: str = None, **kwargs):
+    try:
+        resultado = streaming.treinar_modelo_streaming(arquivo, campo, progresso=progresso, **kwargs)
+        return montar_resultado(resultado, "Modelo treinado com sucesso!", progresso, kwargs.get("sessao"),
+                                chave_cache, cache_modelo=True)
+    finally:
+        arquivo.close()
+
+# Treina sem carregar o CSV inteiro na memória
+async def treinar_em_streaming(file: UploadFile, campo: str, n_splits: int, sessao: str):
+    arquivo, resumo = await copiar_upload(file)
+    colunas = await asyncio.to_thread(streaming.ler_colunas, arquivo)
+    if campo not in colunas:
+        arquivo.close()
+        return JSONResponse({"error": f"Campo '{campo}' não encontrado no CSV."}, status_code=400)
+    chave = chave_cache("treino", resumo, campo=[campo], n_splits=n_splits)
+    resposta = await responder_do_cache(chave, "treino", "Modelo treinado com sucesso!", sessao)
+    if resposta is not None:
+        arquivo.close()
+        return resposta
+    resposta = submeter_job("treino", executar_treino_streaming, arquivo, campo, sessao=sessao, n_splits=n_splits,
+                            chave_cache=chave)
+    if resposta.status_code != 202:
+        arquivo.close()
+    return resposta
 
 # Função da parte 1 - Mostrar confiança
 @app.post("/upload/")
-async def upload_csv(file: UploadFile, campo: str = Form(...)):
+async def upload_csv(file: UploadFile, campo: List[str] = Form(...), n_splits: int = Form(CV_N_SPLITS),
+                     streaming: bool = Form(False), sessao: str = Depends(obter_sessao)):
     try:
-        # Recebendo o arquivo
-        file_content = await file.read()
-        df = pd.read_csv(BytesIO(file_content))
-
-        # Checando se o usuário passou um campo válido
-        if campo not in df.columns:
-            return JSONResponse({"error": f"Campo '{campo}' não encontrado no CSV."}, status_code=400)
-
-        # Separando em X e y
-        y = df[[campo]]
-        X = df.drop(columns=[campo])
-
-        # Aplicando a criptografia
-        X_bin = criptografar_df(X)
-        y_bin = criptografar_df(y)
-
-        # Jogando pro Blob
-        upload_bytes(X_bin, "X.bin", "uploads")
-        upload_bytes(y_bin, "y.bin", "uploads")
-
-        # Treinando e pegando o URL do gráfico
-        grafico_url = treinar_modelo("X.bin", "y.bin")
-
-        # Retornando um Feedback
-        return JSONResponse({
-            "message": "Modelo treinado com sucesso!",
-            "grafico_url": grafico_url
-        })
+        # Vários alvos: o campo repetido no formulário (campo=a&campo=b), treinados juntos
+        campos = list(dict.fromkeys(campo))
+
+        # CSVs grandes (ou com streaming=true) não são lidos inteiros na memória
+        if streaming or (file.size or 0) > STREAMING_LIMIAR_BYTES:
+            if len(campos) > 1:
+                return JSONResponse({"error": "O treino em streaming aceita um campo alvo por vez."}, status_code=400)
+            return await treinar_em_streaming(file, campos[0], n_splits, sessao)
+
+        # Recebendo o arquivo e separando em X e y (checa os campos e os tipos),
+        # já na precisão usada no treino
+        X, y, resumo = await ingerir_csv(file, campos, PRECISAO_DADOS)
+
+        # Mesmo arquivo com os mesmos parâmetros: devolve o resultado guardado
+        chave = chave_cache("treino", resumo, campo=campos, n_splits=n_splits)
+        resposta = await responder_do_cache(chave, "treino", "Modelo treinado com sucesso!", sessao)
+        if resposta is not None:
+            return resposta
+
+        # Criptografa e joga pro Blob em segundo plano
+        persistencia = asyncio.create_task(persistir_async({"X.bin": X, "y.bin": y}, sessao))
+
+        # Treinando direto com os dados em memória (o job retorna o URL do gráfico)
+        executar = criar_job_ml(app2.treinar_modelo, "Modelo treinado com sucesso!", persistencia, chave, cache_modelo=True)
+        return submeter_job("treino", executar, X, y, sessao=sessao, persistencia=persistencia, n_splits=n_splits)
+    except ErroIngestao as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 # Função da parte 2 - Avaliar com dados novos
 @app.post("/avaliar/")
-async def avaliar_csv(file: UploadFile, campo: str = Form(...)):
+async def avaliar_csv(file: UploadFile, campo: str = Form(...), sessao: str = Depends(obter_sessao)):
     try:
-        # Recebe e abre o novo arquivo
-        file_content = await file.read()
-        df = pd.read_csv(BytesIO(file_content))
-
-        # Checa se o campo que o usuário passou é válido
-        if campo not in df.columns:
-            return JSONResponse({"error": f"Campo '{campo}' não existe no CSV."}, status_code=400)
-
-        # Separa em X e y
-        y = df[[campo]]
-        X = df.drop(columns=[campo])
-
-        # Criptografa
-        X_bin = criptografar_df(X)
-        y_bin = criptografar_df(y)
-
-        # Faz upload
-        upload_bytes(X_bin, "X_avaliacao.bin", "uploads")
-        upload_bytes(y_bin, "y_avaliacao.bin", "uploads")
-
-        # Aplica o modelo nos dados e salva o URL do gráfico gerado
-        grafico_url = avaliar_modelo("X_avaliacao.bin", "y_avaliacao.bin")
-
-        # Retorna um feedback
-        return JSONResponse({
-            "message": "Avaliação realizada com sucesso!",
-            "grafico_url": grafico_url
-        })
+        # Recebe o novo arquivo e separa em X e y (checa o campo e os tipos)
+        X, y, resumo = await ingerir_csv(file, campo, PRECISAO_DADOS)
+
+        # Mesmos dados avaliados com o mesmo modelo: devolve o resultado guardado
+        chave = await asyncio.to_thread(chave_cache_avaliacao, resumo, campo, sessao)
+        resposta = await responder_do_cache(chave, "avaliacao", "Avaliação realizada com sucesso!", sessao)
+        if resposta is not None:
+            return resposta
+
+        # Criptografa e faz upload em segundo plano
+        persistencia = asyncio.create_task(
+            persistir_async({"X_avaliacao.bin": X, "y_avaliacao.bin": y}, sessao)
+        )
+
+        # Aplica o modelo nos dados em memória (o job retorna o URL do gráfico)
+        executar = criar_job_ml(app2.avaliar_modelo, "Avaliação realizada com sucesso!", persistencia, chave)
+        return submeter_job("avaliacao", executar, X, y, sessao=sessao, persistencia=persistencia)
+    except ErroIngestao as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 # Função da parte 3 - Prever com dados
 @app.post("/prever/")
-async def prever_csv(file: UploadFile):
+async def prever_csv(file: UploadFile, sessao: str = Depends(obter_sessao)):
     try:
-        # Recebendo e lendo o arquivo
-        file_content = await file.read()
-        df = pd.read_csv(BytesIO(file_content))
-
-        # Criptografando
-        X_bin = criptografar_df(df)
-        # Dando upload no Blob
-        upload_bytes(X_bin, "X_previsao.bin", "uploads")
-
-        # Aplicando dados no modelo e salvando o URL do gráfico
-        grafico_url = prever_novos_dados("X_previsao.bin")
-
-        # Mostrando um feedback
-        return JSONResponse({
-            "message": "Previsão concluída!",
-            "grafico_url": grafico_url
-        })
+        # Recebendo e lendo o arquivo (checa os tipos)
+        df, _, _ = await ingerir_csv(file)
+
+        # Criptografando e dando upload no Blob em segundo plano
+        persistencia = asyncio.create_task(persistir_async({"X_previsao.bin": df}, sessao))
+
+        # Aplicando dados no modelo (o job só conclui depois do X_previsao.bin
+        # estar salvo, pois o /prever/csv/ lê ele)
+        executar = criar_job_ml(app2.prever_novos_dados, "Previsão concluída!", persistencia)
+        return submeter_job("previsao", executar, df, sessao=sessao, persistencia=persistencia)
+    except ErroIngestao as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+# Função que consulta o status e o resultado de um job
+@app.get("/jobs/{job_id}")
+def status_job(job_id: str, sessao: Optional[str] = Depends(sessao_opcional)):
+    estado = gerenciador_jobs.obter_estado(job_id, sessao)
+    if estado is None:
+        return JSONResponse({"error": "Job não encontrado."}, status_code=404)
+    return estado
+
+# Função que transmite o progresso do job (Server-Sent Events) até ele terminar
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, sessao: Optional[str] = Depends(sessao_opcional)):
+    job = gerenciador_jobs.obter(job_id)
+    if job is None and await asyncio.to_thread(gerenciador_jobs.obter_estado, job_id, sessao) is None:
+        return JSONResponse({"error": "Job não encontrado."}, status_code=404)
+
+    async def eventos():
+        versao, anterior = -1, None
+        while True:
+            # Job de outro worker: acompanha o estado gravado na sessão
+            if job is None:
+                dados = await asyncio.to_thread(gerenciador_jobs.obter_estado, job_id, sessao)
+                if dados is None:
+                    return
+            elif job.versao != versao:
+                versao = job.versao
+                dados = job.para_dict()
+            else:
+                dados = anterior
+            if dados is not None and dados != anterior:
+                anterior = dados
+                yield f"data: {json.dumps(dados, ensure_ascii=False)}\n\n"
+                # Só termina depois das tarefas posteriores (ex.: o gráfico)
+                if dados["status"] in STATUS_FINAIS and dados["pendentes"] == 0:
+                    return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
 # Função pra disponibilizar o CSV com as previsões para dowload no front
 @app.get("/prever/csv/")
-async def download_previsao_csv():
+def download_previsao_csv(request: Request, gzip: Optional[bool] = None, sessao: str = Depends(exigir_sessao)):
     try:
-        '''from ml.app2 import carregar_modelo, normalizar_minmax, baixar_binario_do_blob
-        import pandas as pd'''
-        
-        # Pegando os arquivos
-        X_previsao = baixar_binario_do_blob("X_previsao.bin")
-        modelo = carregar_modelo("modelo_final.pkl")
-        
-        # Fazendo a previsão
-        X_norm = normalizar_minmax(X_previsao)
-        previsoes = modelo.predict(X_norm)
-        
-        # Juntando os valores preditos com os dados vindos do cliente para dowload
-        df_completo = X_previsao.copy()
-        df_completo['previsao'] = previsoes
-        
-        # Converte para CSV
-        csv_content = df_completo.to_csv(index=False)
-        
-        # Retorna o CSV para download
-        return Response(
-            content=csv_content,
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=previsoes.csv"}
-        )
-        
+        # Pegando o CSV que o /prever/ já gerou (sem refazer a previsão)
+        try:
+            tamanho, blocos = download_em_blocos(app2.BLOB_PREVISOES, "uploads", sessao=sessao)
+        except ResourceNotFoundError:
+            app2.recalcular_previsoes(sessao)
+            tamanho, blocos = download_em_blocos(app2.BLOB_PREVISOES, "uploads", sessao=sessao)
+        blocos = descriptografar_blocos(blocos)
+
+        headers = {"Content-Disposition": "attachment; filename=previsoes.csv", "Vary": "Accept-Encoding"}
+        # Se o cliente aceita gzip (ou pediu ?gzip=true), manda o arquivo comprimido como está
+        if gzip is None:
+            gzip = "gzip" in request.headers.get("accept-encoding", "")
+        if gzip:
+            headers["Content-Encoding"] = "gzip"
+            headers["Content-Length"] = str(tamanho)
+        else:
+            blocos = descomprimir_gzip(blocos)
+
+        # Retorna o CSV para download em blocos
+        return StreamingResponse(blocos, media_type="text/csv", headers=headers)
+
     except Exception as e:
         return JSONResponse({"error": f"Erro ao gerar CSV: {str(e)}"}, status_code=500)
 
+# Arquivos dos armazenamentos local e em memória, pelos URLs assinados que o
+# download_arquivo gera (no Azure quem serve é o próprio Blob, com SAS)
+@app.get("/files/{container}/{blob_name:path}")
+def servir_arquivo(container: str, blob_name: str, expira: int, assinatura: str):
+    armazenamento = obter_armazenamento()
+    if armazenamento.nome == "azure":
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado.")
+    if not url_valida(container, blob_name, expira, assinatura):
+        raise HTTPException(status_code=403, detail="URL inválido ou expirado.")
+    try:
+        tamanho, blocos = armazenamento.download_em_blocos(blob_name, container)
+    except ResourceNotFoundError:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado.")
+    tipo = mimetypes.guess_type(blob_name)[0] or "application/octet-stream"
+    return StreamingResponse(blocos, media_type=tipo, headers={
+        "Content-Length": str(tamanho), "Cache-Control": "private, max-age=3600",
+    })
+
+# Descomprime um fluxo gzip bloco a bloco
+def descomprimir_gzip(blocos):
+    descompressor = zlib.decompressobj(wbits=31)
+    for bloco in blocos:
+        dados = descompressor.decompress(bloco)
+        if dados:
+            yield dados
+    yield descompressor.flush()
+
+# Linhas enviadas para a previsão online (um dicionário coluna -> valor por linha)
+class PedidoPrevisao(BaseModel):
+    linhas: List[Dict[str, Optional[float]]]
+
+# Pedidos simultâneos da mesma sessão (e com as mesmas colunas) viram um único predict
+micro_lote = MicroLote(lambda chave, X: app2.prever_linhas(X, sessao=chave[0]))
+latencias_predict = EstatisticasLatencia()
+
+# Previsão online em JSON, usando o modelo em cache
+@app.post("/predict")
+async def prever_json(pedido: PedidoPrevisao, sessao: str = Depends(exigir_sessao)):
+    inicio = time.perf_counter()
+    if not pedido.linhas:
+        raise HTTPException(status_code=400, detail="Envie pelo menos uma linha.")
+    X = pd.DataFrame.from_records(pedido.linhas).astype(float)
+    previsoes = await micro_lote.executar((sessao, tuple(X.columns)), X)
+    latencias_predict.registrar(time.perf_counter() - inicio)
+    return {"sessao": sessao, "previsoes": [float(v) for v in previsoes]}
+
+# Percentis de latência do /predict e tamanho médio dos micro-lotes
+@app.get("/predict/estatisticas")
+def estatisticas_predict():
+    return {"latencia": latencias_predict.percentis(), "micro_lote": micro_lote.estatisticas()}
+
+# Versões do modelo guardadas na sessão (a mais recente primeiro) e qual está em uso
+@app.get("/modelo/versoes")
+def versoes_modelo(sessao: str = Depends(exigir_sessao)):
+    return {"sessao": sessao, **listar_versoes(sessao)}
+
+# Volta o modelo da sessão para uma versão anterior (por padrão, a última antes
+# da atual). Os workers trocam para ela na próxima revalidação, sem reiniciar.
+@app.post("/modelo/reverter")
+def reverter_versao_modelo(versao: Optional[str] = None, sessao: str = Depends(exigir_sessao)):
+    try:
+        atual = reverter_modelo(sessao, versao)
+    except ResourceNotFoundError:
+        raise HTTPException(status_code=404, detail="Nenhum modelo publicado nesta sessão.")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"sessao": sessao, "atual": atual}
+
 # Função para resetar tudo
 @app.post("/reset/")
 async def resetar_modelo():
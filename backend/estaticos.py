@@ -0,0 +1,70 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+from pathlib import Path
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só há a variante gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Arquivos menores que isso não compensam ser comprimidos
+TAMANHO_MINIMO_COMPRESSAO = 512
+
+
+# Um arquivo do frontend já lido, com as variantes comprimidas prontas
+class Arquivo:
+    def __init__(self, caminho: Path):
+        self.conteudo = caminho.read_bytes()
+        self.tipo = mimetypes.guess_type(caminho.name)[0] or "application/octet-stream"
+        if self.tipo.startswith("text/") or self.tipo in ("application/javascript", "image/svg+xml"):
+            self.tipo += "; charset=utf-8"
+        self.etag = f'"{hashlib.sha256(self.conteudo).hexdigest()[:32]}"'
+        self.variantes = {}
+        if len(self.conteudo) >= TAMANHO_MINIMO_COMPRESSAO:
+            if brotli is not None:
+                self.variantes["br"] = brotli.compress(self.conteudo, quality=11)
+            self.variantes["gzip"] = gzip.compress(self.conteudo, compresslevel=9, mtime=0)
+
+
+# Serve os arquivos do frontend da memória: lidos e comprimidos uma vez na
+# inicialização, com ETag (304 quando o navegador já tem a versão) e Cache-Control
+class ArquivosEstaticos:
+    def __init__(self, pasta: Path, cache_control: str = "public, max-age=3600"):
+        self.pasta = Path(pasta)
+        self.cache_control = cache_control
+        self.arquivos = {}
+        if not self.pasta.is_dir():
+            logger.warning(f"Frontend directory not found: {self.pasta}")
+            return
+        for caminho in sorted(self.pasta.rglob("*")):
+            if caminho.is_file():
+                self.arquivos[caminho.relative_to(self.pasta).as_posix()] = Arquivo(caminho)
+        logger.info(f"Static files cached: {len(self.arquivos)} from {self.pasta}")
+
+    def responder(self, nome: str, request: Request, cache_control: str = None) -> Response:
+        arquivo = self.arquivos.get(nome)
+        if arquivo is None:
+            return Response("Arquivo não encontrado.", status_code=404, media_type="text/plain; charset=utf-8")
+
+        headers = {
+            "ETag": arquivo.etag,
+            "Cache-Control": cache_control or self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if arquivo.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+
+        conteudo = arquivo.conteudo
+        aceitas = request.headers.get("accept-encoding", "")
+        for codificacao in ("br", "gzip"):
+            if codificacao in arquivo.variantes and codificacao in aceitas:
+                conteudo = arquivo.variantes[codificacao]
+                headers["Content-Encoding"] = codificacao
+                break
+        return Response(conteudo, media_type=arquivo.tipo, headers=headers)
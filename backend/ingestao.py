@@ -0,0 +1,139 @@
+from __future__ import annotations
+import os
+import hashlib
+from io import BytesIO
+import numpy as np
+from ml.sob_demanda import importar_sob_demanda
+from ml.telemetria import medir
+
+pd = importar_sob_demanda("pandas")
+
+# Quanto do upload é lido e convertido por vez
+INGESTAO_BLOCO_BYTES = int(float(os.getenv("INGESTAO_BLOCO_MB", 1)) * 1024 * 1024)
+
+
+# Erro nos dados enviados (vira 400 na API)
+class ErroIngestao(ValueError):
+    pass
+
+
+# Lê o CSV à medida que os pedaços do upload chegam: só linhas completas são
+# convertidas (o resto espera o próximo pedaço), o cabeçalho e os tipos são
+# validados bloco a bloco e o hash do conteúdo é calculado no caminho. Assim
+# o arquivo bruto nunca fica inteiro na memória e um campo inexistente ou
+# uma coluna com texto param a leitura na hora. `campos` são as colunas alvo
+# (uma ou várias), separadas de X. Com `dtype` (ex.: "float32") todas as
+# colunas são lidas com esse tipo (esquema explícito, sem inferência por bloco).
+class LeitorCSVIncremental:
+    def __init__(self, campos=None, dtype=None):
+        campos = [campos] if isinstance(campos, str) else list(campos or [])
+        # Sem repetidos, mantendo a ordem pedida
+        self.campos = list(dict.fromkeys(campos))
+        self.dtype = dtype
+        self.esquema = None
+        self.resumo = hashlib.sha256()
+        self.colunas = None
+        self.bytes = 0
+        self.linhas = 0
+        self._resto = b""
+        self._blocos = []
+
+    def alimentar(self, pedaco: bytes):
+        self.resumo.update(pedaco)
+        self.bytes += len(pedaco)
+        dados = self._resto + pedaco
+        if self.colunas is None:
+            fim = dados.find(b"\n")
+            if fim < 0:
+                self._resto = dados
+                return
+            self._ler_cabecalho(dados[:fim + 1])
+            dados = dados[fim + 1:]
+        corte = _fim_ultima_linha(dados)
+        self._resto = dados[corte:]
+        if corte:
+            self._converter(dados[:corte])
+
+    # Fecha a última linha (sem \n no final) e devolve (X, y); sem campos, y é None
+    def finalizar(self):
+        if self.colunas is None:
+            if not self._resto.strip():
+                raise ErroIngestao("O CSV está vazio.")
+            self._ler_cabecalho(self._resto)
+            self._resto = b""
+        if self._resto.strip():
+            self._converter(self._resto)
+        self._resto = b""
+        colunas_X = [c for c in self.colunas if c not in self.campos]
+        X = self._juntar(colunas_X)
+        y = self._juntar(self.campos) if self.campos else None
+        self._blocos = []
+        return X, y
+
+    def _ler_cabecalho(self, linha: bytes):
+        try:
+            self.colunas = pd.read_csv(BytesIO(linha), nrows=0).columns.tolist()
+        except (ValueError, pd.errors.ParserError) as e:
+            raise ErroIngestao(f"Cabeçalho do CSV inválido: {e}") from e
+        for campo in self.campos:
+            if campo not in self.colunas:
+                raise ErroIngestao(f"Campo '{campo}' não encontrado no CSV.")
+        if self.dtype is not None:
+            self.esquema = dict.fromkeys(self.colunas, self.dtype)
+
+    def _ler(self, dados: bytes, esquema):
+        try:
+            return pd.read_csv(BytesIO(dados), header=None, names=self.colunas, dtype=esquema)
+        except (ValueError, pd.errors.ParserError) as e:
+            raise ErroIngestao(f"CSV inválido perto da linha {self.linhas + 2}: {e}") from e
+
+    def _converter(self, dados: bytes):
+        try:
+            bloco = self._ler(dados, self.esquema)
+        except ErroIngestao:
+            if self.esquema is None:
+                raise
+            # Com o esquema o pandas só diz que um valor não converteu: relê
+            # o bloco sem ele para apontar a coluna com problema
+            bloco = self._ler(dados, None)
+        if bloco.empty:
+            return
+        nao_numericas = bloco.select_dtypes(exclude=[np.number]).columns.tolist()
+        for campo in self.campos:
+            if campo in nao_numericas:
+                raise ErroIngestao(f"Campo alvo '{campo}' não é numérico.")
+        if nao_numericas:
+            raise ErroIngestao(f"Variáveis não numéricas: {nao_numericas}")
+        if self.esquema is not None:
+            bloco = bloco.astype(self.esquema)
+        self._blocos.append(bloco)
+        self.linhas += len(bloco)
+
+    # Junta as colunas dos blocos direto no DataFrame final (sem montar o
+    # DataFrame completo e depois separar X e y, que copiaria tudo de novo)
+    def _juntar(self, colunas: list):
+        if not self._blocos:
+            return pd.DataFrame(columns=colunas)
+        return pd.DataFrame({c: np.concatenate([bloco[c].to_numpy() for bloco in self._blocos]) for c in colunas})
+
+
+# Posição logo depois do último \n que não está dentro de aspas (um campo
+# entre aspas pode ter quebra de linha)
+def _fim_ultima_linha(dados: bytes) -> int:
+    fim = dados.rfind(b"\n")
+    while fim >= 0 and dados.count(b'"', 0, fim) % 2:
+        fim = dados.rfind(b"\n", 0, fim)
+    return fim + 1
+
+
+# Lê o upload em pedaços, convertendo o CSV enquanto lê. Devolve (X, y, resumo)
+# com o hash sha256 do arquivo (para a chave do cache). Roda numa thread.
+def ler_csv_incremental(arquivo, campos=None, tamanho_bloco: int = INGESTAO_BLOCO_BYTES, dtype=None):
+    leitor = LeitorCSVIncremental(campos, dtype)
+    with medir("csv_ingestao") as etapa:
+        while pedaco := arquivo.read(tamanho_bloco):
+            leitor.alimentar(pedaco)
+        X, y = leitor.finalizar()
+        etapa.bytes = leitor.bytes
+        etapa.linhas = leitor.linhas
+    return X, y, leitor.resumo
@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from azure.core.exceptions import ResourceNotFoundError
+from ml.azure_utils import upload_bytes, download_bytes
+
+logger = logging.getLogger(__name__)
+
+# Configuração do pool de execução dos jobs de ML
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", 2))
+JOBS_MAX_PENDENTES = int(os.getenv("JOBS_MAX_PENDENTES", 16))
+JOBS_TTL_SEGUNDOS = int(os.getenv("JOBS_TTL_SEGUNDOS", 3600))
+# Threads das tarefas feitas depois do resultado (ex.: gráficos)
+JOBS_WORKERS_POSTERIORES = int(os.getenv("JOBS_WORKERS_POSTERIORES", 1))
+# Threads que gravam o estado inicial dos jobs (fora do event loop)
+JOBS_WORKERS_ESTADO = int(os.getenv("JOBS_WORKERS_ESTADO", 2))
+# Intervalo mínimo (s) entre gravações do estado só por mudança de progresso
+JOBS_INTERVALO_PERSISTENCIA = float(os.getenv("JOBS_INTERVALO_PERSISTENCIA", 1))
+
+# O estado de cada job também é gravado na sessão (jobs/<id>.json), para o
+# /jobs/{id} funcionar em qualquer worker/instância e não só no processo que
+# executa o job. Vai embora junto com a sessão quando ela expira.
+PREFIXO_JOBS = "jobs/"
+_ID_JOB = re.compile(r"^[0-9a-f]{32}$")
+
+STATUS_PENDENTE = "pendente"
+STATUS_EXECUTANDO = "executando"
+STATUS_CONCLUIDO = "concluido"
+STATUS_ERRO = "erro"
+STATUS_FINAIS = (STATUS_CONCLUIDO, STATUS_ERRO)
+
+
+class FilaCheia(Exception):
+    pass
+
+
+# Estado de um job (treino, avaliação ou previsão)
+class Job:
+    def __init__(self, tipo: str, sessao: str = None):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.sessao = sessao
+        self.status = STATUS_PENDENTE
+        self.progresso = 0.0
+        self.etapa = "Na fila"
+        self.resultado = None
+        self.erro = None
+        # Tarefas posteriores (ex.: gráfico) que ainda vão completar o resultado
+        self.pendentes = 0
+        self.criado_em = time.time()
+        self.atualizado_em = self.criado_em
+        # Incrementa a cada mudança (usado pelo stream de progresso)
+        self.versao = 0
+        self._lock = threading.Lock()
+        # Uma gravação por vez: a última sempre leva o estado mais novo
+        self._lock_salvar = threading.Lock()
+        self._salvo_em = 0.0
+
+    def atualizar(self, **campos):
+        with self._lock:
+            for nome, valor in campos.items():
+                setattr(self, nome, valor)
+            self.atualizado_em = time.time()
+            self.versao += 1
+        # Só progresso/etapa: grava no máximo a cada JOBS_INTERVALO_PERSISTENCIA
+        self.salvar(forcar=not set(campos) <= {"progresso", "etapa"})
+
+    # Grava o estado na sessão (sem sessão, o job fica só neste processo).
+    # Faz I/O no armazenamento: nunca chamar do event loop.
+    def salvar(self, forcar: bool = True):
+        if self.sessao is None:
+            return
+        with self._lock_salvar:
+            agora = time.monotonic()
+            if not forcar and agora - self._salvo_em < JOBS_INTERVALO_PERSISTENCIA:
+                return
+            self._salvo_em = agora
+            try:
+                upload_bytes(json.dumps(self.para_dict(), ensure_ascii=False).encode(),
+                             f"{PREFIXO_JOBS}{self.id}.json", "uploads", sessao=self.sessao,
+                             content_type="application/json")
+            except Exception as e:
+                logger.warning(f"Could not save job state {self.id}: {e}")
+
+    # Callback passado para as funções de ML informarem o andamento
+    def informar_progresso(self, progresso: float, etapa: str):
+        self.atualizar(progresso=round(min(max(progresso, 0.0), 1.0), 3), etapa=etapa)
+
+    @property
+    def finalizado(self) -> bool:
+        return self.status in STATUS_FINAIS
+
+    # Finalizado e sem nenhuma tarefa posterior em andamento
+    @property
+    def encerrado(self) -> bool:
+        return self.finalizado and self.pendentes == 0
+
+    # Preenche um campo do resultado quando uma tarefa posterior termina
+    def completar_resultado(self, campo: str, valor=None, erro: str = None):
+        estado = {"status": STATUS_ERRO, "erro": erro} if erro else {"status": STATUS_CONCLUIDO}
+        with self._lock:
+            self.resultado = {
+                **self.resultado, campo: valor,
+                "posteriores": {**self.resultado["posteriores"], campo: estado},
+            }
+            self.pendentes -= 1
+            self.atualizado_em = time.time()
+            self.versao += 1
+        self.salvar()
+
+    def para_dict(self) -> dict:
+        with self._lock:
+            dados = {
+                "job_id": self.id,
+                "tipo": self.tipo,
+                "status": self.status,
+                "progresso": self.progresso,
+                "etapa": self.etapa,
+                "pendentes": self.pendentes,
+                "criado_em": self.criado_em,
+                "atualizado_em": self.atualizado_em,
+            }
+            if self.resultado is not None:
+                dados["resultado"] = self.resultado
+            if self.erro is not None:
+                dados["erro"] = self.erro
+            return dados
+
+
+# Fila limitada de jobs executados num pool de threads
+class GerenciadorJobs:
+    def __init__(self, max_workers: int = JOBS_MAX_WORKERS, max_pendentes: int = JOBS_MAX_PENDENTES,
+                 ttl_segundos: int = JOBS_TTL_SEGUNDOS):
+        self.max_pendentes = max_pendentes
+        self.ttl_segundos = ttl_segundos
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._executor_posterior = ThreadPoolExecutor(max_workers=JOBS_WORKERS_POSTERIORES,
+                                                      thread_name_prefix="jobs-posteriores")
+        self._executor_estado = ThreadPoolExecutor(max_workers=JOBS_WORKERS_ESTADO, thread_name_prefix="jobs-estado")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    # Quantos jobs ainda não terminaram (na fila ou executando)
+    def ativos(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finalizado)
+
+    # Agenda `funcao(*args, progresso=..., **kwargs)` e retorna o job criado.
+    # Se o resultado tiver "posteriores" ({campo: funcao}), o job conclui na hora
+    # e cada campo é preenchido em segundo plano quando a funcao terminar.
+    # O `sessao` dos kwargs (se houver) também diz onde o estado do job é gravado.
+    # Chamado dos handlers async: a primeira gravação do estado vai para uma
+    # thread, para não travar o event loop com o I/O do armazenamento.
+    def submeter(self, tipo: str, funcao, *args, **kwargs) -> Job:
+        self.limpar_expirados()
+        job = Job(tipo, kwargs.get("sessao"))
+        with self._lock:
+            ativos = sum(1 for j in self._jobs.values() if not j.finalizado)
+            if ativos >= self.max_pendentes:
+                raise FilaCheia(f"Fila de processamento cheia ({ativos} jobs). Tente novamente em instantes.")
+            self._jobs[job.id] = job
+        self._executor_estado.submit(job.salvar)
+        self._executor.submit(self._executar, job, funcao, args, kwargs)
+        logger.info(f"Job submitted: {job.id} ({tipo})")
+        return job
+
+    # Registra um job que já nasce concluído (ex.: resultado vindo do cache)
+    def registrar_concluido(self, tipo: str, resultado: dict, sessao: str = None) -> Job:
+        self.limpar_expirados()
+        job = Job(tipo, sessao)
+        # Ainda não compartilhado: preenche sem o atualizar (que gravaria no event loop)
+        job.status, job.progresso, job.etapa, job.resultado = STATUS_CONCLUIDO, 1.0, "Concluído", resultado
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor_estado.submit(job.salvar)
+        return job
+
+    def _executar(self, job: Job, funcao, args, kwargs):
+        job.atualizar(status=STATUS_EXECUTANDO, etapa="Iniciando")
+        try:
+            resultado = funcao(*args, progresso=job.informar_progresso, **kwargs)
+            posteriores = {}
+            if isinstance(resultado, dict) and "posteriores" in resultado:
+                posteriores = resultado["posteriores"]
+                # No resultado fica só o andamento de cada tarefa posterior
+                resultado["posteriores"] = {campo: {"status": STATUS_PENDENTE} for campo in posteriores}
+                for campo in posteriores:
+                    resultado[campo] = None
+            job.atualizar(status=STATUS_CONCLUIDO, progresso=1.0, etapa="Concluído", resultado=resultado,
+                          pendentes=len(posteriores))
+            logger.info(f"Job finished: {job.id} ({job.tipo})")
+            for campo, tarefa in posteriores.items():
+                self._executor_posterior.submit(self._executar_posterior, job, campo, tarefa)
+        except HTTPException as e:
+            job.atualizar(status=STATUS_ERRO, etapa="Erro",
+                          erro={"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"Job failed: {job.id} ({job.tipo}): {e}")
+            job.atualizar(status=STATUS_ERRO, etapa="Erro", erro={"status_code": 500, "error": str(e)})
+
+    def _executar_posterior(self, job: Job, campo: str, tarefa):
+        try:
+            job.completar_resultado(campo, tarefa())
+        except Exception as e:
+            logger.error(f"Deferred task failed: {job.id} ({campo}): {e}")
+            job.completar_resultado(campo, erro=str(e))
+
+    def obter(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    # Estado do job (dict): o deste processo ou o gravado na sessão por
+    # outro worker. None se não existir.
+    def obter_estado(self, job_id: str, sessao: str = None):
+        job = self.obter(job_id)
+        if job is not None:
+            return job.para_dict()
+        if sessao is None or not _ID_JOB.match(job_id):
+            return None
+        try:
+            return json.loads(download_bytes(f"{PREFIXO_JOBS}{job_id}.json", "uploads", sessao=sessao))
+        except ResourceNotFoundError:
+            return None
+
+    # Remove da memória os jobs finalizados há mais tempo que o TTL
+    def limpar_expirados(self):
+        limite = time.time() - self.ttl_segundos
+        with self._lock:
+            expirados = [i for i, job in self._jobs.items() if job.encerrado and job.atualizado_em < limite]
+            for job_id in expirados:
+                del self._jobs[job_id]
+
+    def encerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor_posterior.shutdown(wait=False, cancel_futures=True)
+        self._executor_estado.shutdown(wait=False, cancel_futures=True)
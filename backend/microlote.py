@@ -0,0 +1,122 @@
+from __future__ import annotations
+import os
+import asyncio
+import logging
+import threading
+from collections import deque
+import numpy as np
+from ml.sob_demanda import importar_sob_demanda
+
+pd = importar_sob_demanda("pandas")
+
+logger = logging.getLogger(__name__)
+
+# Janela em que pedidos simultâneos são juntados (0 desliga o micro-lote)
+MICROLOTE_JANELA_MS = float(os.getenv("MICROLOTE_JANELA_MS", 2))
+# Um lote é despachado na hora ao chegar nesse número de linhas
+MICROLOTE_MAX_LINHAS = int(os.getenv("MICROLOTE_MAX_LINHAS", 1024))
+# Quantas latências recentes entram no cálculo dos percentis
+LATENCIAS_AMOSTRAS = int(os.getenv("LATENCIAS_AMOSTRAS", 10000))
+
+
+# Janela deslizante das últimas latências, com percentis
+class EstatisticasLatencia:
+    def __init__(self, amostras: int = LATENCIAS_AMOSTRAS):
+        self._valores = deque(maxlen=amostras)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos: float):
+        with self._lock:
+            self._valores.append(segundos)
+            self._total += 1
+
+    def percentis(self) -> dict:
+        with self._lock:
+            valores = np.array(self._valores)
+            total = self._total
+        if not len(valores):
+            return {"pedidos": total}
+        p50, p95, p99 = np.percentile(valores, [50, 95, 99]) * 1000
+        return {
+            "pedidos": total, "amostras": len(valores),
+            "p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3),
+            "max_ms": round(float(valores.max()) * 1000, 3),
+        }
+
+
+# Junta pedidos que chegam juntos (mesma chave) em uma única chamada de
+# `funcao(chave, X) -> array`, executada numa thread. Cada pedido recebe de
+# volta só as suas linhas. Se o lote falhar, cada pedido é refeito sozinho
+# para que um pedido inválido não derrube os outros.
+class MicroLote:
+    def __init__(self, funcao, janela_ms: float = MICROLOTE_JANELA_MS, max_linhas: int = MICROLOTE_MAX_LINHAS):
+        self.funcao = funcao
+        self.janela = janela_ms / 1000
+        self.max_linhas = max_linhas
+        self._pendentes = {}
+        self._timers = {}
+        self._lotes = 0
+        self._linhas = 0
+
+    async def executar(self, chave, X: pd.DataFrame):
+        if self.janela <= 0:
+            return await asyncio.to_thread(self.funcao, chave, X)
+
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        fila = self._pendentes.setdefault(chave, [])
+        fila.append((X, futuro))
+        if sum(len(x) for x, _ in fila) >= self.max_linhas:
+            self._cancelar_timer(chave)
+            self._despachar(chave)
+        elif len(fila) == 1:
+            self._timers[chave] = loop.call_later(self.janela, self._despachar, chave)
+        return await futuro
+
+    def _cancelar_timer(self, chave):
+        timer = self._timers.pop(chave, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _despachar(self, chave):
+        self._timers.pop(chave, None)
+        itens = self._pendentes.pop(chave, [])
+        if itens:
+            asyncio.ensure_future(self._processar(chave, itens))
+
+    async def _processar(self, chave, itens):
+        self._lotes += 1
+        self._linhas += sum(len(x) for x, _ in itens)
+        if len(itens) == 1:
+            X, futuro = itens[0]
+            await self._resolver(futuro, chave, X)
+            return
+        try:
+            lote = pd.concat([x for x, _ in itens], ignore_index=True)
+            resultado = await asyncio.to_thread(self.funcao, chave, lote)
+        except Exception as e:
+            logger.info(f"Micro-batch of {len(itens)} requests failed ({e}), retrying one by one")
+            await asyncio.gather(*(self._resolver(futuro, chave, X) for X, futuro in itens))
+            return
+        inicio = 0
+        for X, futuro in itens:
+            if not futuro.done():
+                futuro.set_result(resultado[inicio:inicio + len(X)])
+            inicio += len(X)
+
+    async def _resolver(self, futuro, chave, X):
+        try:
+            resultado = await asyncio.to_thread(self.funcao, chave, X)
+        except Exception as e:
+            if not futuro.done():
+                futuro.set_exception(e)
+        else:
+            if not futuro.done():
+                futuro.set_result(resultado)
+
+    def estatisticas(self) -> dict:
+        return {
+            "janela_ms": self.janela * 1000, "max_linhas": self.max_linhas, "lotes": self._lotes,
+            "linhas_por_lote": round(self._linhas / self._lotes, 2) if self._lotes else 0.0,
+        }
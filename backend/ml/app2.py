@@ -1,26 +1,47 @@
+import gzip
+import tempfile
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import TimeSeriesSplit
-from sklearn.metrics import mean_squared_error
+from sklearn.metrics import mean_squared_error, r2_score
 from fastapi import HTTPException
-from .azure_utils import download_bytes, upload_bytes, salvar_modelo, carregar_modelo, download_arquivo
-from io import BytesIO
+from .azure_utils import download_bytes, upload_stream
+from .codec import descriptografar_bytes, EscritorCriptografado
+from .formato import desserializar_dataframe
+from .preprocessamento import (
+    EscalonadorMinMax, criar_pipeline, prever_com_modelo, montar_matriz, interpolar_no_lugar,
+)
+from .validacao import CV_N_SPLITS, validacao_cruzada_incremental, separar_alvos
+from .modelo_compacto import ModeloLinear
+from .registro import publicar_modelo, modelo_atual
+from .graficos import GRAFICO_MODO, reduzir_serie, amostrar_pontos
+from .paralelo import executar_em_ordem
+from .telemetria import medir
 
 # Função para descriptografar os dados
 def descriptografar_binario(bin_data: bytes) -> pd.DataFrame:
-    dados = bytes([(b - 1) % 256 for b in bin_data])
-    buffer = BytesIO(dados)
-    df = pd.read_csv(buffer)
+    with medir("descriptografia", bytes=len(bin_data)) as etapa:
+        dados = descriptografar_bytes(bin_data)
+        # Aceita o formato colunar e o CSV antigo
+        df = desserializar_dataframe(dados)
+        etapa.linhas = len(df)
     return df
 
 # Função que baixa o binário do Blob e descriptografa
-def baixar_binario_do_blob(blob_name: str) -> pd.DataFrame:
-    bin_data = download_bytes(blob_name, "uploads")
+def baixar_binario_do_blob(blob_name: str, sessao: str = None) -> pd.DataFrame:
+    bin_data = download_bytes(blob_name, "uploads", sessao=sessao)
     df = descriptografar_binario(bin_data)
     return df
 
+# Aceita tanto um DataFrame já em memória quanto o nome de um blob
+def obter_dataframe(origem, sessao: str = None) -> pd.DataFrame:
+    if isinstance(origem, pd.DataFrame):
+        return origem
+    return baixar_binario_do_blob(origem, sessao)
+
+MENSAGEM_AUSENTES = "Há valores ausentes no início da série (sem valor anterior para interpolar)."
+
 # Função que valida os dados
 def validar_dados(X, y):
     erros = []
@@ -36,72 +57,67 @@ def validar_dados(X, y):
 
 # Função para aplicar nomalização Min-Max
 def normalizar_minmax(X: pd.DataFrame) -> pd.DataFrame:
-    X_norm = X.copy()
-    # Pra cada campo, aplicar a min max
-    for campo in X.columns:
-        denom = X[campo].max() - X[campo].min()
-        if denom == 0 or pd.isna(denom):
-            X_norm[campo] = 0
-        else:
-            X_norm[campo] = (X[campo] - X[campo].min()) / denom
-    return X_norm
-
-# Converte os gráficos para bytes
-def figura_para_bytes(fig) -> bytes:
-    buffer = BytesIO()
-    fig.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-    buffer.seek(0)
-    return buffer.getvalue()
-
-# Função Treinar Modelo
-def treinar_modelo(X_blob="X.bin", y_blob="y.bin"):
-    # Baixa do Blob os arquivos
-    X = baixar_binario_do_blob(X_blob)
-    y = baixar_binario_do_blob(y_blob)
-    if y.ndim > 1 and y.shape[1] > 1:
-        y = y.iloc[:, 0]
-    df = pd.concat([X, y], axis=1)
-    
-    # Tapando os NA com a média do valor anterior e do próximo
-    df = df.interpolate(method='linear')
-    
-    X, y = df.iloc[:, :-1], df.iloc[:, -1]
-    # Valida os dados
-    validar_dados(X, y)
-    # Aplica normalização em X
-    X = normalizar_minmax(X)
-
-    # Fazendo o CV com 5 splits
-    tscv = TimeSeriesSplit(n_splits=5)
-    fig, axes = plt.subplots(tscv.get_n_splits() + 1, 2, figsize=(15, 5 * (tscv.get_n_splits() + 1)))
-    r2_test_lista, rmse_test_lista = [], []
-
-    for i, (train_idx, test_idx) in enumerate(tscv.split(X)):
-        # Separando em x e y train e test
-        X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
-        y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
-
-        # Aplicando o modelo linear
-        modelo = LinearRegression().fit(X_train, y_train)
-        y_pred_train = modelo.predict(X_train)
-        y_pred_test = modelo.predict(X_test)
-
-        # Calculando as métricas
-        r2_test = modelo.score(X_test, y_test)
-        rmse_test = mean_squared_error(y_test, y_pred_test) ** 0.5
-        r2_test_lista.append(r2_test)
-        rmse_test_lista.append(rmse_test)
+    # Min e max de todas as colunas em uma passada vetorizada
+    return EscalonadorMinMax().fit_transform(X)
+
+# Repassa o andamento para quem chamou (ex.: o job que está executando a função)
+def informar(progresso, fracao: float, etapa: str):
+    if progresso is not None:
+        progresso(fracao, etapa)
+
+# Séries desenhadas nos gráficos de um fold: predições do modelo do fold no
+# treino (prefixo) e no bloco de teste, já reduzidas/amostradas. `indices` é
+# crescente, então treino e teste são fatias (views) e não cópias
+def series_fold(indices, X_valores, y_valores, fold) -> dict:
+    inicio, fim = np.searchsorted(indices, [fold["inicio_teste"], fold["fim_teste"]])
+    coef = np.asarray(fold["coef"], dtype=X_valores.dtype)
+    y_pred_train = X_valores[:inicio] @ coef + fold["intercepto"]
+    y_pred_test = X_valores[inicio:fim] @ coef + fold["intercepto"]
+    return {
+        "treino": reduzir_serie(indices[:inicio], y_pred_train),
+        "teste": reduzir_serie(indices[inicio:fim], y_pred_test),
+        "dispersao": amostrar_pontos(y_valores[inicio:fim], y_pred_test),
+    }
+
+# Séries já reduzidas de todos os gráficos da validação cruzada (no máximo
+# GRAFICO_MAX_PONTOS por série). `indices` são as posições (no dataset) das
+# linhas de X_valores/y_valores, o que permite partir de uma amostra das
+# linhas. As séries de cada fold são calculadas em paralelo.
+def series_validacao(indices, X_valores, y_valores, cv) -> dict:
+    # A série real é a mesma em todos os folds: reduz uma vez só (junto com os folds)
+    tarefas = [(reduzir_serie, (indices, y_valores))]
+    tarefas += [(series_fold, (indices, X_valores, y_valores, fold)) for fold in cv["folds"]]
+    real, *folds = executar_em_ordem(tarefas)
+    return {"real": real, "folds": folds, "y_min": y_valores.min(), "y_max": y_valores.max()}
+
+# Monta a figura da validação cruzada (um par de gráficos por fold + médias)
+def figura_validacao(indices, X_valores, y_valores, cv) -> Figure:
+    return desenhar_validacao(series_validacao(indices, X_valores, y_valores, cv), cv)
+
+# Desenha a figura da validação a partir das séries já reduzidas
+def desenhar_validacao(series_cv: dict, cv) -> Figure:
+    folds = cv["folds"]
+    r2_test_lista = [fold["r2"] for fold in folds]
+    rmse_test_lista = [fold["rmse"] for fold in folds]
+    (indices_real, y_real), series = series_cv["real"], series_cv["folds"]
+    y_min, y_max = series_cv["y_min"], series_cv["y_max"]
+
+    fig = Figure(figsize=(15, 5 * (len(folds) + 1)))
+    axes = fig.subplots(len(folds) + 1, 2)
+
+    for i, (fold, serie) in enumerate(zip(folds, series)):
+        r2_test, rmse_test = fold["r2"], fold["rmse"]
 
         # Plotando os gráficos com as métricas
         ax1, ax2 = axes[i, 0], axes[i, 1]
-        ax1.plot(y.values, label='Real', color='blue')
-        ax1.plot(range(len(y_pred_train)), y_pred_train, color='red', label='Treino')
-        ax1.plot(range(len(y_pred_train), len(y_pred_train)+len(y_pred_test)), y_pred_test, color='black', label='Teste')
+        ax1.plot(indices_real, y_real, label='Real', color='blue')
+        ax1.plot(*serie["treino"], color='red', label='Treino')
+        ax1.plot(*serie["teste"], color='black', label='Teste')
         ax1.set_title(f'Fold {i+1} — Evolução temporal')
         ax1.legend(); ax1.grid(alpha=0.3)
 
-        ax2.scatter(y_test, y_pred_test, color='blue')
-        ax2.plot([y.min(), y.max()], [y.min(), y.max()], 'r--')
+        ax2.scatter(*serie["dispersao"], color='blue')
+        ax2.plot([y_min, y_max], [y_min, y_max], 'r--')
         ax2.set_title(f'Real vs Predito — Fold {i+1}')
         ax2.text(0.05, 0.95,
                  f'R²: {r2_test:.4f}\nRMSE: {rmse_test:.2f}',
@@ -118,62 +134,140 @@ def treinar_modelo(X_blob="X.bin", y_blob="y.bin"):
     ax_rmse.axhline(mean_rmse, color='red', linestyle='--', label=f'Média={mean_rmse:.2f}')
     ax_rmse.legend(); ax_rmse.grid(alpha=0.3)
 
-    plt.tight_layout()
-    
-    # Convertendo a imagem para bytes
-    img_bytes = figura_para_bytes(fig)
-    # Salvndo ela no Blob
-    upload_bytes(img_bytes, "cv_plot2.png", "uploads")
-    plt.close(fig)
-    
-    # Salva o modelo final treinado
-    modelo_final = LinearRegression().fit(X, y)
-    salvar_modelo(modelo_final, "modelo_final.pkl")
+    fig.tight_layout()
+    return fig
 
-    # Retornando o ULR da imagem
-    blob_url = download_arquivo("cv_plot2.png", "uploads")
-    return blob_url
-
-# Função Avaliar o Modelo
-def avaliar_modelo(X_blob="X_avaliacao.bin", y_blob="y_avaliacao.bin"):
-    # Recebe os arquivos binários do Blob
-    X = baixar_binario_do_blob(X_blob)
-    y = baixar_binario_do_blob(y_blob)
-    if y.ndim > 1 and y.shape[1] > 1:
-        y = y.iloc[:, 0]
-
-    df = pd.concat([X, y], axis=1)
-    
-    # Tapando os NA com a média do valor anterior e do próximo
-    df = df.interpolate(method='linear')
-    
-    X, y = df.iloc[:, :-1], df.iloc[:, -1]
-    
+# Função Treinar Modelo. `y_blob` pode ter várias colunas (uma por alvo): a
+# matriz X e as equações normais de cada fold são montadas uma vez e
+# resolvidas para todos os alvos juntos
+def treinar_modelo(X_blob="X.bin", y_blob="y.bin", sessao=None, n_splits=CV_N_SPLITS, progresso=None):
+    informar(progresso, 0.05, "Carregando dados")
+    # Usa os DataFrames recebidos ou baixa do Blob os arquivos
+    X = obter_dataframe(X_blob, sessao)
+    y = obter_dataframe(y_blob, sessao)
+    if y.ndim == 1:
+        y = y.to_frame()
+    alvos, colunas = y.columns.tolist(), X.columns
     # Valida os dados
     validar_dados(X, y)
-    # Aplica Min Max nos novos dados
-    X_norm = normalizar_minmax(X)
-    
-    # Abre o modelo treinado
+
+    # X e y vão para uma matriz contígua só (na precisão configurada): a
+    # interpolação e a normalização são feitas nela mesma e X/y são fatias
+    # dela, sem outras cópias dos dados
+    informar(progresso, 0.1, "Pré-processando")
+    with medir("interpolacao", linhas=len(X)):
+        dados = montar_matriz(X, y)
+        del X, y
+        # Tapando os NA com a média do valor anterior e do próximo
+        ausentes = interpolar_no_lugar(dados)
+    X_valores, Y_valores = dados[:, :-len(alvos)], dados[:, -len(alvos):]
+    # Ajusta a normalização em X (os limites ficam salvos junto com o modelo)
+    escalonador = EscalonadorMinMax().fit(X_valores)
+    escalonador.transformar_no_lugar(X_valores)
+    # Ausentes no início da série só sobram em X se a coluna não for constante
+    # (as constantes viram 0 na normalização)
+    if ausentes[-len(alvos):].any() or (ausentes[:-len(alvos)] & ~escalonador.constante_).any():
+        raise HTTPException(status_code=400, detail={"status": "erro_validacao", "mensagens": [MENSAGEM_AUSENTES]})
+
+    # Fazendo o CV temporal incremental: uma passada pelos dados acumula
+    # X^T X e X^T y por bloco e cada fold é resolvido sem reajustar
+    informar(progresso, 0.15, "Validação cruzada")
+    if len(alvos) == 1:
+        Y_valores = Y_valores[:, 0]
     try:
-        modelo = carregar_modelo("modelo_final.pkl")
-    except:
-        modelo = LinearRegression().fit(X_norm, y)
-        salvar_modelo(modelo, "modelo_final.pkl")
-    
-    y_pred = modelo.predict(X_norm)
-    rmse = mean_squared_error(y, y_pred) ** 0.5
-    r2 = modelo.score(X_norm, y)
+        with medir("validacao_cruzada", linhas=len(X_valores)):
+            cv = validacao_cruzada_incremental(X_valores, Y_valores, n_splits)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"status": "erro_validacao", "mensagens": [str(e)]})
+    cvs = [cv] if len(alvos) == 1 else separar_alvos(cv)
+
+    # Publica os modelos finais (todos os alvos num artefato só, o primeiro
+    # é o principal) como nova versão no registro da sessão
+    informar(progresso, 0.9, "Salvando modelo")
+    publicar_modelo(ModeloLinear.de_escalonador(
+        escalonador, [cv_alvo["coef"] for cv_alvo in cvs], [cv_alvo["intercepto"] for cv_alvo in cvs],
+        colunas, alvos,
+    ), sessao)
+
+    # Retorna as métricas e quem monta a figura (desenhada depois, ou nunca).
+    # As séries do gráfico são reduzidas aqui: a figura feita depois só guarda
+    # esses pontos, e não a matriz inteira do treino até ser desenhada
+    if len(alvos) == 1:
+        series_cv = None
+        if GRAFICO_MODO != "desligado":
+            informar(progresso, 0.92, "Preparando gráfico")
+            with medir("grafico_series", linhas=len(X_valores)):
+                series_cv = series_validacao(np.arange(len(X_valores)), X_valores, Y_valores, cv)
+        return {
+            "metricas": metricas_validacao(cv),
+            "figura": lambda: desenhar_validacao(series_cv, cv),
+            "nome_grafico": "cv_plot2",
+        }
+    return {
+        "metricas": metricas_alvos(alvos, cvs),
+        "figura": lambda: figura_alvos(alvos, cvs),
+        "nome_grafico": "cv_alvos",
+    }
 
-    # Fazendo o gráfico da avaliação com as métricas
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
-    ax1.plot(X_norm.index, y, label='Real', color='blue', linewidth=2)
-    ax1.plot(X_norm.index, y_pred, label='Predito', color='red', linewidth=2)
+# Métricas de um treino com vários alvos: as de cada alvo + um resumo comparando os alvos
+def metricas_alvos(alvos: list, cvs: list) -> dict:
+    por_alvo = {alvo: metricas_validacao(cv) for alvo, cv in zip(alvos, cvs)}
+    ordenados = sorted(alvos, key=lambda alvo: por_alvo[alvo]["r2_medio"], reverse=True)
+    return {
+        "alvos": por_alvo,
+        "resumo": {
+            "n_alvos": len(alvos),
+            "modelo_principal": alvos[0],
+            "r2_medio": float(np.mean([m["r2_medio"] for m in por_alvo.values()])),
+            "melhor_alvo": ordenados[0],
+            "pior_alvo": ordenados[-1],
+        },
+    }
+
+# Relatório conjunto dos alvos: R² de cada fold por alvo e R²/RMSE médios
+def figura_alvos(alvos: list, cvs: list) -> Figure:
+    fig = Figure(figsize=(15, 10))
+    ax_folds, ax_medias = fig.subplots(2, 1)
+    for alvo, cv in zip(alvos, cvs):
+        r2_folds = [fold["r2"] for fold in cv["folds"]]
+        ax_folds.plot(range(1, len(r2_folds) + 1), r2_folds, marker='o', label=str(alvo))
+    ax_folds.set_title('R² por fold — cada alvo')
+    ax_folds.set_xlabel('Fold'); ax_folds.set_ylabel('R²')
+    ax_folds.legend(fontsize=8, ncol=2); ax_folds.grid(alpha=0.3)
+
+    r2_medios = [float(np.mean([fold["r2"] for fold in cv["folds"]])) for cv in cvs]
+    rmse_medios = [float(np.mean([fold["rmse"] for fold in cv["folds"]])) for cv in cvs]
+    barras = ax_medias.bar(range(len(alvos)), r2_medios, color='steelblue')
+    for barra, rmse in zip(barras, rmse_medios):
+        ax_medias.annotate(f'RMSE {rmse:.2f}', (barra.get_x() + barra.get_width() / 2, barra.get_height()),
+                           ha='center', va='bottom', fontsize=8)
+    ax_medias.set_xticks(range(len(alvos)), [str(alvo) for alvo in alvos], rotation=30, ha='right')
+    ax_medias.set_title('R² médio por alvo')
+    ax_medias.set_ylabel('R² médio'); ax_medias.grid(axis='y', alpha=0.3)
+
+    fig.tight_layout()
+    return fig
+
+# Resumo das métricas da validação cruzada (vai na resposta do job)
+def metricas_validacao(cv) -> dict:
+    folds = [{"fold": i + 1, "r2": fold["r2"], "rmse": fold["rmse"]} for i, fold in enumerate(cv["folds"])]
+    return {
+        "folds": folds,
+        "r2_medio": float(np.mean([f["r2"] for f in folds])),
+        "rmse_medio": float(np.mean([f["rmse"] for f in folds])),
+    }
+
+# Figura da avaliação: evolução temporal e real vs predito
+def figura_avaliacao(indices, y, y_pred, rmse: float, r2: float) -> Figure:
+    fig = Figure(figsize=(12, 8))
+    ax1, ax2 = fig.subplots(2, 1)
+    ax1.plot(*reduzir_serie(indices, y), label='Real', color='blue', linewidth=2)
+    ax1.plot(*reduzir_serie(indices, y_pred), label='Predito', color='red', linewidth=2)
     ax1.set_title('Evolução Temporal', fontsize=13)
     ax1.set_xlabel('Índice'); ax1.set_ylabel('Var. Alvo (Y)')
     ax1.legend(); ax1.grid(True, alpha=0.3)
 
-    ax2.scatter(y, y_pred, color='blue')
+    ax2.scatter(*amostrar_pontos(y, y_pred), color='blue')
     y_min = min(y.min(), y_pred.min()); y_max = max(y.max(), y_pred.max())
     identidade_range = np.linspace(y_min, y_max, 100)
     ax2.plot(identidade_range, identidade_range, 'r--', linewidth=2)
@@ -185,47 +279,142 @@ def avaliar_modelo(X_blob="X_avaliacao.bin", y_blob="y_avaliacao.bin"):
              verticalalignment='top', fontsize=10)
     ax2.grid(True, alpha=0.3)
 
-    plt.tight_layout()
+    fig.tight_layout()
+    return fig
+
+# Figura da previsão ao longo do índice
+def figura_previsao(indices, y_pred) -> Figure:
+    fig = Figure(figsize=(12, 5))
+    ax = fig.subplots()
+    ax.plot(*reduzir_serie(indices, y_pred), label='Predição', linewidth=2, color='red')
+    ax.set_title('Predição', fontsize=13)
+    ax.set_xlabel('Índice'); ax.set_ylabel('Var. Alvo (Y)')
+    ax.legend(); ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    return fig
+
+# Função Avaliar o Modelo
+def avaliar_modelo(X_blob="X_avaliacao.bin", y_blob="y_avaliacao.bin", sessao=None, progresso=None):
+    informar(progresso, 0.05, "Carregando dados")
+    # Usa os DataFrames recebidos ou os arquivos binários do Blob
+    X = obter_dataframe(X_blob, sessao)
+    y = obter_dataframe(y_blob, sessao)
+    if y.ndim > 1:
+        y = y.iloc[:, 0]
+    campo = y.name
+
+    # Valida os dados
+    validar_dados(X, y)
+
+    # Tapando os NA com a média do valor anterior e do próximo, numa matriz
+    # contígua só (X vira uma view dela, sem concat nem cópias)
+    with medir("interpolacao", linhas=len(X)):
+        dados = montar_matriz(X, y)
+        interpolar_no_lugar(dados)
+    X = pd.DataFrame(dados[:, :-1], columns=X.columns, index=X.index, copy=False)
+    y = dados[:, -1]
     
-    # Jogando o gráfico no Blob 
-    img_bytes = figura_para_bytes(fig)
-    upload_bytes(img_bytes, "avaliacao_plot.png", "uploads")
-    plt.close(fig)
+    # Abre o modelo em uso (a normalização do treino vem junto no modelo)
+    informar(progresso, 0.3, "Aplicando o modelo")
+    try:
+        modelo = modelo_atual(sessao)
+    except:
+        pipeline = criar_pipeline(EscalonadorMinMax(), LinearRegression()).fit(X, y)
+        modelo = ModeloLinear.de_pipeline(pipeline, campo)
+        publicar_modelo(modelo, sessao)
+    
+    # Com vários alvos no modelo, usa o do campo avaliado (campo que o modelo
+    # não tem, ou colunas diferentes das do treino, é erro de validação)
+    try:
+        with medir("predicao", linhas=len(X)):
+            y_pred = prever_com_modelo(modelo, X, alvo=campo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"status": "erro_validacao", "mensagens": [str(e)]})
+    rmse = mean_squared_error(y, y_pred) ** 0.5
+    r2 = r2_score(y, y_pred)
 
-    # Recebendo o URL do gráfico do Blob e retornando ele
-    blob_url = download_arquivo("avaliacao_plot.png", "uploads")
-    return blob_url
+    # Métricas agora; o gráfico da avaliação fica para depois
+    indices = X.index.to_numpy()
+    return {
+        "metricas": {"linhas": len(y), "rmse": float(rmse), "r2": float(r2)},
+        "figura": lambda: figura_avaliacao(indices, y, y_pred, rmse, r2),
+        "nome_grafico": "avaliacao_plot",
+    }
+
+# Artefato com as previsões do /prever/ (CSV com gzip, cifrado), baixado pelo /prever/csv/
+BLOB_PREVISOES = "previsoes.csv.gz.bin"
+# Linhas convertidas para CSV por vez ao gravar o artefato
+LINHAS_POR_BLOCO_CSV = 100_000
+
+# Grava os dados enviados + a coluna de previsão, em blocos de linhas, sem montar o CSV inteiro
+def salvar_previsoes(X: pd.DataFrame, y_pred, sessao=None):
+    with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as arquivo:
+        with medir("previsoes_csv", linhas=len(X)), gzip.GzipFile(fileobj=EscritorCriptografado(arquivo), mode="wb", compresslevel=1, mtime=0) as saida:
+            for inicio in range(0, max(len(X), 1), LINHAS_POR_BLOCO_CSV):
+                fim = inicio + LINHAS_POR_BLOCO_CSV
+                bloco = X.iloc[inicio:fim].assign(previsao=y_pred[inicio:fim])
+                saida.write(bloco.to_csv(index=False, header=(inicio == 0)).encode())
+        arquivo.seek(0)
+        upload_stream(arquivo, BLOB_PREVISOES, "uploads", sessao=sessao)
+
+# Refaz o artefato a partir do X_previsao.bin (previsões feitas antes dele existir)
+def recalcular_previsoes(sessao=None):
+    X_previsao = baixar_binario_do_blob("X_previsao.bin", sessao)
+    modelo = modelo_atual(sessao)
+    y_pred = prever_com_modelo(modelo, X_previsao.interpolate(method='linear'))
+    salvar_previsoes(X_previsao, y_pred, sessao)
 
 # Função para prever novos dados
-def prever_novos_dados(X_blob="X_previsao.bin"):
+def prever_novos_dados(X_blob="X_previsao.bin", sessao=None, progresso=None):
     # Carrega modelo treinado
+    informar(progresso, 0.05, "Carregando modelo")
     try:
-        modelo = carregar_modelo("modelo_final.pkl")
+        modelo = modelo_atual(sessao)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Modelo não encontrado. Treine um modelo primeiro: {e}")
 
-    # Reebe os novos dados
-    X_novos = baixar_binario_do_blob(X_blob)
+    # Recebe os novos dados (em memória ou do Blob)
+    X_recebido = obter_dataframe(X_blob, sessao)
     # Tapando os NA com a média do valor anterior e do próximo
-    X_novos = X_novos.interpolate(method='linear')
-    # Normaliza eles
-    X_novos_norm = normalizar_minmax(X_novos)
-    # Faz o predict
-    y_pred = modelo.predict(X_novos_norm)
-
-    # Fazendo o gráfico de predição
-    fig, ax = plt.subplots(figsize=(12, 5))
-    ax.plot(X_novos_norm.index, y_pred, label='Predição', linewidth=2, color='red')
-    ax.set_title('Predição', fontsize=13)
-    ax.set_xlabel('Índice'); ax.set_ylabel('Var. Alvo (Y)')
-    ax.legend(); ax.grid(True, alpha=0.3)
-    plt.tight_layout()
+    with medir("interpolacao", linhas=len(X_recebido)):
+        X_novos = X_recebido.interpolate(method='linear')
+    # Faz o predict (normalizando com os limites do treino); coluna faltando
+    # ou ausente que a interpolação não tapou é erro nos dados, não do servidor
+    try:
+        with medir("predicao", linhas=len(X_novos)):
+            y_pred = prever_com_modelo(modelo, X_novos)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"status": "erro_validacao", "mensagens": [str(e)]})
+
+    # Guarda as previsões para o download do CSV (sem refazer o predict)
+    informar(progresso, 0.4, "Salvando previsões")
+    salvar_previsoes(X_recebido, y_pred, sessao)
 
-    # Jogando o gráfico no Blob
-    img_bytes = figura_para_bytes(fig)
-    upload_bytes(img_bytes, "prever_plot.png", "uploads")
-    plt.close(fig)
+    # Resumo das previsões agora; o gráfico fica para depois
+    indices = X_novos.index.to_numpy()
+    return {
+        "metricas": {
+            "linhas": len(y_pred), "media": float(np.mean(y_pred)),
+            "minimo": float(np.min(y_pred)), "maximo": float(np.max(y_pred)),
+        },
+        "figura": lambda: figura_previsao(indices, y_pred),
+        "nome_grafico": "prever_plot",
+    }
 
-    # Puando a URL do gráfico do Blob e retornando
-    blob_url = download_arquivo("prever_plot.png", "uploads")
-    return blob_url
+# Previsão online: aplica o modelo do cache (com o escalonador do treino) em
+# poucas linhas, sem Blob de entrada e sem gráfico
+def prever_linhas(X: pd.DataFrame, sessao=None) -> np.ndarray:
+    try:
+        modelo = modelo_atual(sessao)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Modelo não encontrado. Treine um modelo primeiro: {e}")
+    # Sem o escalonador salvo a normalização dependeria das linhas enviadas
+    # (só acontece com modelos antigos, de antes do registro)
+    if not isinstance(modelo, ModeloLinear) and not hasattr(modelo, "named_steps"):
+        raise HTTPException(status_code=409, detail="Modelo salvo sem normalização. Treine o modelo novamente.")
+    if X.isna().any().any():
+        raise HTTPException(status_code=400, detail="Há valores ausentes nas linhas enviadas.")
+    try:
+        return modelo.predict(X)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
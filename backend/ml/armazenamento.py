@@ -0,0 +1,495 @@
+import os
+import abc
+import time
+import hmac
+import asyncio
+import hashlib
+import logging
+import secrets
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import quote
+from azure.core.exceptions import ResourceNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# Onde os blobs ficam: "azure" (Azure Blob Storage), "local" (pasta no disco,
+# servida pela rota /files) ou "memoria" (dicionário no processo, para testes
+# e benchmarks)
+ARMAZENAMENTO = os.getenv("ARMAZENAMENTO", "azure").lower()
+# Pasta raiz do armazenamento local (um subdiretório por container)
+ARMAZENAMENTO_DIR = os.getenv("ARMAZENAMENTO_DIR", "armazenamento_local")
+# Prefixo dos URLs gerados pelos armazenamentos local/memória (ex.: "https://api.exemplo.com")
+ARMAZENAMENTO_URL_BASE = os.getenv("ARMAZENAMENTO_URL_BASE", "").rstrip("/")
+# Chave que assina os URLs da rota /files. Obrigatória com ARMAZENAMENTO=local:
+# com vários workers, o URL assinado por um precisa valer nos outros. O
+# armazenamento em memória vive num processo só e usa uma chave aleatória.
+ARMAZENAMENTO_CHAVE_URL = os.getenv("ARMAZENAMENTO_CHAVE_URL")
+_CHAVE_URL = ARMAZENAMENTO_CHAVE_URL or secrets.token_hex(32)
+# Validade dos URLs gerados (o SAS do Azure também vale 24 horas)
+URL_VALIDADE_SEGUNDOS = 24 * 3600
+# Tamanho dos blocos lidos no download em blocos dos armazenamentos local/memória
+TAMANHO_BLOCO_DOWNLOAD = 4 * 1024 * 1024
+
+# Credenciais do Azure (só usadas com ARMAZENAMENTO=azure)
+AZURE_STORAGE_CONNECTION_STRING = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+AZURE_STORAGE_ACCOUNT_NAME = os.getenv('AZURE_STORAGE_ACCOUNT_NAME')
+AZURE_STORAGE_ACCOUNT_KEY = os.getenv('AZURE_STORAGE_ACCOUNT_KEY')
+
+# Configuração do pool de conexões HTTP compartilhado pelo processo
+AZURE_BLOB_POOL_CONEXOES = int(os.getenv('AZURE_BLOB_POOL_CONEXOES', 20))
+AZURE_BLOB_TIMEOUT_CONEXAO = float(os.getenv('AZURE_BLOB_TIMEOUT_CONEXAO', 20))
+AZURE_BLOB_TIMEOUT_LEITURA = float(os.getenv('AZURE_BLOB_TIMEOUT_LEITURA', 120))
+
+
+# Interface dos armazenamentos. Blob inexistente sempre levanta
+# ResourceNotFoundError (a mesma exceção do SDK do Azure), assim quem chama
+# não precisa saber qual armazenamento está configurado.
+class Armazenamento(abc.ABC):
+    nome = None
+
+    @abc.abstractmethod
+    def upload_bytes(self, dados: bytes, blob_name: str, container_name: str, content_type: str = None) -> str:
+        ...
+
+    @abc.abstractmethod
+    def upload_stream(self, fluxo, blob_name: str, container_name: str) -> str:
+        ...
+
+    # Retorna (bytes, etag)
+    @abc.abstractmethod
+    def download_bytes(self, blob_name: str, container_name: str):
+        ...
+
+    @abc.abstractmethod
+    def obter_etag(self, blob_name: str, container_name: str) -> str:
+        ...
+
+    # Retorna (tamanho, iterador de blocos)
+    @abc.abstractmethod
+    def download_em_blocos(self, blob_name: str, container_name: str):
+        ...
+
+    # URL de leitura temporária do blob
+    @abc.abstractmethod
+    def gerar_url(self, blob_name: str, container_name: str) -> str:
+        ...
+
+    # Lista de {"nome", "tamanho", "ultima_escrita"} dos blobs com o prefixo
+    @abc.abstractmethod
+    def listar(self, container_name: str, prefixo: str = None) -> list:
+        ...
+
+    def existe(self, blob_name: str, container_name: str) -> bool:
+        try:
+            self.obter_etag(blob_name, container_name)
+            return True
+        except ResourceNotFoundError:
+            return False
+
+    @abc.abstractmethod
+    def container_existe(self, container_name: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def apagar(self, blob_name: str, container_name: str):
+        ...
+
+    async def upload_bytes_async(self, dados: bytes, blob_name: str, container_name: str) -> str:
+        return await asyncio.to_thread(self.upload_bytes, dados, blob_name, container_name)
+
+    async def download_bytes_async(self, blob_name: str, container_name: str) -> bytes:
+        dados, _ = await asyncio.to_thread(self.download_bytes, blob_name, container_name)
+        return dados
+
+    async def fechar(self):
+        pass
+
+
+# Assinatura dos URLs da rota /files (faz o papel do SAS nos armazenamentos sem Azure)
+def assinar_url(container_name: str, blob_name: str, expira: int) -> str:
+    mensagem = f"{container_name}/{blob_name}:{expira}".encode()
+    return hmac.new(_CHAVE_URL.encode(), mensagem, hashlib.sha256).hexdigest()
+
+
+def url_valida(container_name: str, blob_name: str, expira: int, assinatura: str) -> bool:
+    if expira < time.time():
+        return False
+    return hmac.compare_digest(assinatura, assinar_url(container_name, blob_name, expira))
+
+
+def url_arquivo(container_name: str, blob_name: str) -> str:
+    expira = int(time.time()) + URL_VALIDADE_SEGUNDOS
+    assinatura = assinar_url(container_name, blob_name, expira)
+    caminho = quote(f"{container_name}/{blob_name}")
+    return f"{ARMAZENAMENTO_URL_BASE}/files/{caminho}?expira={expira}&assinatura={assinatura}"
+
+
+# Blobs guardados num dicionário do processo (nada é persistido)
+class ArmazenamentoMemoria(Armazenamento):
+    nome = "memoria"
+
+    def __init__(self):
+        self._blobs = {}
+        self._lock = threading.Lock()
+        self._versao = 0
+
+    def _obter(self, blob_name, container_name):
+        with self._lock:
+            entrada = self._blobs.get((container_name, blob_name))
+        if entrada is None:
+            raise ResourceNotFoundError(f"Blob não encontrado: {container_name}/{blob_name}")
+        return entrada
+
+    def upload_bytes(self, dados, blob_name, container_name, content_type=None):
+        with self._lock:
+            self._versao += 1
+            self._blobs[(container_name, blob_name)] = {
+                "dados": bytes(dados), "etag": f'"{self._versao}"', "ultima_escrita": datetime.now(timezone.utc),
+            }
+        return url_arquivo(container_name, blob_name)
+
+    def upload_stream(self, fluxo, blob_name, container_name):
+        return self.upload_bytes(fluxo.read(), blob_name, container_name)
+
+    def download_bytes(self, blob_name, container_name):
+        entrada = self._obter(blob_name, container_name)
+        return entrada["dados"], entrada["etag"]
+
+    def obter_etag(self, blob_name, container_name):
+        return self._obter(blob_name, container_name)["etag"]
+
+    def download_em_blocos(self, blob_name, container_name):
+        dados = self._obter(blob_name, container_name)["dados"]
+        blocos = (dados[i:i + TAMANHO_BLOCO_DOWNLOAD] for i in range(0, len(dados), TAMANHO_BLOCO_DOWNLOAD))
+        return len(dados), blocos
+
+    def gerar_url(self, blob_name, container_name):
+        return url_arquivo(container_name, blob_name)
+
+    def listar(self, container_name, prefixo=None):
+        with self._lock:
+            itens = list(self._blobs.items())
+        return [
+            {"nome": nome, "tamanho": len(entrada["dados"]), "ultima_escrita": entrada["ultima_escrita"]}
+            for (container, nome), entrada in sorted(itens, key=lambda item: item[0])
+            if container == container_name and nome.startswith(prefixo or "")
+        ]
+
+    def container_existe(self, container_name):
+        return True
+
+    def apagar(self, blob_name, container_name):
+        with self._lock:
+            if self._blobs.pop((container_name, blob_name), None) is None:
+                raise ResourceNotFoundError(f"Blob não encontrado: {container_name}/{blob_name}")
+
+
+# Blobs como arquivos em ARMAZENAMENTO_DIR/<container>/<nome>, servidos pela rota /files
+class ArmazenamentoLocal(Armazenamento):
+    nome = "local"
+
+    def __init__(self, raiz: str = ARMAZENAMENTO_DIR):
+        if not ARMAZENAMENTO_CHAVE_URL:
+            raise ValueError("Defina ARMAZENAMENTO_CHAVE_URL para usar ARMAZENAMENTO=local "
+                             "(a mesma chave em todos os workers)")
+        self.raiz = Path(raiz).resolve()
+        self.raiz.mkdir(parents=True, exist_ok=True)
+
+    # Caminho do blob, sem deixar o nome sair da pasta do container
+    def _caminho(self, blob_name: str, container_name: str) -> Path:
+        caminho = (self.raiz / container_name / blob_name).resolve()
+        if not caminho.is_relative_to(self.raiz / container_name):
+            raise ValueError(f"Nome de blob inválido: {blob_name!r}")
+        return caminho
+
+    def _existente(self, blob_name, container_name) -> Path:
+        caminho = self._caminho(blob_name, container_name)
+        if not caminho.is_file():
+            raise ResourceNotFoundError(f"Blob não encontrado: {container_name}/{blob_name}")
+        return caminho
+
+    @staticmethod
+    def _etag(caminho: Path) -> str:
+        info = caminho.stat()
+        return f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+
+    # Grava num arquivo temporário e troca de uma vez (quem lê nunca vê o blob pela metade)
+    def _gravar(self, blob_name, container_name, escrever):
+        caminho = self._caminho(blob_name, container_name)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=caminho.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(descritor, "wb") as destino:
+                escrever(destino)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+        return url_arquivo(container_name, blob_name)
+
+    def upload_bytes(self, dados, blob_name, container_name, content_type=None):
+        return self._gravar(blob_name, container_name, lambda destino: destino.write(dados))
+
+    def upload_stream(self, fluxo, blob_name, container_name):
+        def copiar(destino):
+            while bloco := fluxo.read(TAMANHO_BLOCO_DOWNLOAD):
+                destino.write(bloco)
+        return self._gravar(blob_name, container_name, copiar)
+
+    def download_bytes(self, blob_name, container_name):
+        caminho = self._existente(blob_name, container_name)
+        return caminho.read_bytes(), self._etag(caminho)
+
+    def obter_etag(self, blob_name, container_name):
+        return self._etag(self._existente(blob_name, container_name))
+
+    def download_em_blocos(self, blob_name, container_name):
+        caminho = self._existente(blob_name, container_name)
+        arquivo = open(caminho, "rb")
+
+        def blocos():
+            with arquivo:
+                while bloco := arquivo.read(TAMANHO_BLOCO_DOWNLOAD):
+                    yield bloco
+        return os.fstat(arquivo.fileno()).st_size, blocos()
+
+    def gerar_url(self, blob_name, container_name):
+        self._existente(blob_name, container_name)
+        return url_arquivo(container_name, blob_name)
+
+    def listar(self, container_name, prefixo=None):
+        pasta = self.raiz / container_name
+        if not pasta.is_dir():
+            return []
+        blobs = []
+        for caminho in sorted(pasta.rglob("*")):
+            if not caminho.is_file() or caminho.name.startswith(".tmp-"):
+                continue
+            nome = caminho.relative_to(pasta).as_posix()
+            if prefixo and not nome.startswith(prefixo):
+                continue
+            info = caminho.stat()
+            blobs.append({
+                "nome": nome, "tamanho": info.st_size,
+                "ultima_escrita": datetime.fromtimestamp(info.st_mtime, timezone.utc),
+            })
+        return blobs
+
+    def container_existe(self, container_name):
+        return True
+
+    def apagar(self, blob_name, container_name):
+        caminho = self._existente(blob_name, container_name)
+        caminho.unlink()
+        # Remove as pastas que ficaram vazias (ex.: a de uma sessão apagada)
+        pasta_container = self.raiz / container_name
+        for pasta in caminho.parents:
+            if pasta == pasta_container or not pasta.is_relative_to(pasta_container):
+                break
+            try:
+                pasta.rmdir()
+            except OSError:
+                break
+
+
+# Azure Blob Storage (com pool de conexões e cliente assíncrono por event loop)
+class ArmazenamentoAzure(Armazenamento):
+    nome = "azure"
+
+    def __init__(self):
+        self.connection_string = AZURE_STORAGE_CONNECTION_STRING
+        self.account_name = AZURE_STORAGE_ACCOUNT_NAME
+        self.account_key = AZURE_STORAGE_ACCOUNT_KEY
+        self._cliente = None
+        self._lock_cliente = threading.Lock()
+        self._clientes_async = {}
+
+        # Log para debug
+        logger.info(f"Azure Storage Account Name: {self.account_name}")
+        logger.info(f"Azure Storage Connection String configured: {bool(self.connection_string)}")
+
+    def _exigir_configuracao(self, acao: str):
+        if not self.connection_string:
+            raise RuntimeError(f"Azure env vars missing - cannot {acao}")
+
+    # Cria o transporte síncrono com um pool de conexões reaproveitável
+    @staticmethod
+    def _criar_transporte():
+        import requests
+        from azure.core.pipeline.transport import RequestsTransport
+
+        sessao = requests.Session()
+        adaptador = requests.adapters.HTTPAdapter(
+            pool_connections=AZURE_BLOB_POOL_CONEXOES,
+            pool_maxsize=AZURE_BLOB_POOL_CONEXOES,
+        )
+        sessao.mount("https://", adaptador)
+        sessao.mount("http://", adaptador)
+        return RequestsTransport(
+            session=sessao,
+            session_owner=False,
+            connection_timeout=AZURE_BLOB_TIMEOUT_CONEXAO,
+            read_timeout=AZURE_BLOB_TIMEOUT_LEITURA,
+        )
+
+    # Retorna o cliente único do processo (criado na primeira chamada)
+    def cliente(self):
+        self._exigir_configuracao("create blob service client")
+        if self._cliente is not None:
+            return self._cliente
+        with self._lock_cliente:
+            if self._cliente is None:
+                from azure.storage.blob import BlobServiceClient
+                try:
+                    self._cliente = BlobServiceClient.from_connection_string(
+                        self.connection_string,
+                        transport=self._criar_transporte(),
+                    )
+                    logger.info(f"Blob service client created (pool={AZURE_BLOB_POOL_CONEXOES})")
+                except Exception as e:
+                    logger.error(f"Error creating blob service client: {e}")
+                    raise
+        return self._cliente
+
+    # Retorna o cliente assíncrono (azure.storage.blob.aio) do event loop atual
+    async def cliente_async(self):
+        self._exigir_configuracao("create async blob service client")
+        loop = asyncio.get_running_loop()
+        cliente = self._clientes_async.get(loop)
+        if cliente is None:
+            import aiohttp
+            from azure.core.pipeline.transport import AioHttpTransport
+            from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+
+            try:
+                sessao = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=AZURE_BLOB_POOL_CONEXOES),
+                )
+                cliente = AsyncBlobServiceClient.from_connection_string(
+                    self.connection_string,
+                    transport=AioHttpTransport(
+                        session=sessao,
+                        session_owner=True,
+                        connection_timeout=AZURE_BLOB_TIMEOUT_CONEXAO,
+                        read_timeout=AZURE_BLOB_TIMEOUT_LEITURA,
+                    ),
+                )
+                self._clientes_async[loop] = cliente
+                logger.info(f"Async blob service client created (pool={AZURE_BLOB_POOL_CONEXOES})")
+            except Exception as e:
+                logger.error(f"Error creating async blob service client: {e}")
+                raise
+        return cliente
+
+    # Fecha o cliente assíncrono do event loop atual (chamar no shutdown do app)
+    async def fechar(self):
+        cliente = self._clientes_async.pop(asyncio.get_running_loop(), None)
+        if cliente is not None:
+            await cliente.close()
+
+    def _blob(self, blob_name, container_name):
+        return self.cliente().get_blob_client(container=container_name, blob=blob_name)
+
+    def upload_bytes(self, dados, blob_name, container_name, content_type=None):
+        from azure.storage.blob import ContentSettings
+
+        self._exigir_configuracao("upload bytes")
+        blob_client = self._blob(blob_name, container_name)
+        # O tipo do conteúdo faz o navegador exibir imagens SVG pelo URL
+        content_settings = ContentSettings(content_type=content_type) if content_type else None
+        blob_client.upload_blob(dados, overwrite=True, content_settings=content_settings)
+        return blob_client.url
+
+    def upload_stream(self, fluxo, blob_name, container_name):
+        self._exigir_configuracao("upload stream")
+        blob_client = self._blob(blob_name, container_name)
+        blob_client.upload_blob(fluxo, overwrite=True)
+        return blob_client.url
+
+    def download_bytes(self, blob_name, container_name):
+        self._exigir_configuracao("download bytes")
+        download_stream = self._blob(blob_name, container_name).download_blob()
+        return download_stream.readall(), download_stream.properties.etag
+
+    def obter_etag(self, blob_name, container_name):
+        self._exigir_configuracao("get blob properties")
+        return self._blob(blob_name, container_name).get_blob_properties().etag
+
+    def download_em_blocos(self, blob_name, container_name):
+        self._exigir_configuracao("download blob")
+        download_stream = self._blob(blob_name, container_name).download_blob()
+        return download_stream.size, download_stream.chunks()
+
+    def gerar_url(self, blob_name, container_name):
+        from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+
+        self._exigir_configuracao("get file URL")
+        # Gera um token com acesso público temporário
+        sas_token = generate_blob_sas(
+            account_name=self.account_name,
+            container_name=container_name,
+            blob_name=blob_name,
+            account_key=self.account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=datetime.now(timezone.utc) + timedelta(seconds=URL_VALIDADE_SEGUNDOS),
+        )
+        return f"https://{self.account_name}.blob.core.windows.net/{container_name}/{blob_name}?{sas_token}"
+
+    def listar(self, container_name, prefixo=None):
+        if not self.connection_string:
+            return []
+        container_client = self.cliente().get_container_client(container_name)
+        return [
+            {"nome": blob.name, "tamanho": blob.size, "ultima_escrita": blob.last_modified}
+            for blob in container_client.list_blobs(name_starts_with=prefixo)
+        ]
+
+    def container_existe(self, container_name):
+        if not self.connection_string:
+            return False
+        return self.cliente().get_container_client(container_name).exists()
+
+    def apagar(self, blob_name, container_name):
+        self._exigir_configuracao("delete blob")
+        self._blob(blob_name, container_name).delete_blob()
+
+    async def upload_bytes_async(self, dados, blob_name, container_name):
+        cliente = await self.cliente_async()
+        blob_client = cliente.get_blob_client(container=container_name, blob=blob_name)
+        await blob_client.upload_blob(dados, overwrite=True)
+        return blob_client.url
+
+    async def download_bytes_async(self, blob_name, container_name):
+        cliente = await self.cliente_async()
+        blob_client = cliente.get_blob_client(container=container_name, blob=blob_name)
+        download_stream = await blob_client.download_blob()
+        return await download_stream.readall()
+
+
+ARMAZENAMENTOS = {"azure": ArmazenamentoAzure, "local": ArmazenamentoLocal, "memoria": ArmazenamentoMemoria}
+
+_armazenamento = None
+_lock_armazenamento = threading.Lock()
+
+
+# Retorna o armazenamento do processo (escolhido por ARMAZENAMENTO na primeira chamada)
+def obter_armazenamento() -> Armazenamento:
+    global _armazenamento
+    if _armazenamento is None:
+        with _lock_armazenamento:
+            if _armazenamento is None:
+                if ARMAZENAMENTO not in ARMAZENAMENTOS:
+                    raise ValueError(f"ARMAZENAMENTO inválido: {ARMAZENAMENTO!r} (use {', '.join(ARMAZENAMENTOS)})")
+                _armazenamento = ARMAZENAMENTOS[ARMAZENAMENTO]()
+                logger.info(f"Storage backend: {ARMAZENAMENTO}")
+    return _armazenamento
+
+
+# Troca o armazenamento do processo (ex.: benchmarks com o armazenamento em memória)
+def definir_armazenamento(armazenamento: Armazenamento):
+    global _armazenamento
+    with _lock_armazenamento:
+        _armazenamento = armazenamento
@@ -1,169 +1,325 @@
 import os
 import logging
-from azure.storage.blob import BlobServiceClient
+import threading
+import re
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 import pickle
-from io import BytesIO
+from .armazenamento import obter_armazenamento
+from .telemetria import medir, medido
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
-# Verifica se as variáveis existem, mas não quebra o app na importação
-AZURE_STORAGE_CONNECTION_STRING = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
-AZURE_STORAGE_ACCOUNT_NAME = os.getenv('AZURE_STORAGE_ACCOUNT_NAME') 
-AZURE_STORAGE_ACCOUNT_KEY = os.getenv('AZURE_STORAGE_ACCOUNT_KEY')
-
-# Log para debug
-logger.info(f"Azure Storage Account Name: {AZURE_STORAGE_ACCOUNT_NAME}")
-logger.info(f"Azure Storage Connection String configured: {bool(AZURE_STORAGE_CONNECTION_STRING)}")
+# As funções daqui são a fachada do armazenamento configurado em ARMAZENAMENTO
+# (ml/armazenamento.py): Azure Blob, pasta local ou memória. Os nomes e a
+# interface continuam os do Azure (blob, container) para quem chama.
 
+# Retorna o cliente do Azure (só com ARMAZENAMENTO=azure)
 def get_blob_service_client():
-    if not AZURE_STORAGE_CONNECTION_STRING:
-        raise RuntimeError("Azure env vars missing - cannot create blob service client")
-    try:
-        return BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-    except Exception as e:
-        logger.error(f"Error creating blob service client: {e}")
-        raise
+    return obter_armazenamento().cliente()
+
+# Fecha os clientes assíncronos do armazenamento (chamar no shutdown do app)
+async def fechar_clientes_async():
+    await obter_armazenamento().fechar()
+
+# Prefixo dos blobs de cada sessão (workspace) dentro do container
+PREFIXO_SESSOES = "sessoes/"
+# Sessões sem nenhuma escrita há mais tempo que isso são apagadas na limpeza
+SESSOES_TTL_SEGUNDOS = int(os.getenv('SESSOES_TTL_SEGUNDOS', 24 * 3600))
+_FORMATO_SESSAO = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# Gera um ID novo de sessão
+def nova_sessao() -> str:
+    return uuid.uuid4().hex
+
+# Valida o ID da sessão vindo do cliente (evita nomes de blob arbitrários)
+def sessao_valida(sessao: str) -> bool:
+    return bool(sessao) and bool(_FORMATO_SESSAO.match(sessao))
+
+# Prefixa o nome do blob com a sessão do usuário (sem sessão, mantém o nome global)
+def caminho_sessao(blob_name: str, sessao: str = None) -> str:
+    if not sessao:
+        return blob_name
+    if not sessao_valida(sessao):
+        raise ValueError(f"ID de sessão inválido: {sessao!r}")
+    return f"{PREFIXO_SESSOES}{sessao}/{blob_name}"
 
-# Função para baixar o arquivo
-def download_arquivo(blob_name: str, container_name: str) -> str:
-    if not AZURE_STORAGE_CONNECTION_STRING:
-        raise RuntimeError("Azure env vars missing - cannot get file URL")
-    
+# Função para baixar o arquivo (URL de leitura temporário: SAS no Azure, /files nos outros)
+@medido("blob_sas_url")
+def download_arquivo(blob_name: str, container_name: str, sessao: str = None) -> str:
+    blob_name = caminho_sessao(blob_name, sessao)
     try:
-        from datetime import datetime, timedelta
-        from azure.storage.blob import generate_blob_sas, BlobSasPermissions
-        
-        blob_service_client = get_blob_service_client()
-        blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-        
-        # Gera um token com acesso público temporário
-        sas_token = generate_blob_sas(
-            account_name=AZURE_STORAGE_ACCOUNT_NAME,
-            container_name=container_name,
-            blob_name=blob_name,
-            account_key=AZURE_STORAGE_ACCOUNT_KEY,
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(hours=24)  # Válido por 24 horas
-        )
-        
-        # Retorna a URL
-        url = f"https://{AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net/{container_name}/{blob_name}?{sas_token}"
+        url = obter_armazenamento().gerar_url(blob_name, container_name)
         logger.info(f"Generated SAS URL for: {blob_name}")
         return url
-        
     except Exception as e:
         logger.error(f"Error generating file URL: {e}")
         raise
 
 # Função para fazer upload de arquivos no Blob
-def upload_arquivo(local_file_name: str, blob_name: str = None, container_name: str = "uploads"):
-    if not AZURE_STORAGE_CONNECTION_STRING:
-        raise RuntimeError("Azure env vars missing - cannot upload file")
-    
+def upload_arquivo(local_file_name: str, blob_name: str = None, container_name: str = "uploads", sessao: str = None):
     try:
         if blob_name is None:
             blob_name = os.path.basename(local_file_name)
-        
-        blob_service_client = get_blob_service_client()
-        blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-        
+        blob_name = caminho_sessao(blob_name, sessao)
+
         with open(local_file_name, "rb") as data:
-            blob_client.upload_blob(data, overwrite=True)
-        
+            url = obter_armazenamento().upload_stream(data, blob_name, container_name)
+
         logger.info(f"File uploaded: {local_file_name} -> {blob_name}")
-        return blob_client.url
+        return url
     except Exception as e:
         logger.error(f"Error uploading file: {e}")
         raise
 
 # Função para fazer upload de bytes
-def upload_bytes(data: bytes, blob_name: str, container_name: str):
-    if not AZURE_STORAGE_CONNECTION_STRING:
-        raise RuntimeError("Azure env vars missing - cannot upload bytes")
-    
+def upload_bytes(data: bytes, blob_name: str, container_name: str, sessao: str = None, content_type: str = None):
+    blob_name = caminho_sessao(blob_name, sessao)
     try:
-        blob_service_client = get_blob_service_client()
-        blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-        
-        blob_client.upload_blob(data, overwrite=True)
-        
+        with medir("blob_upload", bytes=len(data)):
+            url = obter_armazenamento().upload_bytes(data, blob_name, container_name, content_type=content_type)
+
         logger.info(f"Bytes uploaded: {blob_name} ({len(data)} bytes)")
-        return blob_client.url
+        return url
     except Exception as e:
         logger.error(f"Error uploading bytes: {e}")
         raise
 
+# Função para fazer upload de um arquivo aberto (enviado em blocos, sem carregar tudo)
+def upload_stream(fluxo, blob_name: str, container_name: str, sessao: str = None):
+    blob_name = caminho_sessao(blob_name, sessao)
+    try:
+        with medir("blob_upload_stream"):
+            url = obter_armazenamento().upload_stream(fluxo, blob_name, container_name)
+
+        logger.info(f"Stream uploaded: {blob_name}")
+        return url
+    except Exception as e:
+        logger.error(f"Error uploading stream: {e}")
+        raise
+
 # Função para baixar os bytes
-def download_bytes(blob_name: str, container_name: str) -> bytes:
-    if not AZURE_STORAGE_CONNECTION_STRING:
-        raise RuntimeError("Azure env vars missing - cannot download bytes")
-    
+def download_bytes(blob_name: str, container_name: str, sessao: str = None) -> bytes:
+    data, _ = download_bytes_com_etag(blob_name, container_name, sessao)
+    return data
+
+# Baixa os bytes junto com o ETag da versão baixada
+def download_bytes_com_etag(blob_name: str, container_name: str, sessao: str = None):
+    blob_name = caminho_sessao(blob_name, sessao)
     try:
-        blob_service_client = get_blob_service_client()
-        blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-        
-        download_stream = blob_client.download_blob()
-        data = download_stream.readall()
-        
+        with medir("blob_download") as etapa:
+            data, etag = obter_armazenamento().download_bytes(blob_name, container_name)
+            etapa.bytes = len(data)
+
         logger.info(f"Bytes downloaded: {blob_name} ({len(data)} bytes)")
+        return data, etag
+    except Exception as e:
+        logger.error(f"Error downloading bytes: {e}")
+        raise
+
+# Consulta só o ETag do blob (HEAD, sem baixar o conteúdo)
+@medido("blob_propriedades")
+def obter_etag(blob_name: str, container_name: str, sessao: str = None) -> str:
+    blob_name = caminho_sessao(blob_name, sessao)
+    return obter_armazenamento().obter_etag(blob_name, container_name)
+
+# Abre o download do blob e devolve (tamanho, iterador de blocos), sem juntar
+# tudo na memória. Erros como blob inexistente aparecem já na chamada.
+def download_em_blocos(blob_name: str, container_name: str, sessao: str = None):
+    blob_name = caminho_sessao(blob_name, sessao)
+    try:
+        tamanho, blocos = obter_armazenamento().download_em_blocos(blob_name, container_name)
+
+        logger.info(f"Streaming download: {blob_name} ({tamanho} bytes)")
+        return tamanho, blocos
+    except Exception as e:
+        logger.error(f"Error downloading blob: {e}")
+        raise
+
+# Versão assíncrona do upload_bytes (permite uploads concorrentes)
+async def upload_bytes_async(data: bytes, blob_name: str, container_name: str, sessao: str = None):
+    blob_name = caminho_sessao(blob_name, sessao)
+    try:
+        with medir("blob_upload", bytes=len(data)):
+            url = await obter_armazenamento().upload_bytes_async(data, blob_name, container_name)
+
+        logger.info(f"Bytes uploaded (async): {blob_name} ({len(data)} bytes)")
+        return url
+    except Exception as e:
+        logger.error(f"Error uploading bytes: {e}")
+        raise
+
+# Versão assíncrona do download_bytes
+async def download_bytes_async(blob_name: str, container_name: str, sessao: str = None) -> bytes:
+    blob_name = caminho_sessao(blob_name, sessao)
+    try:
+        with medir("blob_download") as etapa:
+            data = await obter_armazenamento().download_bytes_async(blob_name, container_name)
+            etapa.bytes = len(data)
+
+        logger.info(f"Bytes downloaded (async): {blob_name} ({len(data)} bytes)")
         return data
     except Exception as e:
         logger.error(f"Error downloading bytes: {e}")
         raise
 
+# Cache em memória dos modelos já desserializados (LRU por nome do blob)
+MODELO_CACHE_MAX = int(os.getenv('MODELO_CACHE_MAX', 8))
+# Segundos em que o modelo é usado sem revalidar o ETag (0 = revalida sempre).
+# Evita um HEAD no armazenamento a cada /predict; o worker que publica ou
+# reverte troca na hora, os outros em até MODELO_CACHE_TTL segundos.
+MODELO_CACHE_TTL = float(os.getenv('MODELO_CACHE_TTL', 2))
+
+_cache_modelos = OrderedDict()
+_lock_cache_modelos = threading.Lock()
+_stats_cache_modelos = {"hits": 0, "misses": 0, "revalidacoes": 0, "invalidacoes": 0}
+
+def _contar(evento: str):
+    with _lock_cache_modelos:
+        _stats_cache_modelos[evento] += 1
+
+# Tira um modelo do cache (ex.: quando um novo é salvo)
+def invalidar_cache_modelo(blob_name: str, container_name: str = "uploads", sessao: str = None):
+    blob_name = caminho_sessao(blob_name, sessao)
+    with _lock_cache_modelos:
+        if _cache_modelos.pop((container_name, blob_name), None) is not None:
+            _stats_cache_modelos["invalidacoes"] += 1
+
+# Retorna os contadores do cache de modelos
+def estatisticas_cache_modelos() -> dict:
+    with _lock_cache_modelos:
+        return {
+            **_stats_cache_modelos,
+            "tamanho": len(_cache_modelos),
+            "max": MODELO_CACHE_MAX,
+            "ttl_segundos": MODELO_CACHE_TTL,
+        }
+
 # Função para salvar o modelo linear
-def salvar_modelo(modelo, blob_name: str, container_name: str = "uploads"):
+def salvar_modelo(modelo, blob_name: str, container_name: str = "uploads", sessao: str = None):
     """Salva um modelo treinado no Azure Blob Storage"""
+    blob_name = caminho_sessao(blob_name, sessao)
     try:
         # Salve em bytes
-        model_bytes = pickle.dumps(modelo)
+        with medir("modelo_serializar") as etapa:
+            model_bytes = pickle.dumps(modelo)
+            etapa.bytes = len(model_bytes)
         
         # Faz upload usando a função anterior
         upload_bytes(model_bytes, blob_name, container_name)
+        invalidar_cache_modelo(blob_name, container_name)
         
         logger.info(f"Model saved: {blob_name}")
     except Exception as e:
         logger.error(f"Error saving model: {e}")
         raise
 
-# Função pra puxar o modelo do blob
-def carregar_modelo(blob_name: str, container_name: str = "uploads"):
+# Função pra puxar o modelo do blob (usa o cache e revalida pelo ETag)
+def carregar_modelo(blob_name: str, container_name: str = "uploads", sessao: str = None):
     """Carrega um modelo do Azure Blob Storage"""
+    blob_name = caminho_sessao(blob_name, sessao)
+    chave = (container_name, blob_name)
     try:
+        with _lock_cache_modelos:
+            entrada = _cache_modelos.get(chave)
+            if entrada is not None:
+                _cache_modelos.move_to_end(chave)
+
+        if entrada is not None:
+            if time.monotonic() - entrada["validado_em"] < MODELO_CACHE_TTL:
+                _contar("hits")
+                return entrada["modelo"]
+            # Passou o TTL: confere se o blob mudou sem baixar ele de novo
+            _contar("revalidacoes")
+            if obter_etag(blob_name, container_name) == entrada["etag"]:
+                entrada["validado_em"] = time.monotonic()
+                _contar("hits")
+                return entrada["modelo"]
+
+        _contar("misses")
         # Baixa os bytes
-        model_bytes = download_bytes(blob_name, container_name)
+        model_bytes, etag = download_bytes_com_etag(blob_name, container_name)
         
         # Desserializa o modelo
-        modelo = pickle.loads(model_bytes)
+        with medir("modelo_desserializar", bytes=len(model_bytes)):
+            modelo = pickle.loads(model_bytes)
+
+        with _lock_cache_modelos:
+            _cache_modelos[chave] = {"modelo": modelo, "etag": etag, "validado_em": time.monotonic()}
+            _cache_modelos.move_to_end(chave)
+            while len(_cache_modelos) > MODELO_CACHE_MAX:
+                _cache_modelos.popitem(last=False)
         
         logger.info(f"Model loaded: {blob_name}")
         return modelo
     except Exception as e:
+        invalidar_cache_modelo(blob_name, container_name)
         logger.error(f"Error loading model: {e}")
         raise
 
 # Função que checa se o conteiner existe pra segurança
 def container_exists(container_name):
-    if not AZURE_STORAGE_CONNECTION_STRING:
-        return False
-    
     try:
-        blob_service_client = get_blob_service_client()
-        container_client = blob_service_client.get_container_client(container_name)
-        return container_client.exists()
+        return obter_armazenamento().container_existe(container_name)
     except Exception:
         return False
 
-# Função pra lista os blobs 
-def list_blobs(container_name):
-    if not AZURE_STORAGE_CONNECTION_STRING:
-        return []
-    
+# Diz se o blob existe (sem baixar o conteúdo)
+def blob_existe(blob_name: str, container_name: str, sessao: str = None) -> bool:
+    return obter_armazenamento().existe(caminho_sessao(blob_name, sessao), container_name)
+
+# Função pra lista os blobs (só os da sessão, se ela for informada)
+def list_blobs(container_name, sessao: str = None):
     try:
-        blob_service_client = get_blob_service_client()
-        container_client = blob_service_client.get_container_client(container_name)
-        return [blob.name for blob in container_client.list_blobs()]
+        prefixo = caminho_sessao("", sessao) if sessao else None
+        return [blob["nome"] for blob in obter_armazenamento().listar(container_name, prefixo)]
     except Exception as e:
         logger.error(f"Error listing blobs: {e}")
         return []
+
+# Lista os blobs que começam com `prefixo`, com tamanho e data da última escrita
+def listar_blobs_detalhados(container_name: str, prefixo: str) -> list:
+    return obter_armazenamento().listar(container_name, prefixo)
+
+# Função pra apagar um blob
+def apagar_blob(blob_name: str, container_name: str, sessao: str = None):
+    blob_name = caminho_sessao(blob_name, sessao)
+    try:
+        obter_armazenamento().apagar(blob_name, container_name)
+        invalidar_cache_modelo(blob_name, container_name)
+        logger.info(f"Blob deleted: {blob_name}")
+    except Exception as e:
+        logger.error(f"Error deleting blob: {e}")
+        raise
+
+# Apaga as sessões cuja última escrita é mais antiga que o TTL
+def limpar_sessoes_expiradas(container_name: str = "uploads", ttl_segundos: int = SESSOES_TTL_SEGUNDOS) -> int:
+    armazenamento = obter_armazenamento()
+
+    # Agrupa os blobs por sessão guardando a escrita mais recente de cada uma
+    sessoes = {}
+    for blob in armazenamento.listar(container_name, PREFIXO_SESSOES):
+        sessao = blob["nome"][len(PREFIXO_SESSOES):].split("/", 1)[0]
+        nomes, ultima = sessoes.get(sessao, ([], None))
+        nomes.append(blob["nome"])
+        if ultima is None or blob["ultima_escrita"] > ultima:
+            ultima = blob["ultima_escrita"]
+        sessoes[sessao] = (nomes, ultima)
+
+    limite = datetime.now(timezone.utc) - timedelta(seconds=ttl_segundos)
+    removidas = 0
+    for sessao, (nomes, ultima) in sessoes.items():
+        if ultima >= limite:
+            continue
+        for nome in nomes:
+            try:
+                armazenamento.apagar(nome, container_name)
+                invalidar_cache_modelo(nome, container_name)
+            except Exception as e:
+                logger.error(f"Error deleting blob {nome}: {e}")
+        removidas += 1
+    logger.info(f"Expired sessions removed: {removidas}")
+    return removidas
@@ -0,0 +1,153 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+import threading
+from azure.core.exceptions import ResourceNotFoundError
+from .azure_utils import (
+    upload_bytes, download_bytes, download_arquivo, listar_blobs_detalhados, apagar_blob,
+)
+from .graficos import renderizar_figura, TIPOS_CONTEUDO
+from .registro import bytes_modelo_atual, publicar_bytes
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo do cache de resultados no Blob (0 desliga o cache)
+CACHE_RESULTADOS_MAX_MB = float(os.getenv("CACHE_RESULTADOS_MAX_MB", 512))
+# Cada resultado fica em cache/<chave>/ (resultado.json, modelo e gráfico)
+PREFIXO_CACHE = "cache/"
+# Muda quando o treino/avaliação mudar de forma que os resultados antigos não valham mais
+VERSAO_CACHE = 3
+# Artefato do modelo do treino (formato compacto do registro) guardado com o resultado
+MODELO_CACHE = "modelo.lin"
+
+_lock_stats = threading.Lock()
+_lock_limpeza = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "gravacoes": 0, "remocoes": 0}
+
+
+def cache_ativo() -> bool:
+    return CACHE_RESULTADOS_MAX_MB > 0
+
+
+def _contar(nome: str, quantidade: int = 1):
+    with _lock_stats:
+        _stats[nome] += quantidade
+
+
+def _blob(chave: str, nome: str) -> str:
+    return f"{PREFIXO_CACHE}{chave}/{nome}"
+
+
+# Hash do conteúdo enviado (bytes ou um hashlib já alimentado em blocos)
+def resumo_dados(dados) -> str:
+    if hasattr(dados, "hexdigest"):
+        return dados.hexdigest()
+    return hashlib.sha256(dados).hexdigest()
+
+
+# Impressão digital do modelo usado na avaliação (mesmo modelo -> mesma chave)
+# (o do registro já tem o hash do artefato; os antigos usam o do pickle)
+def impressao_modelo(modelo) -> str:
+    impressao = getattr(modelo, "impressao", None)
+    return impressao or hashlib.sha256(pickle.dumps(modelo)).hexdigest()
+
+
+# Chave do resultado: o hash dos dados + todos os parâmetros que mudam o resultado
+def chave_resultado(tipo: str, resumo: str, **parametros) -> str:
+    partes = {"versao": VERSAO_CACHE, "tipo": tipo, "dados": resumo, **parametros}
+    return hashlib.sha256(json.dumps(partes, sort_keys=True).encode()).hexdigest()
+
+
+# Procura o resultado no cache. No acerto, publica o modelo como nova versão
+# da sessão (se o resultado tiver um) e retorna {"metricas", "grafico_url"};
+# no erro, None.
+def obter_resultado(chave: str, sessao: str = None):
+    try:
+        dados = download_bytes(_blob(chave, "resultado.json"), "uploads")
+    except ResourceNotFoundError:
+        _contar("misses")
+        return None
+    except Exception as e:
+        logger.warning(f"Result cache lookup failed ({chave}): {e}")
+        _contar("misses")
+        return None
+
+    entrada = json.loads(dados)
+    if entrada.get("modelo"):
+        publicar_bytes(download_bytes(_blob(chave, MODELO_CACHE), "uploads"), sessao)
+    grafico_url = download_arquivo(_blob(chave, entrada["grafico"]), "uploads") if entrada.get("grafico") else None
+    # Regrava o índice para a última escrita marcar o último acesso (usado na remoção)
+    upload_bytes(dados, _blob(chave, "resultado.json"), "uploads")
+    _contar("hits")
+    logger.info(f"Result cache hit: {chave}")
+    return {"metricas": entrada["metricas"], "grafico_url": grafico_url}
+
+
+# Copia o modelo recém-treinado (a versão em uso na sessão) para o cache
+def guardar_modelo(chave: str, sessao: str = None):
+    upload_bytes(bytes_modelo_atual(sessao), _blob(chave, MODELO_CACHE), "uploads")
+
+
+# Grava o resultado (e o gráfico, se houver) no cache e retorna o URL do gráfico.
+# O resultado.json vai por último: só com ele a entrada passa a valer.
+def guardar_resultado(chave: str, metricas: dict, criar_figura=None, nome_grafico: str = None,
+                      com_modelo: bool = False):
+    grafico, grafico_url = None, None
+    if criar_figura is not None:
+        dados, formato = renderizar_figura(criar_figura)
+        grafico = f"{nome_grafico}.{formato}"
+        upload_bytes(dados, _blob(chave, grafico), "uploads", content_type=TIPOS_CONTEUDO.get(formato))
+        grafico_url = download_arquivo(_blob(chave, grafico), "uploads")
+
+    entrada = {"metricas": metricas, "grafico": grafico, "modelo": com_modelo}
+    upload_bytes(json.dumps(entrada).encode(), _blob(chave, "resultado.json"), "uploads")
+    _contar("gravacoes")
+    limitar_tamanho()
+    return grafico_url
+
+
+# Remove as entradas menos usadas até o cache caber em CACHE_RESULTADOS_MAX_MB
+def limitar_tamanho(max_bytes: float = None) -> int:
+    max_bytes = CACHE_RESULTADOS_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    # Se já tem uma limpeza rodando, essa pode ser pulada
+    if not _lock_limpeza.acquire(blocking=False):
+        return 0
+    try:
+        entradas = {}
+        for blob in listar_blobs_detalhados("uploads", PREFIXO_CACHE):
+            chave = blob["nome"][len(PREFIXO_CACHE):].split("/", 1)[0]
+            nomes, tamanho, ultima = entradas.get(chave, ([], 0, None))
+            nomes.append(blob["nome"])
+            if ultima is None or blob["ultima_escrita"] > ultima:
+                ultima = blob["ultima_escrita"]
+            entradas[chave] = (nomes, tamanho + blob["tamanho"], ultima)
+
+        total = sum(tamanho for _, tamanho, _ in entradas.values())
+        removidas = 0
+        for chave, (nomes, tamanho, _) in sorted(entradas.items(), key=lambda item: item[1][2]):
+            if total <= max_bytes:
+                break
+            for nome in nomes:
+                try:
+                    apagar_blob(nome, "uploads")
+                except Exception:
+                    pass
+            total -= tamanho
+            removidas += 1
+        if removidas:
+            _contar("remocoes", removidas)
+            logger.info(f"Result cache evicted {removidas} entries")
+        return removidas
+    finally:
+        _lock_limpeza.release()
+
+
+def estatisticas_cache_resultados() -> dict:
+    with _lock_stats:
+        stats = dict(_stats)
+    consultas = stats["hits"] + stats["misses"]
+    stats["taxa_acerto"] = round(stats["hits"] / consultas, 4) if consultas else 0.0
+    stats["max_mb"] = CACHE_RESULTADOS_MAX_MB
+    return stats
@@ -0,0 +1,68 @@
+import os
+from typing import BinaryIO, Iterable, Iterator
+
+# Tamanho máximo de cada bloco processado (padrão 4 MB)
+TAMANHO_BLOCO = int(os.getenv("CODEC_TAMANHO_BLOCO", 4 * 1024 * 1024))
+
+# Tabelas de substituição da cifra (cada byte é deslocado em +1, módulo 256)
+TABELA_CRIPTOGRAFAR = bytes((b + 1) % 256 for b in range(256))
+TABELA_DESCRIPTOGRAFAR = bytes((b - 1) % 256 for b in range(256))
+
+# Quebra um buffer em fatias de no máximo `tamanho_bloco` bytes, sem copiar
+def dividir_em_blocos(dados, tamanho_bloco: int = TAMANHO_BLOCO) -> Iterator[memoryview]:
+    visao = memoryview(dados).cast("B")
+    for inicio in range(0, len(visao), tamanho_bloco):
+        yield visao[inicio:inicio + tamanho_bloco]
+
+# Aplica a tabela em cada bloco de um fluxo, um bloco por vez
+def _traduzir_blocos(blocos: Iterable, tabela: bytes, tamanho_bloco: int) -> Iterator[bytes]:
+    for bloco in blocos:
+        for fatia in dividir_em_blocos(bloco, tamanho_bloco):
+            yield bytes(fatia).translate(tabela)
+
+def criptografar_blocos(blocos: Iterable, tamanho_bloco: int = TAMANHO_BLOCO) -> Iterator[bytes]:
+    return _traduzir_blocos(blocos, TABELA_CRIPTOGRAFAR, tamanho_bloco)
+
+def descriptografar_blocos(blocos: Iterable, tamanho_bloco: int = TAMANHO_BLOCO) -> Iterator[bytes]:
+    return _traduzir_blocos(blocos, TABELA_DESCRIPTOGRAFAR, tamanho_bloco)
+
+# Função que criptografa um buffer inteiro
+def criptografar_bytes(dados) -> bytes:
+    if isinstance(dados, bytes):
+        return dados.translate(TABELA_CRIPTOGRAFAR)
+    return b"".join(criptografar_blocos([dados]))
+
+# Função que descriptografa um buffer inteiro
+def descriptografar_bytes(dados) -> bytes:
+    if isinstance(dados, bytes):
+        return dados.translate(TABELA_DESCRIPTOGRAFAR)
+    return b"".join(descriptografar_blocos([dados]))
+
+# Lê `origem` em blocos e escreve o resultado em `destino`, com memória limitada
+def _traduzir_arquivo(origem: BinaryIO, destino: BinaryIO, tabela: bytes, tamanho_bloco: int) -> int:
+    total = 0
+    while True:
+        bloco = origem.read(tamanho_bloco)
+        if not bloco:
+            return total
+        destino.write(bloco.translate(tabela))
+        total += len(bloco)
+
+def criptografar_arquivo(origem: BinaryIO, destino: BinaryIO, tamanho_bloco: int = TAMANHO_BLOCO) -> int:
+    return _traduzir_arquivo(origem, destino, TABELA_CRIPTOGRAFAR, tamanho_bloco)
+
+def descriptografar_arquivo(origem: BinaryIO, destino: BinaryIO, tamanho_bloco: int = TAMANHO_BLOCO) -> int:
+    return _traduzir_arquivo(origem, destino, TABELA_DESCRIPTOGRAFAR, tamanho_bloco)
+
+# Arquivo "de escrita" que cifra os bytes antes de repassar para `destino`
+# (ex.: gzip.GzipFile(fileobj=EscritorCriptografado(arquivo), mode="wb"))
+class EscritorCriptografado:
+    def __init__(self, destino: BinaryIO):
+        self.destino = destino
+
+    def write(self, dados) -> int:
+        self.destino.write(bytes(dados).translate(TABELA_CRIPTOGRAFAR))
+        return len(dados)
+
+    def flush(self):
+        self.destino.flush()
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import io
+import os
+import json
+import zlib
+import struct
+import numpy as np
+from .sob_demanda import importar_sob_demanda
+
+pd = importar_sob_demanda("pandas")
+
+# Compressores opcionais (usados só se estiverem instalados)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+try:
+    import pyarrow  # noqa: F401 (necessário para to_feather/read_feather)
+except ImportError:
+    pyarrow = None
+
+# Formato dos .bin gravados no container: "colunar" (padrão), "feather" ou "csv"
+FORMATO_ARMAZENAMENTO = os.getenv("FORMATO_ARMAZENAMENTO", "colunar").lower()
+# Compressão do formato colunar: "auto", "zstd", "lz4", "zlib" ou "nenhuma"
+COMPRESSAO_ARMAZENAMENTO = os.getenv("COMPRESSAO_ARMAZENAMENTO", "auto").lower()
+
+# Cabeçalho do formato colunar. Depois dele vêm um ou mais grupos de linhas:
+# [tamanho do esquema (uint32)][esquema JSON][colunas em binário (comprimidas)]
+MAGICO = b"MLCOL\x01"
+MAGICO_ARROW = b"ARROW1"
+_TAMANHO_ESQUEMA = struct.Struct("<I")
+
+
+# Resolve a compressão configurada para uma que esteja disponível
+def compressao_padrao(compressao: str = None) -> str:
+    compressao = (compressao or COMPRESSAO_ARMAZENAMENTO).lower()
+    if compressao == "auto":
+        if zstandard is not None:
+            return "zstd"
+        if lz4_frame is not None:
+            return "lz4"
+        return "nenhuma"
+    if compressao == "zstd" and zstandard is None:
+        raise RuntimeError("Compressão zstd indisponível: instale o pacote 'zstandard'.")
+    if compressao == "lz4" and lz4_frame is None:
+        raise RuntimeError("Compressão lz4 indisponível: instale o pacote 'lz4'.")
+    if compressao not in ("zstd", "lz4", "zlib", "nenhuma"):
+        raise ValueError(f"Compressão desconhecida: {compressao}")
+    return compressao
+
+
+def _comprimir(dados: bytes, compressao: str) -> bytes:
+    if compressao == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(dados)
+    if compressao == "lz4":
+        return lz4_frame.compress(dados)
+    if compressao == "zlib":
+        return zlib.compress(dados, 1)
+    return dados
+
+
+def _descomprimir(dados, compressao: str) -> bytes:
+    if compressao == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Arquivo comprimido com zstd: instale o pacote 'zstandard'.")
+        return zstandard.ZstdDecompressor().decompress(dados)
+    if compressao == "lz4":
+        if lz4_frame is None:
+            raise RuntimeError("Arquivo comprimido com lz4: instale o pacote 'lz4'.")
+        return lz4_frame.decompress(dados)
+    if compressao == "zlib":
+        return zlib.decompress(dados)
+    return dados
+
+
+# O formato colunar guarda só colunas numéricas/booleanas do numpy; o resto vai em CSV
+def suporta_colunar(df: pd.DataFrame) -> bool:
+    return all(isinstance(dtype, np.dtype) and dtype.kind in "biuf" for dtype in df.dtypes)
+
+
+# Serializa um grupo de linhas: esquema JSON + colunas little-endian concatenadas
+def serializar_grupo(df: pd.DataFrame, compressao: str = None) -> bytes:
+    compressao = compressao_padrao(compressao)
+    colunas, partes, offset = [], [], 0
+    for i in range(df.shape[1]):
+        valores = np.ascontiguousarray(df.iloc[:, i].to_numpy())
+        valores = valores.astype(valores.dtype.newbyteorder("<"), copy=False)
+        colunas.append({"nome": str(df.columns[i]), "dtype": valores.dtype.str, "offset": offset})
+        partes.append(valores.tobytes())
+        offset += valores.nbytes
+    payload = _comprimir(b"".join(partes), compressao)
+    esquema = json.dumps({
+        "linhas": len(df), "colunas": colunas, "compressao": compressao, "tamanho": len(payload),
+    }).encode()
+    return _TAMANHO_ESQUEMA.pack(len(esquema)) + esquema + payload
+
+
+# Converte o DataFrame para os bytes gravados no Blob (antes da cifra)
+def serializar_dataframe(df: pd.DataFrame, formato: str = None, compressao: str = None) -> bytes:
+    formato = (formato or FORMATO_ARMAZENAMENTO).lower()
+    if formato == "feather" and pyarrow is not None and suporta_colunar(df):
+        buffer = io.BytesIO()
+        compressao = compressao_padrao(compressao)
+        df.reset_index(drop=True).to_feather(
+            buffer, compression=compressao if compressao in ("zstd", "lz4") else "uncompressed"
+        )
+        return buffer.getvalue()
+    if formato in ("colunar", "feather") and suporta_colunar(df):
+        return MAGICO + serializar_grupo(df, compressao)
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+# Lê os grupos do formato colunar e junta as colunas
+def _ler_colunar(dados) -> pd.DataFrame:
+    visao = memoryview(dados)
+    posicao = len(MAGICO)
+    nomes, grupos = None, []
+    while posicao < len(visao):
+        (tamanho,) = _TAMANHO_ESQUEMA.unpack_from(visao, posicao)
+        posicao += _TAMANHO_ESQUEMA.size
+        esquema = json.loads(bytes(visao[posicao:posicao + tamanho]))
+        posicao += tamanho
+        payload = _descomprimir(visao[posicao:posicao + esquema["tamanho"]], esquema["compressao"])
+        posicao += esquema["tamanho"]
+        # Cada coluna é uma visão do payload, sem cópia
+        linhas = esquema["linhas"]
+        grupos.append([
+            np.frombuffer(payload, dtype=np.dtype(c["dtype"]), count=linhas, offset=c["offset"])
+            for c in esquema["colunas"]
+        ])
+        nomes = [c["nome"] for c in esquema["colunas"]]
+    if nomes is None:
+        return pd.DataFrame()
+    if len(grupos) == 1:
+        colunas = grupos[0]
+    else:
+        colunas = [np.concatenate(partes) for partes in zip(*grupos)]
+    df = pd.DataFrame(dict(enumerate(colunas)))
+    df.columns = nomes
+    return df
+
+
+# Detecta o formato pelos primeiros bytes: colunar, Feather/Arrow ou CSV (legado)
+def desserializar_dataframe(dados) -> pd.DataFrame:
+    inicio = bytes(memoryview(dados)[:len(MAGICO)])
+    if inicio == MAGICO:
+        return _ler_colunar(dados)
+    if inicio == MAGICO_ARROW:
+        if pyarrow is None:
+            raise RuntimeError("Arquivo em formato Feather: instale o pacote 'pyarrow'.")
+        return pd.read_feather(io.BytesIO(dados))
+    return pd.read_csv(io.BytesIO(dados))
+
+
+# Grava um DataFrame em partes (modo streaming), no mesmo formato do serializar_dataframe
+class EscritorBlocos:
+    def __init__(self, formato: str = None, compressao: str = None):
+        formato = (formato or FORMATO_ARMAZENAMENTO).lower()
+        # Feather não é gravado em partes: no streaming usa o colunar
+        self.colunar = formato in ("colunar", "feather")
+        self.compressao = compressao_padrao(compressao) if self.colunar else None
+        self.primeiro = True
+
+    def bloco(self, df: pd.DataFrame) -> bytes:
+        primeiro, self.primeiro = self.primeiro, False
+        if self.colunar and not suporta_colunar(df):
+            raise ValueError("O formato colunar só aceita colunas numéricas.")
+        if self.colunar:
+            grupo = serializar_grupo(df, self.compressao)
+            return MAGICO + grupo if primeiro else grupo
+        return df.to_csv(index=False, header=primeiro).encode()
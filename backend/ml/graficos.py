@@ -0,0 +1,123 @@
+import os
+import threading
+from io import BytesIO
+import numpy as np
+from .azure_utils import upload_bytes, download_arquivo
+from .telemetria import medir
+
+# Quando os gráficos são gerados: "async" (depois das métricas, em segundo
+# plano), "sync" (antes de responder) ou "desligado"
+GRAFICO_MODO = os.getenv("GRAFICO_MODO", "async").lower()
+# Formato da imagem: "png", "svg" ou "auto" (SVG quando há poucos pontos)
+GRAFICO_FORMATO = os.getenv("GRAFICO_FORMATO", "auto").lower()
+# Resolução do PNG (dpi de tela)
+GRAFICO_DPI = int(os.getenv("GRAFICO_DPI", 100))
+# Máximo de pontos desenhados por série (as longas são reduzidas com LTTB)
+GRAFICO_MAX_PONTOS = int(os.getenv("GRAFICO_MAX_PONTOS", 2000))
+# No modo "auto", figuras com até esse total de pontos saem em SVG
+GRAFICO_SVG_MAX_PONTOS = int(os.getenv("GRAFICO_SVG_MAX_PONTOS", 5000))
+
+TIPOS_CONTEUDO = {"png": "image/png", "svg": "image/svg+xml"}
+
+_lock_matplotlib = threading.Lock()
+_matplotlib_pronto = False
+
+
+# Configura o matplotlib uma vez por processo: backend Agg (sem interface
+# gráfica) e cache de fontes carregado antes do primeiro gráfico
+def iniciar_matplotlib():
+    global _matplotlib_pronto
+    if _matplotlib_pronto:
+        return
+    with _lock_matplotlib:
+        if not _matplotlib_pronto:
+            import matplotlib
+            matplotlib.use("Agg")
+            from matplotlib import font_manager
+            font_manager.fontManager.findfont("DejaVu Sans")
+            _matplotlib_pronto = True
+
+
+# Índices escolhidos pelo Largest-Triangle-Three-Buckets: mantém o primeiro e o
+# último ponto e, em cada balde, o que forma o maior triângulo com o ponto
+# escolhido antes e a média do balde seguinte (preserva picos e a forma da série)
+def indices_lttb(x: np.ndarray, y: np.ndarray, n_saida: int) -> np.ndarray:
+    n = len(y)
+    if n_saida >= n or n_saida < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    limites = np.linspace(1, n - 1, n_saida - 1).astype(int)
+    escolhidos = np.empty(n_saida, dtype=int)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    anterior = 0
+    for i in range(n_saida - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        proximo_fim = limites[i + 2] if i + 2 < len(limites) else n
+        media_x = x[fim:proximo_fim].mean() if proximo_fim > fim else x[-1]
+        media_y = y[fim:proximo_fim].mean() if proximo_fim > fim else y[-1]
+        xa, ya = x[anterior], y[anterior]
+        areas = np.abs((xa - media_x) * (y[inicio:fim] - ya) - (xa - x[inicio:fim]) * (media_y - ya))
+        anterior = inicio + int(np.nanargmax(areas)) if np.isfinite(areas).any() else inicio
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+
+# Reduz uma série (x, y) para no máximo `max_pontos` pontos
+def reduzir_serie(x, y, max_pontos: int = GRAFICO_MAX_PONTOS):
+    x, y = np.asarray(x), np.asarray(y)
+    indices = indices_lttb(x, y, max_pontos)
+    return x[indices], y[indices]
+
+
+# Amostra regular para gráficos de dispersão (todos os arrays com as mesmas linhas)
+def amostrar_pontos(*arrays, max_pontos: int = GRAFICO_MAX_PONTOS):
+    n = len(arrays[0])
+    if n <= max_pontos:
+        return arrays
+    indices = np.linspace(0, n - 1, max_pontos).astype(int)
+    return tuple(np.asarray(a)[indices] for a in arrays)
+
+
+# Total de pontos desenhados na figura (linhas + dispersões)
+def contar_pontos(fig) -> int:
+    total = 0
+    for ax in fig.axes:
+        total += sum(len(linha.get_xdata()) for linha in ax.lines)
+        total += sum(len(colecao.get_offsets()) for colecao in ax.collections)
+    return total
+
+
+# Escolhe o formato da figura (no "auto", SVG só para figuras pequenas)
+def formato_figura(fig, formato: str = None) -> str:
+    formato = (formato or GRAFICO_FORMATO).lower()
+    if formato == "auto":
+        return "svg" if contar_pontos(fig) <= GRAFICO_SVG_MAX_PONTOS else "png"
+    return formato
+
+
+# Converte a figura para bytes no formato escolhido
+def figura_para_bytes(fig, formato: str = "png", dpi: int = None) -> bytes:
+    buffer = BytesIO()
+    fig.savefig(buffer, format=formato, dpi=dpi or GRAFICO_DPI)
+    return buffer.getvalue()
+
+
+# Gera a figura e retorna (bytes, formato)
+def renderizar_figura(criar_figura):
+    iniciar_matplotlib()
+    with medir("grafico_figura"):
+        fig = criar_figura()
+    formato = formato_figura(fig)
+    with medir(f"grafico_{formato}") as etapa:
+        dados = figura_para_bytes(fig, formato)
+        etapa.bytes = len(dados)
+    return dados, formato
+
+
+# Gera a figura, grava no Blob como `<nome_base>.<formato>` e retorna o URL
+def publicar_figura(criar_figura, nome_base: str, sessao: str = None) -> str:
+    dados, formato = renderizar_figura(criar_figura)
+    blob_name = f"{nome_base}.{formato}"
+    upload_bytes(dados, blob_name, "uploads", sessao=sessao, content_type=TIPOS_CONTEUDO.get(formato))
+    return download_arquivo(blob_name, "uploads", sessao=sessao)
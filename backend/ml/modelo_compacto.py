@@ -0,0 +1,132 @@
+import json
+import struct
+import hashlib
+import numpy as np
+
+# Formato compacto dos modelos lineares (um arquivo pequeno, sem pickle):
+#   cabeçalho | JSON com as colunas e os alvos | float64 little-endian:
+#   minimos[p], amplitude[p], constante[p], intercepto[k], coef[k][p]
+# Os arrays começam em posições múltiplas de 8, então o arquivo pode ser
+# mapeado na memória (mmap) e lido sem cópia.
+MAGICO = b"MLIN"
+VERSAO_FORMATO = 1
+_CABECALHO = struct.Struct("<4sHHIIII")  # mágico, versão, reservado, p, k, tamanho do JSON, reservado
+_DTYPE = np.dtype("<f8")
+
+
+class FormatoInvalido(ValueError):
+    pass
+
+
+# Normalização Min-Max + regressão linear de um ou vários alvos (os mesmos
+# cálculos do Pipeline EscalonadorMinMax + LinearRegression). Com vários
+# alvos, `predict` usa o primeiro (o principal) se `alvo` não for informado;
+# um alvo que o modelo não tem é erro (ValueError).
+class ModeloLinear:
+    def __init__(self, minimos, amplitude, constante, intercepto, coef, colunas, alvos):
+        self.minimos = minimos
+        self.amplitude = amplitude
+        self.constante = constante
+        self.intercepto = intercepto
+        self.coef = coef
+        self.colunas = [str(c) for c in colunas]
+        self.alvos = [str(a) for a in alvos]
+        self._bytes = None
+        self.impressao = None
+
+    # A partir do escalonador ajustado e dos coeficientes de cada alvo
+    @classmethod
+    def de_escalonador(cls, escalonador, coefs, interceptos, colunas, alvos):
+        return cls(
+            np.asarray(escalonador.minimos_, dtype=float),
+            np.asarray(escalonador.amplitude_, dtype=float),
+            np.asarray(escalonador.constante_, dtype=bool),
+            np.asarray(interceptos, dtype=float).reshape(-1),
+            np.asarray(coefs, dtype=float).reshape(len(alvos), -1),
+            colunas, alvos,
+        )
+
+    # A partir de um Pipeline (escalonador + LinearRegression) já ajustado
+    @classmethod
+    def de_pipeline(cls, pipeline, alvo: str):
+        escalonador, regressao = pipeline.named_steps["escalonador"], pipeline.named_steps["regressao"]
+        return cls.de_escalonador(escalonador, [regressao.coef_], [regressao.intercept_],
+                                  escalonador.feature_names_in_, [alvo])
+
+    def para_bytes(self) -> bytes:
+        if self._bytes is None:
+            meta = json.dumps({"colunas": self.colunas, "alvos": self.alvos}, ensure_ascii=False).encode()
+            meta += b" " * (-len(meta) % 8)
+            p, k = len(self.colunas), len(self.alvos)
+            partes = [
+                _CABECALHO.pack(MAGICO, VERSAO_FORMATO, 0, p, k, len(meta), 0), meta,
+                self.minimos.astype(_DTYPE).tobytes(), self.amplitude.astype(_DTYPE).tobytes(),
+                self.constante.astype(_DTYPE).tobytes(), self.intercepto.astype(_DTYPE).tobytes(),
+                np.ascontiguousarray(self.coef, dtype=_DTYPE).tobytes(),
+            ]
+            self._bytes = b"".join(partes)
+            self.impressao = hashlib.sha256(self._bytes).hexdigest()
+        return self._bytes
+
+    # Lê o formato compacto de bytes ou de um mmap (os arrays apontam para o
+    # próprio buffer, sem cópia)
+    @classmethod
+    def de_buffer(cls, buffer, impressao: str = None):
+        if len(buffer) < _CABECALHO.size:
+            raise FormatoInvalido("Arquivo de modelo truncado.")
+        magico, versao, _, p, k, tamanho_meta, _ = _CABECALHO.unpack_from(buffer, 0)
+        if magico != MAGICO:
+            raise FormatoInvalido("Não é um modelo no formato compacto.")
+        if versao != VERSAO_FORMATO:
+            raise FormatoInvalido(f"Versão do formato não suportada: {versao}")
+        posicao = _CABECALHO.size
+        meta = json.loads(bytes(buffer[posicao:posicao + tamanho_meta]))
+        posicao += tamanho_meta
+        if len(buffer) != posicao + _DTYPE.itemsize * (3 * p + k + k * p):
+            raise FormatoInvalido("Tamanho do arquivo de modelo não confere com o cabeçalho.")
+
+        def ler(quantidade):
+            nonlocal posicao
+            valores = np.frombuffer(buffer, dtype=_DTYPE, count=quantidade, offset=posicao)
+            posicao += quantidade * _DTYPE.itemsize
+            return valores
+
+        minimos, amplitude, constante, intercepto = ler(p), ler(p), ler(p) != 0, ler(k)
+        coef = ler(k * p).reshape(k, p)
+        modelo = cls(minimos, amplitude, constante, intercepto, coef, meta["colunas"], meta["alvos"])
+        modelo.impressao = impressao or hashlib.sha256(buffer).hexdigest()
+        return modelo
+
+    def _valores(self, X) -> np.ndarray:
+        if hasattr(X, "columns"):
+            ausentes = [c for c in self.colunas if c not in X.columns]
+            if ausentes:
+                raise ValueError(f"Colunas ausentes nos dados: {ausentes}")
+            X = X[self.colunas]
+        valores = np.asarray(X, dtype=float)
+        if valores.ndim != 2 or valores.shape[1] != len(self.colunas):
+            raise ValueError(f"Esperado {len(self.colunas)} colunas, recebido {valores.shape[-1]}.")
+        if np.isnan(valores).any():
+            raise ValueError("Input X contains NaN.")
+        return valores
+
+    def normalizar(self, X) -> np.ndarray:
+        valores = self._valores(X)
+        with np.errstate(invalid="ignore"):
+            return np.where(self.constante, 0.0, (valores - self.minimos) / self.amplitude)
+
+    def predict(self, X, alvo: str = None) -> np.ndarray:
+        j = self.indice_alvo(alvo)
+        return self.normalizar(X) @ self.coef[j] + self.intercepto[j]
+
+    # Posição do alvo no modelo (None = o principal)
+    def indice_alvo(self, alvo: str = None) -> int:
+        if alvo is None:
+            return 0
+        if str(alvo) not in self.alvos:
+            raise ValueError(f"O modelo não tem o alvo '{alvo}'. Alvos do modelo: {self.alvos}")
+        return self.alvos.index(str(alvo))
+
+    # Previsões de todos os alvos (uma coluna por alvo)
+    def predict_todos(self, X) -> np.ndarray:
+        return self.normalizar(X) @ self.coef.T + self.intercepto
@@ -0,0 +1,34 @@
+import os
+
+# Como as tarefas por fold rodam: "threads" (o NumPy solta o GIL nas contas
+# pesadas), "processos" (pool do joblib/loky) ou "serial"
+CV_EXECUTOR = os.getenv("CV_EXECUTOR", "threads").lower()
+# Número de workers (0 usa todos os núcleos da máquina)
+CV_WORKERS = int(os.getenv("CV_WORKERS", 0))
+
+_BACKENDS = {"threads": "threading", "processos": "loky"}
+
+
+def numero_workers(tarefas: int, workers: int = None) -> int:
+    return max(1, min(workers or CV_WORKERS or os.cpu_count() or 1, tarefas))
+
+
+# Executa cada tarefa (funcao, argumentos) e devolve os resultados na mesma
+# ordem das tarefas (quem junta os resultados faz isso sempre na mesma ordem,
+# então o resultado não depende de qual tarefa terminou primeiro)
+def executar_em_ordem(tarefas, executor: str = None, workers: int = None) -> list:
+    tarefas = list(tarefas)
+    executor = (executor or CV_EXECUTOR).lower()
+    n_jobs = numero_workers(len(tarefas), workers)
+    if executor not in _BACKENDS or n_jobs == 1:
+        return [funcao(*argumentos) for funcao, argumentos in tarefas]
+    # joblib só é carregado quando há paralelismo de verdade
+    from joblib import Parallel, delayed
+    return Parallel(n_jobs=n_jobs, backend=_BACKENDS[executor])(
+        delayed(funcao)(*argumentos) for funcao, argumentos in tarefas
+    )
+
+
+# Mesma coisa para uma função aplicada a uma lista de argumentos
+def mapear_em_ordem(funcao, itens, executor: str = None, workers: int = None) -> list:
+    return executar_em_ordem(((funcao, argumentos) for argumentos in itens), executor, workers)
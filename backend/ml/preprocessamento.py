@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+from .modelo_compacto import ModeloLinear
+from .validacao import PRECISAO_DADOS
+
+
+# Normalização Min-Max ajustada uma vez no treino e reaplicada na avaliação e
+# na previsão (inclusive em uma linha só). Colunas constantes (ou sem nenhum
+# valor) viram 0, como no normalizar_minmax antigo. Os ausentes são ignorados
+# no ajuste e continuam ausentes no transform.
+class EscalonadorMinMax(TransformerMixin, BaseEstimator):
+    def fit(self, X, y=None):
+        valores = np.asarray(X)
+        if valores.dtype not in (np.float32, np.float64):
+            valores = valores.astype(float)
+        # Uma passada vetorizada; colunas só com NaN ficam com limites NaN
+        minimos = np.fmin.reduce(valores, axis=0, initial=np.nan).astype(float)
+        maximos = np.fmax.reduce(valores, axis=0, initial=np.nan).astype(float)
+        colunas = X.columns if isinstance(X, pd.DataFrame) else None
+        return self._ajustar(minimos, maximos, colunas)
+
+    # Monta o escalonador com limites já calculados (ex.: 1ª passada do streaming)
+    @classmethod
+    def de_limites(cls, minimos, maximos, colunas=None):
+        return cls()._ajustar(np.asarray(minimos, dtype=float), np.asarray(maximos, dtype=float), colunas)
+
+    def _ajustar(self, minimos, maximos, colunas):
+        amplitude = maximos - minimos
+        self.minimos_ = minimos
+        self.maximos_ = maximos
+        self.constante_ = ~(amplitude > 0)
+        self.amplitude_ = np.where(self.constante_, 1.0, amplitude)
+        self.n_features_in_ = len(minimos)
+        if colunas is not None:
+            self.feature_names_in_ = np.asarray([str(c) for c in colunas], dtype=object)
+        return self
+
+    def transform(self, X):
+        if isinstance(X, pd.DataFrame) and hasattr(self, "feature_names_in_"):
+            ausentes = [c for c in self.feature_names_in_ if c not in X.columns]
+            if ausentes:
+                raise ValueError(f"Colunas ausentes nos dados: {ausentes}")
+            # Mesma ordem de colunas do treino
+            X = X[list(self.feature_names_in_)]
+        valores = np.asarray(X, dtype=float)
+        if valores.ndim != 2 or valores.shape[1] != self.n_features_in_:
+            raise ValueError(f"Esperado {self.n_features_in_} colunas, recebido {valores.shape[-1]}.")
+        with np.errstate(invalid="ignore"):
+            normalizado = np.where(self.constante_, 0.0, (valores - self.minimos_) / self.amplitude_)
+        if isinstance(X, pd.DataFrame):
+            return pd.DataFrame(normalizado, columns=X.columns, index=X.index)
+        return normalizado
+
+    # Mesmo resultado do transform, escrito na própria matriz (sem cópia). As
+    # colunas têm que estar na ordem do ajuste.
+    def transformar_no_lugar(self, valores: np.ndarray) -> np.ndarray:
+        valores -= self.minimos_
+        valores /= self.amplitude_
+        valores[:, self.constante_] = 0.0
+        return valores
+
+
+# Copia as colunas dos DataFrames/Series (na ordem) para uma única matriz
+# contígua de linhas x colunas na precisão configurada, uma coluna por vez
+# (sem o concat e as cópias intermediárias do pandas)
+def montar_matriz(*partes, dtype=None) -> np.ndarray:
+    colunas = [coluna for parte in partes
+               for coluna in ([parte] if parte.ndim == 1 else (parte.iloc[:, i] for i in range(parte.shape[1])))]
+    matriz = np.empty((len(partes[0]), len(colunas)), dtype=dtype or PRECISAO_DADOS)
+    for j, coluna in enumerate(colunas):
+        valores = coluna.to_numpy()
+        # Tipos do pandas com ausentes (Int64, Float64...) viram object
+        if valores.dtype == object:
+            valores = coluna.to_numpy(dtype=float, na_value=np.nan)
+        matriz[:, j] = valores
+    return matriz
+
+
+# Interpolação linear de cada coluna da matriz, no lugar, com o mesmo
+# resultado do df.interpolate(method='linear'): ausentes entre dois valores
+# são interpolados, os do fim recebem o último valor e os do início continuam
+# ausentes. Só as posições ausentes são lidas e escritas. Retorna, por
+# coluna, se ainda restaram ausentes (início da série ou coluna vazia).
+def interpolar_no_lugar(matriz: np.ndarray) -> np.ndarray:
+    n, colunas = matriz.shape
+    restaram = np.zeros(colunas, dtype=bool)
+    for j in range(colunas):
+        coluna = matriz[:, j]
+        ausentes = np.flatnonzero(np.isnan(coluna))
+        if not len(ausentes):
+            continue
+        # Trechos seguidos de ausentes [inicio, fim]; o do começo da série fica como está
+        quebras = np.flatnonzero(np.diff(ausentes) != 1)
+        inicios = ausentes[np.r_[0, quebras + 1]]
+        fins = ausentes[np.r_[quebras, len(ausentes) - 1]]
+        if inicios[0] == 0:
+            restaram[j] = True
+            ausentes = ausentes[ausentes > fins[0]]
+            inicios, fins = inicios[1:], fins[1:]
+        if not len(inicios):
+            continue
+        anteriores = inicios - 1
+        proximos = np.where(fins + 1 < n, fins + 1, anteriores)
+        tamanhos = fins - inicios + 1
+        x0, x1 = np.repeat(anteriores, tamanhos), np.repeat(proximos, tamanhos)
+        y0, y1 = coluna[x0].astype(float), coluna[x1].astype(float)
+        # Mesma conta do np.interp (usado pelo pandas)
+        inclinacao = (y1 - y0) / np.maximum(x1 - x0, 1)
+        coluna[ausentes] = inclinacao * (ausentes - x0) + y0
+    return restaram
+
+
+# Junta o escalonador e a regressão em um único modelo
+def criar_pipeline(escalonador, regressao) -> Pipeline:
+    return Pipeline([("escalonador", escalonador), ("regressao", regressao)])
+
+
+# Aplica o modelo nos dados sem normalizar. O modelo do registro traz o
+# escalonador e pode ter vários alvos (`alvo` escolhe qual; sem ele, o
+# principal). Modelos antigos (só o LinearRegression, sem o escalonador)
+# ainda normalizam com os próprios dados.
+def prever_com_modelo(modelo, X: pd.DataFrame, alvo=None) -> np.ndarray:
+    if isinstance(modelo, ModeloLinear):
+        return modelo.predict(X, alvo=alvo)
+    if isinstance(modelo, Pipeline):
+        return modelo.predict(X)
+    return modelo.predict(EscalonadorMinMax().fit_transform(X))
@@ -0,0 +1,303 @@
+import os
+import json
+import mmap
+import time
+import logging
+import tempfile
+import threading
+import weakref
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from azure.core.exceptions import ResourceNotFoundError
+from .azure_utils import (
+    upload_bytes, download_bytes, download_bytes_com_etag, obter_etag, listar_blobs_detalhados,
+    apagar_blob, caminho_sessao, carregar_modelo, MODELO_CACHE_MAX, MODELO_CACHE_TTL,
+)
+from .modelo_compacto import ModeloLinear, FormatoInvalido
+from .telemetria import medir
+
+logger = logging.getLogger(__name__)
+
+# Quantas versões anteriores ficam guardadas para voltar (as mais antigas são apagadas)
+REGISTRO_HISTORICO = int(os.getenv("REGISTRO_HISTORICO", 5))
+# Pasta local da máquina onde os artefatos ficam para serem mapeados na
+# memória (mmap) e compartilhados por todos os workers do uvicorn
+REGISTRO_DIR_LOCAL = Path(os.getenv("REGISTRO_DIR_LOCAL") or Path(tempfile.gettempdir()) / "registro_modelos")
+# Máximo de artefatos na pasta local (os menos recentes são apagados)
+REGISTRO_LOCAL_MAX_ARQUIVOS = int(os.getenv("REGISTRO_LOCAL_MAX_ARQUIVOS", 256))
+
+# Cada versão é um arquivo novo e imutável em modelos/<versao>.lin e o
+# modelos/atual.json aponta para a versão em uso. Publicar é gravar o
+# artefato e depois trocar o ponteiro (uma única escrita, atômica), então
+# quem lê nunca vê um modelo pela metade.
+PASTA_MODELOS = "modelos/"
+PONTEIRO = PASTA_MODELOS + "atual.json"
+EXTENSAO = ".lin"
+# Modelo das sessões treinadas antes do registro (pickle)
+MODELO_LEGADO = "modelo_final.pkl"
+
+_lock = threading.Lock()
+# Modelo em uso por sessão neste processo: {"versao", "modelo", "etag", "validado_em"}
+_atuais = OrderedDict()
+# Artefatos já abertos neste processo (sessões com o mesmo modelo usam o mesmo objeto)
+_artefatos = weakref.WeakValueDictionary()
+_stats = {"hits": 0, "misses": 0, "revalidacoes": 0, "trocas": 0, "downloads": 0, "mapeados": 0}
+
+
+def _contar(evento: str):
+    with _lock:
+        _stats[evento] += 1
+
+
+def _nome_blob(versao: str) -> str:
+    return f"{PASTA_MODELOS}{versao}{EXTENSAO}"
+
+
+# Versões ordenáveis pela data e com o começo do hash do conteúdo
+def _nova_versao(impressao: str) -> str:
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%fZ}-{impressao[:16]}"
+
+
+def _impressao_da_versao(versao: str) -> str:
+    return versao.rsplit("-", 1)[-1]
+
+
+def _ler_ponteiro(sessao: str):
+    dados, etag = download_bytes_com_etag(PONTEIRO, "uploads", sessao=sessao)
+    return json.loads(dados), etag
+
+
+def _gravar_ponteiro(ponteiro: dict, sessao: str):
+    ponteiro = {**ponteiro, "atualizado_em": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+    upload_bytes(json.dumps(ponteiro).encode(), PONTEIRO, "uploads", sessao=sessao, content_type="application/json")
+
+
+# Grava o artefato na pasta local (escrita atômica: arquivo temporário + rename)
+def _guardar_local(impressao: str, dados: bytes):
+    caminho = REGISTRO_DIR_LOCAL / f"{impressao}{EXTENSAO}"
+    try:
+        if caminho.exists():
+            return caminho
+        REGISTRO_DIR_LOCAL.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=REGISTRO_DIR_LOCAL, suffix=".tmp", delete=False) as temporario:
+            temporario.write(dados)
+        os.replace(temporario.name, caminho)
+        _limitar_local()
+        return caminho
+    except OSError as e:
+        logger.warning(f"Could not write model artifact to {REGISTRO_DIR_LOCAL}: {e}")
+        return None
+
+
+# Apaga os artefatos locais menos recentes acima do limite (quem já mapeou
+# um arquivo apagado continua lendo normalmente)
+def _limitar_local():
+    arquivos = sorted(REGISTRO_DIR_LOCAL.glob(f"*{EXTENSAO}"), key=lambda arquivo: arquivo.stat().st_mtime)
+    for arquivo in arquivos[:max(len(arquivos) - REGISTRO_LOCAL_MAX_ARQUIVOS, 0)]:
+        try:
+            arquivo.unlink()
+        except OSError:
+            pass
+
+
+def _mapear(caminho: Path) -> ModeloLinear:
+    with open(caminho, "rb") as arquivo:
+        buffer = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+    _contar("mapeados")
+    return ModeloLinear.de_buffer(buffer)
+
+
+# Abre uma versão: do próprio processo, da pasta local (mmap) ou baixando
+def _carregar_versao(versao: str, sessao: str) -> ModeloLinear:
+    impressao = _impressao_da_versao(versao)
+    modelo = _artefatos.get(impressao)
+    if modelo is not None:
+        return modelo
+
+    caminho = REGISTRO_DIR_LOCAL / f"{impressao}{EXTENSAO}"
+    modelo = None
+    if caminho.exists():
+        try:
+            modelo = _mapear(caminho)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding local model artifact {caminho}: {e}")
+            caminho.unlink(missing_ok=True)
+    if modelo is None:
+        _contar("downloads")
+        dados = download_bytes(_nome_blob(versao), "uploads", sessao=sessao)
+        if not hashlib.sha256(dados).hexdigest().startswith(impressao):
+            raise FormatoInvalido(f"Artefato corrompido: {versao}")
+        caminho = _guardar_local(impressao, dados)
+        modelo = _mapear(caminho) if caminho is not None else ModeloLinear.de_buffer(dados)
+    _artefatos[impressao] = modelo
+    return modelo
+
+
+def _ativar(sessao: str, versao: str, modelo, etag: str = None):
+    with _lock:
+        anterior = _atuais.get(sessao)
+        if anterior is not None and anterior["versao"] != versao:
+            _stats["trocas"] += 1
+        _atuais[sessao] = {"versao": versao, "modelo": modelo, "etag": etag, "validado_em": time.monotonic()}
+        _atuais.move_to_end(sessao)
+        while len(_atuais) > MODELO_CACHE_MAX:
+            _atuais.popitem(last=False)
+
+
+# Publica um modelo (ModeloLinear) como nova versão da sessão e passa a usá-lo
+def publicar_modelo(modelo: ModeloLinear, sessao: str = None) -> str:
+    dados = modelo.para_bytes()
+    versao = _nova_versao(modelo.impressao)
+    with medir("registro_publicar", bytes=len(dados)):
+        upload_bytes(dados, _nome_blob(versao), "uploads", sessao=sessao)
+        try:
+            ponteiro, _ = _ler_ponteiro(sessao)
+            anteriores = [ponteiro["versao"]] + ponteiro.get("anteriores", [])
+        except ResourceNotFoundError:
+            anteriores = []
+        ponteiro = {"versao": versao, "anteriores": anteriores[:REGISTRO_HISTORICO]}
+        _gravar_ponteiro(ponteiro, sessao)
+    _guardar_local(modelo.impressao[:16], dados)
+    _artefatos[modelo.impressao[:16]] = modelo
+    _ativar(sessao, versao, modelo)
+    _apagar_antigas(ponteiro, sessao)
+    logger.info(f"Model version published: {caminho_sessao(_nome_blob(versao), sessao)}")
+    return versao
+
+
+# Publica um artefato já serializado (ex.: o modelo guardado no cache de resultados)
+def publicar_bytes(dados: bytes, sessao: str = None) -> str:
+    modelo = ModeloLinear.de_buffer(dados)
+    modelo._bytes = dados
+    return publicar_modelo(modelo, sessao)
+
+
+# Apaga as versões que saíram do histórico. Só as mais antigas que a mais
+# antiga mantida (o id começa pela data): uma versão mais nova fora do
+# ponteiro pode ser de outra publicação em andamento na mesma sessão, que
+# ainda vai gravar o ponteiro dela.
+def _apagar_antigas(ponteiro: dict, sessao: str):
+    manter = {ponteiro["versao"], *ponteiro["anteriores"]}
+    limite = min(manter)
+    for versao in listar_versoes(sessao)["versoes"]:
+        if versao["versao"] not in manter and versao["versao"] < limite:
+            try:
+                apagar_blob(_nome_blob(versao["versao"]), "uploads", sessao=sessao)
+            except Exception:
+                pass
+
+
+# Modelo em uso na sessão. O ponteiro é revalidado pelo ETag depois de
+# MODELO_CACHE_TTL segundos: se outro worker publicou ou voltou uma versão,
+# este troca para ela sem reiniciar. Quem já pegou o modelo antigo termina
+# a previsão com ele (os artefatos nunca mudam). Se a versão do ponteiro não
+# abrir, usa a mais recente das anteriores que abrir. Sessões de antes do
+# registro usam o modelo_final.pkl.
+def modelo_atual(sessao: str = None):
+    with _lock:
+        entrada = _atuais.get(sessao)
+        if entrada is not None:
+            _atuais.move_to_end(sessao)
+
+    if entrada is not None:
+        if time.monotonic() - entrada["validado_em"] < MODELO_CACHE_TTL:
+            _contar("hits")
+            return entrada["modelo"]
+        _contar("revalidacoes")
+        try:
+            etag = obter_etag(PONTEIRO, "uploads", sessao=sessao)
+        except ResourceNotFoundError:
+            etag = None
+        if etag is not None and etag == entrada["etag"]:
+            entrada["validado_em"] = time.monotonic()
+            _contar("hits")
+            return entrada["modelo"]
+
+    _contar("misses")
+    try:
+        ponteiro, etag = _ler_ponteiro(sessao)
+    except ResourceNotFoundError:
+        with _lock:
+            _atuais.pop(sessao, None)
+        return carregar_modelo(MODELO_LEGADO, sessao=sessao)
+    versao = ponteiro["versao"]
+    if entrada is not None and entrada["versao"] == versao:
+        modelo = entrada["modelo"]
+    else:
+        versao, modelo = _carregar_disponivel(ponteiro, sessao)
+    _ativar(sessao, versao, modelo, etag)
+    return modelo
+
+
+# Abre a versão do ponteiro ou, se o artefato sumiu/está corrompido, a mais
+# recente das anteriores que abrir. Retorna (versao, modelo).
+def _carregar_disponivel(ponteiro: dict, sessao: str):
+    erro = None
+    for versao in [ponteiro["versao"], *ponteiro.get("anteriores", [])]:
+        try:
+            modelo = _carregar_versao(versao, sessao)
+        except (ResourceNotFoundError, FormatoInvalido) as e:
+            logger.warning(f"Model version {versao} unavailable (session {sessao}): {e}")
+            erro = erro or e
+            continue
+        if versao != ponteiro["versao"]:
+            logger.warning(f"Using previous model version {versao} instead of {ponteiro['versao']} (session {sessao})")
+        return versao, modelo
+    raise erro
+
+
+# Volta para uma versão anterior (por padrão, a mais recente antes da atual).
+# A versão que sai continua no histórico, então dá para desfazer.
+def reverter_modelo(sessao: str = None, versao: str = None) -> str:
+    ponteiro, _ = _ler_ponteiro(sessao)
+    anteriores = ponteiro.get("anteriores", [])
+    if versao is None:
+        if not anteriores:
+            raise ValueError("Não há versão anterior para voltar.")
+        versao = anteriores[0]
+    elif versao == ponteiro["versao"]:
+        return versao
+    elif versao not in anteriores:
+        raise ValueError(f"Versão '{versao}' não está no histórico.")
+
+    modelo = _carregar_versao(versao, sessao)
+    novos_anteriores = [ponteiro["versao"]] + [v for v in anteriores if v != versao]
+    _gravar_ponteiro({"versao": versao, "anteriores": novos_anteriores[:REGISTRO_HISTORICO]}, sessao)
+    _ativar(sessao, versao, modelo)
+    logger.info(f"Model rolled back to {versao} (session {sessao})")
+    return versao
+
+
+# Versões guardadas da sessão (a mais recente primeiro) e qual está em uso
+def listar_versoes(sessao: str = None) -> dict:
+    try:
+        ponteiro, _ = _ler_ponteiro(sessao)
+    except ResourceNotFoundError:
+        ponteiro = {"versao": None}
+    prefixo = caminho_sessao(PASTA_MODELOS, sessao)
+    versoes = []
+    for blob in listar_blobs_detalhados("uploads", prefixo):
+        nome = blob["nome"][len(prefixo):]
+        if not nome.endswith(EXTENSAO):
+            continue
+        versao = nome[:-len(EXTENSAO)]
+        versoes.append({
+            "versao": versao, "atual": versao == ponteiro["versao"], "tamanho": blob["tamanho"],
+            "criado_em": blob["ultima_escrita"].isoformat() if blob["ultima_escrita"] else None,
+        })
+    versoes.sort(key=lambda v: v["versao"], reverse=True)
+    return {"atual": ponteiro["versao"], "versoes": versoes}
+
+
+# Bytes do artefato em uso (para guardar no cache de resultados)
+def bytes_modelo_atual(sessao: str = None) -> bytes:
+    ponteiro, _ = _ler_ponteiro(sessao)
+    return download_bytes(_nome_blob(ponteiro["versao"]), "uploads", sessao=sessao)
+
+
+def estatisticas_registro() -> dict:
+    with _lock:
+        return {**_stats, "sessoes": len(_atuais), "artefatos_abertos": len(_artefatos),
+                "historico": REGISTRO_HISTORICO, "dir_local": str(REGISTRO_DIR_LOCAL)}
@@ -0,0 +1,37 @@
+import importlib
+import threading
+
+
+# Representa um módulo que só é importado no primeiro acesso a um atributo
+# (pandas, sklearn e matplotlib levam segundos para carregar e muitas
+# instâncias nem chegam a usar todos eles). Usa o import normal por baixo,
+# então é seguro com várias threads: quem chega durante o import espera.
+class ModuloSobDemanda:
+    def __init__(self, nome: str):
+        object.__setattr__(self, "_nome", nome)
+        object.__setattr__(self, "_modulo", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _carregar(self):
+        modulo = self._modulo
+        if modulo is None:
+            with self._lock:
+                modulo = self._modulo
+                if modulo is None:
+                    modulo = importlib.import_module(self._nome)
+                    object.__setattr__(self, "_modulo", modulo)
+        return modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self._carregar(), atributo)
+
+    def __setattr__(self, atributo, valor):
+        setattr(self._carregar(), atributo, valor)
+
+    def __repr__(self):
+        estado = "carregado" if self._modulo is not None else "não carregado"
+        return f"<módulo sob demanda {self._nome!r} ({estado})>"
+
+
+def importar_sob_demanda(nome: str) -> ModuloSobDemanda:
+    return ModuloSobDemanda(nome)
@@ -0,0 +1,210 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from .azure_utils import upload_stream
+from .codec import criptografar_bytes
+from .formato import EscritorBlocos
+from .preprocessamento import EscalonadorMinMax
+from .validacao import CV_N_SPLITS, ValidacaoIncremental
+from .modelo_compacto import ModeloLinear
+from .registro import publicar_modelo
+from .app2 import informar, figura_validacao, metricas_validacao, MENSAGEM_AUSENTES
+from .telemetria import medir
+
+# Linhas lidas do CSV por vez no modo streaming
+STREAMING_LINHAS_POR_BLOCO = int(os.getenv("STREAMING_LINHAS_POR_BLOCO", 100_000))
+# Quantos pontos (no máximo) são guardados para desenhar o gráfico
+STREAMING_PONTOS_GRAFICO = int(os.getenv("STREAMING_PONTOS_GRAFICO", 5000))
+# Acima disso os arquivos temporários vão da memória para o disco
+_MAX_SPOOL = 16 * 1024 * 1024
+
+
+def _erro_validacao(*mensagens):
+    return HTTPException(status_code=400, detail={"status": "erro_validacao", "mensagens": list(mensagens)})
+
+
+# Interpolação linear feita bloco a bloco, com o mesmo resultado do
+# df.interpolate(method='linear') no dataset inteiro. As linhas do fim do bloco
+# que ainda esperam o próximo valor válido de alguma coluna ficam pendentes e
+# são devolvidas junto com o bloco seguinte. A memória só cresce com o maior
+# trecho seguido de valores ausentes.
+class InterpoladorLinearIncremental:
+    def __init__(self):
+        self.pendente = None
+        self.visto = None
+
+    def adicionar(self, bloco: pd.DataFrame) -> pd.DataFrame:
+        if self.pendente is not None:
+            bloco = pd.concat([self.pendente, bloco], ignore_index=True)
+        else:
+            bloco = bloco.reset_index(drop=True)
+        if bloco.empty:
+            return bloco
+
+        preenchido = bloco.interpolate(method="linear", limit_area="inside")
+        validos = bloco.notna().to_numpy()
+        if self.visto is None:
+            self.visto = np.zeros(bloco.shape[1], dtype=bool)
+        self.visto |= validos.any(axis=0)
+
+        # Colunas que já tiveram valor só estão resolvidas até o último válido;
+        # as que nunca tiveram são NaN do início da série e não mudam mais
+        ultimo_valido = len(bloco) - 1 - np.argmax(validos[::-1], axis=0)
+        corte = int(ultimo_valido[self.visto].min()) if self.visto.any() else len(bloco)
+
+        self.pendente = preenchido.iloc[corte:]
+        return preenchido.iloc[:corte]
+
+    # No fim do arquivo, os ausentes finais recebem o último valor (como no pandas)
+    def finalizar(self) -> pd.DataFrame:
+        resto, self.pendente = self.pendente, None
+        if resto is None or resto.empty:
+            return pd.DataFrame()
+        return resto.interpolate(method="linear")
+
+
+# Lê o CSV do começo, em blocos
+def ler_blocos(arquivo, linhas_por_bloco: int = STREAMING_LINHAS_POR_BLOCO):
+    arquivo.seek(0)
+    return pd.read_csv(arquivo, chunksize=linhas_por_bloco)
+
+
+# Lê só o cabeçalho do CSV
+def ler_colunas(arquivo) -> list:
+    arquivo.seek(0)
+    return pd.read_csv(arquivo, nrows=0).columns.tolist()
+
+
+def _tamanho(arquivo) -> int:
+    posicao = arquivo.tell()
+    arquivo.seek(0, os.SEEK_END)
+    tamanho = arquivo.tell()
+    arquivo.seek(posicao)
+    return tamanho
+
+
+# 1ª passada: valida, conta as linhas, acha min/max/média de cada coluna e
+# grava o X.bin/y.bin criptografados em arquivos temporários
+def _primeira_passada(arquivo, campo: str, linhas_por_bloco: int, progresso):
+    colunas = ler_colunas(arquivo)
+    if campo not in colunas:
+        raise _erro_validacao(f"Campo '{campo}' não encontrado no CSV.")
+    colunas_X = [c for c in colunas if c != campo]
+    p = len(colunas_X)
+
+    tamanho = max(_tamanho(arquivo), 1)
+    resumo = {
+        "colunas_X": colunas_X, "n": 0,
+        "minimos": np.full(p, np.nan), "maximos": np.full(p, np.nan),
+        "soma_x": np.zeros(p), "contagem_x": np.zeros(p), "soma_y": 0.0, "contagem_y": 0,
+        "X_bin": tempfile.SpooledTemporaryFile(max_size=_MAX_SPOOL),
+        "y_bin": tempfile.SpooledTemporaryFile(max_size=_MAX_SPOOL),
+    }
+    escritor_X, escritor_y = EscritorBlocos(), EscritorBlocos()
+    for bloco in ler_blocos(arquivo, linhas_por_bloco):
+        X, y = bloco[colunas_X], bloco[[campo]]
+        tipos_invalidos = X.select_dtypes(exclude=[np.number]).columns.tolist()
+        if tipos_invalidos:
+            raise _erro_validacao(f"Variáveis não numéricas: {tipos_invalidos}")
+        if y.select_dtypes(exclude=[np.number]).shape[1]:
+            raise _erro_validacao(f"Campo alvo '{campo}' não é numérico.")
+
+        resumo["X_bin"].write(criptografar_bytes(escritor_X.bloco(X)))
+        resumo["y_bin"].write(criptografar_bytes(escritor_y.bloco(y)))
+
+        valores = X.to_numpy(dtype=float)
+        y_valores = y.to_numpy(dtype=float).ravel()
+        resumo["minimos"] = np.fmin(resumo["minimos"], np.fmin.reduce(valores, axis=0, initial=np.nan))
+        resumo["maximos"] = np.fmax(resumo["maximos"], np.fmax.reduce(valores, axis=0, initial=np.nan))
+        resumo["soma_x"] += np.nansum(valores, axis=0)
+        resumo["contagem_x"] += (~np.isnan(valores)).sum(axis=0)
+        resumo["soma_y"] += float(np.nansum(y_valores))
+        resumo["contagem_y"] += int((~np.isnan(y_valores)).sum())
+        resumo["n"] += len(bloco)
+        informar(progresso, 0.05 + 0.35 * min(arquivo.tell() / tamanho, 1.0), "Lendo o CSV (1ª passada)")
+
+    if resumo["n"] < 20:
+        raise _erro_validacao(f"Poucos dados ({resumo['n']} linhas). Mínimo: 20.")
+    return resumo
+
+
+# Treino para CSVs maiores que a memória: lê o arquivo duas vezes em blocos
+# (min/max e depois as equações normais) e chega no mesmo modelo e nas mesmas
+# métricas do treinar_modelo. `arquivo` precisa permitir seek.
+def treinar_modelo_streaming(arquivo, campo: str, sessao=None, n_splits=CV_N_SPLITS,
+                             linhas_por_bloco=STREAMING_LINHAS_POR_BLOCO, progresso=None):
+    informar(progresso, 0.05, "Lendo o CSV (1ª passada)")
+    with medir("streaming_primeira_passada") as etapa:
+        resumo = _primeira_passada(arquivo, campo, linhas_por_bloco, progresso)
+        etapa.linhas = resumo["n"]
+    colunas_X, n = resumo["colunas_X"], resumo["n"]
+
+    # Envia os binários pro Blob enquanto a 2ª passada roda
+    gravacao = ThreadPoolExecutor(max_workers=2)
+    try:
+        tarefas = []
+        for nome in ("X_bin", "y_bin"):
+            resumo[nome].seek(0)
+            blob_name = "X.bin" if nome == "X_bin" else "y.bin"
+            tarefas.append(gravacao.submit(upload_stream, resumo[nome], blob_name, "uploads", sessao=sessao))
+
+        # Normalização Min-Max com os limites da 1ª passada (salva junto com o modelo)
+        escalonador = EscalonadorMinMax.de_limites(resumo["minimos"], resumo["maximos"], colunas_X)
+        centro_x = escalonador.transform((resumo["soma_x"] / np.maximum(resumo["contagem_x"], 1))[None, :])[0]
+        centro_y = resumo["soma_y"] / max(resumo["contagem_y"], 1)
+        try:
+            validacao = ValidacaoIncremental(n, n_splits, centro_x, centro_y)
+        except ValueError as e:
+            raise _erro_validacao(str(e))
+
+        # Amostra regular das linhas para o gráfico
+        passo = max(1, -(-n // STREAMING_PONTOS_GRAFICO))
+        amostra = {"indices": [], "X": [], "y": []}
+        posicao = 0
+
+        def consumir(df):
+            nonlocal posicao
+            if df.empty:
+                return
+            X_norm = escalonador.transform(df[colunas_X].to_numpy(dtype=float))
+            y_valores = df[campo].to_numpy(dtype=float)
+            if np.isnan(X_norm).any() or np.isnan(y_valores).any():
+                raise _erro_validacao(MENSAGEM_AUSENTES)
+            validacao.adicionar(X_norm, y_valores)
+
+            indices = np.arange(posicao, posicao + len(df))
+            selecionadas = indices % passo == 0
+            amostra["indices"].append(indices[selecionadas])
+            amostra["X"].append(X_norm[selecionadas])
+            amostra["y"].append(y_valores[selecionadas])
+            posicao += len(df)
+            informar(progresso, 0.4 + 0.4 * posicao / n, "Validação cruzada (2ª passada)")
+
+        interpolador = InterpoladorLinearIncremental()
+        with medir("streaming_validacao_cruzada", linhas=n):
+            for bloco in ler_blocos(arquivo, linhas_por_bloco):
+                consumir(interpolador.adicionar(bloco))
+            consumir(interpolador.finalizar())
+            cv = validacao.finalizar()
+
+        informar(progresso, 0.9, "Salvando modelo")
+        publicar_modelo(ModeloLinear.de_escalonador(
+            escalonador, [cv["coef"]], [cv["intercepto"]], colunas_X, [campo],
+        ), sessao)
+        for tarefa in tarefas:
+            tarefa.result()
+    finally:
+        gravacao.shutdown(wait=True)
+        resumo["X_bin"].close()
+        resumo["y_bin"].close()
+
+    # A figura é montada a partir da amostra (desenhada depois, ou nunca)
+    indices, X_amostra, y_amostra = (np.concatenate(amostra[c]) for c in ("indices", "X", "y"))
+    return {
+        "metricas": metricas_validacao(cv),
+        "figura": lambda: figura_validacao(indices, X_amostra, y_amostra, cv),
+        "nome_grafico": "cv_plot2",
+    }
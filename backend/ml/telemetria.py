@@ -0,0 +1,181 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Liga/desliga a medição das etapas (desligada, medir() não faz nada)
+TELEMETRIA_ATIVA = os.getenv("TELEMETRIA_ATIVA", "1").lower() not in ("0", "false", "nao", "não")
+# Limites (em segundos) dos baldes dos histogramas de duração
+BALDES_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+_histogramas = {}
+_contadores = {}
+# Etapas da requisição atual (para o cabeçalho Server-Timing); None fora de requisição
+_etapas_requisicao = ContextVar("etapas_requisicao", default=None)
+
+
+# Histograma cumulativo no formato do Prometheus
+class Histograma:
+    def __init__(self, baldes=BALDES_SEGUNDOS):
+        self.baldes = baldes
+        self.contagens = [0] * (len(baldes) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.contagens[bisect_left(self.baldes, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+def observar(metrica: str, valor: float, **rotulos):
+    chave = (metrica, tuple(sorted(rotulos.items())))
+    with _lock:
+        histograma = _histogramas.get(chave)
+        if histograma is None:
+            histograma = _histogramas[chave] = Histograma()
+        histograma.observar(valor)
+
+
+def somar(metrica: str, valor: float = 1, **rotulos):
+    chave = (metrica, tuple(sorted(rotulos.items())))
+    with _lock:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+# Uma etapa medida: duração (histograma) + bytes e linhas processados (contadores).
+# Quem mede pode preencher `bytes` e `linhas` dentro do bloco `with`.
+class Etapa:
+    __slots__ = ("nome", "bytes", "linhas", "_inicio")
+
+    def __init__(self, nome: str, bytes: int = 0, linhas: int = 0):
+        self.nome = nome
+        self.bytes = bytes
+        self.linhas = linhas
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, erro, rastro):
+        duracao = time.perf_counter() - self._inicio
+        observar("ml_etapa_duracao_segundos", duracao, etapa=self.nome)
+        if self.bytes:
+            somar("ml_etapa_bytes_total", self.bytes, etapa=self.nome)
+        if self.linhas:
+            somar("ml_etapa_linhas_total", self.linhas, etapa=self.nome)
+        if tipo is not None:
+            somar("ml_etapa_erros_total", etapa=self.nome)
+        etapas = _etapas_requisicao.get()
+        if etapas is not None:
+            etapas.append((self.nome, duracao))
+        return False
+
+
+# Etapa que não mede nada (telemetria desligada): atribuições são ignoradas
+class _EtapaNula:
+    __slots__ = ()
+    bytes = 0
+    linhas = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, erro, rastro):
+        return False
+
+    def __setattr__(self, nome, valor):
+        pass
+
+
+_ETAPA_NULA = _EtapaNula()
+
+
+# Uso: `with medir("blob_upload", bytes=len(dados)): ...`
+def medir(nome: str, bytes: int = 0, linhas: int = 0):
+    if not TELEMETRIA_ATIVA:
+        return _ETAPA_NULA
+    return Etapa(nome, bytes, linhas)
+
+
+# Decorador que mede cada chamada da função (síncrona ou async) como uma etapa
+def medido(nome: str):
+    def decorador(funcao):
+        if not TELEMETRIA_ATIVA:
+            return funcao
+        if asyncio.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envolvida_async(*args, **kwargs):
+                with Etapa(nome):
+                    return await funcao(*args, **kwargs)
+            return envolvida_async
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with Etapa(nome):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+# Começa a juntar as etapas da requisição atual (o asyncio.to_thread copia o
+# contexto, então etapas rodadas em threads da requisição também entram)
+def iniciar_requisicao() -> list:
+    etapas = []
+    _etapas_requisicao.set(etapas)
+    return etapas
+
+
+# Valor do cabeçalho Server-Timing (etapas repetidas são somadas, em ms)
+def server_timing(etapas: list, total: float = None) -> str:
+    duracoes = {}
+    for nome, duracao in etapas:
+        duracoes[nome] = duracoes.get(nome, 0.0) + duracao
+    partes = [f"{nome};dur={duracao * 1000:.1f}" for nome, duracao in duracoes.items()]
+    if total is not None:
+        partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+def _formatar_rotulos(rotulos, extra: str = None) -> str:
+    partes = [f'{nome}="{valor}"' for nome, valor in rotulos]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _formatar_numero(valor) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+# Todas as métricas no formato de texto do Prometheus (para o /metrics)
+def exportar_prometheus() -> str:
+    with _lock:
+        histogramas = [(chave, list(h.contagens), h.soma, h.total, h.baldes) for chave, h in _histogramas.items()]
+        contadores = list(_contadores.items())
+
+    linhas = []
+    tipos_escritos = set()
+    for (metrica, rotulos), contagens, soma, total, baldes in sorted(histogramas, key=lambda item: item[0]):
+        if metrica not in tipos_escritos:
+            linhas.append(f"# TYPE {metrica} histogram")
+            tipos_escritos.add(metrica)
+        acumulado = 0
+        for limite, contagem in zip(baldes, contagens):
+            acumulado += contagem
+            rotulos_balde = _formatar_rotulos(rotulos, f'le="{limite}"')
+            linhas.append(f"{metrica}_bucket{rotulos_balde} {acumulado}")
+        rotulos_balde = _formatar_rotulos(rotulos, 'le="+Inf"')
+        linhas.append(f"{metrica}_bucket{rotulos_balde} {total}")
+        linhas.append(f"{metrica}_sum{_formatar_rotulos(rotulos)} {soma!r}")
+        linhas.append(f"{metrica}_count{_formatar_rotulos(rotulos)} {total}")
+    for (metrica, rotulos), valor in sorted(contadores, key=lambda item: item[0]):
+        if metrica not in tipos_escritos:
+            linhas.append(f"# TYPE {metrica} counter")
+            tipos_escritos.add(metrica)
+        linhas.append(f"{metrica}{_formatar_rotulos(rotulos)} {_formatar_numero(valor)}")
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,268 @@
+import os
+import numpy as np
+from .paralelo import mapear_em_ordem
+
+# Número padrão de splits da validação cruzada temporal
+CV_N_SPLITS = int(os.getenv("CV_N_SPLITS", 5))
+# Linhas processadas por vez ao acumular X^T X (limita a memória temporária)
+LINHAS_POR_BLOCO = 65536
+# Autovalores de X^T X abaixo dessa fração do maior são tratados como zero.
+# Eles são os quadrados dos valores singulares de X, então o corte equivale a
+# 1e-6 do maior valor singular: abaixo disso o erro de arredondamento de
+# montar X^T X (da ordem de eps * condição²) já domina a direção.
+LIMIAR_AUTOVALOR = 1e-12
+# Precisão das matrizes do treino e da avaliação: "float64" (padrão) ou
+# "float32" (metade da memória; X^T X e as métricas continuam somados em float64)
+PRECISAO_DADOS = os.getenv("PRECISAO_DADOS", "float64").lower()
+if PRECISAO_DADOS not in ("float32", "float64"):
+    raise ValueError(f"PRECISAO_DADOS inválida: {PRECISAO_DADOS} (use float32 ou float64)")
+
+
+# Estatísticas suficientes da regressão linear de um trecho dos dados.
+# Os dados são deslocados por um centro fixo antes de acumular, o que evita
+# perda de precisão ao centralizar X^T X no final. Com vários alvos (y com
+# uma coluna por alvo e centro_y com um valor por alvo) o X^T X é o mesmo
+# para todos e só X^T y ganha uma coluna por alvo.
+class EstatisticasSuficientes:
+    def __init__(self, centro_x: np.ndarray, centro_y):
+        p = len(centro_x)
+        self.centro_x = centro_x
+        self.centro_y = centro_y
+        self.n = 0
+        self.soma_x = np.zeros(p)
+        self.soma_y = np.zeros(np.shape(centro_y)) if np.ndim(centro_y) else 0.0
+        self.xtx = np.zeros((p, p))
+        self.xty = np.zeros((p,) + np.shape(centro_y))
+        self.yty = np.zeros(np.shape(centro_y)) if np.ndim(centro_y) else 0.0
+
+    def adicionar(self, X: np.ndarray, y: np.ndarray):
+        for inicio in range(0, len(X), LINHAS_POR_BLOCO):
+            Xb = X[inicio:inicio + LINHAS_POR_BLOCO] - self.centro_x
+            yb = y[inicio:inicio + LINHAS_POR_BLOCO] - self.centro_y
+            self.n += len(Xb)
+            self.soma_x += Xb.sum(axis=0)
+            self.soma_y += yb.sum(axis=0)
+            self.xtx += Xb.T @ Xb
+            self.xty += Xb.T @ yb
+            self.yty += yb @ yb if yb.ndim == 1 else np.einsum("ij,ij->j", yb, yb)
+        return self
+
+    def somar(self, outra: "EstatisticasSuficientes") -> "EstatisticasSuficientes":
+        total = EstatisticasSuficientes(self.centro_x, self.centro_y)
+        total.n = self.n + outra.n
+        total.soma_x = self.soma_x + outra.soma_x
+        total.soma_y = self.soma_y + outra.soma_y
+        total.xtx = self.xtx + outra.xtx
+        total.xty = self.xty + outra.xty
+        total.yty = self.yty + outra.yty
+        return total
+
+    # Resolve as equações normais centradas em O(p^3) pela decomposição em
+    # autovalores de X^T X, descartando as direções abaixo de LIMIAR_AUTOVALOR
+    # (solução de menor norma). Resolver X^T X direto eleva ao quadrado a
+    # condição de X e, com variáveis quase colineares, dava coeficientes
+    # enormes onde o LinearRegression dá os estáveis. Com vários alvos a
+    # decomposição é feita uma vez para todos: coef sai (p, k) e intercepto (k,).
+    def resolver(self):
+        media_x = self.soma_x / self.n
+        media_y = self.soma_y / self.n
+        sxx = self.xtx - self.n * np.outer(media_x, media_x)
+        sxy = self.xty - self.n * (media_x if np.ndim(media_y) == 0 else media_x[:, None]) * media_y
+        autovalores, autovetores = np.linalg.eigh(sxx)
+        manter = autovalores > LIMIAR_AUTOVALOR * autovalores.max(initial=0.0)
+        base, escala = autovetores[:, manter], autovalores[manter]
+        coef = base @ ((base.T @ sxy) / (escala if sxy.ndim == 1 else escala[:, None]))
+        intercepto = (self.centro_y + media_y) - (self.centro_x + media_x) @ coef
+        return coef, float(intercepto) if np.ndim(intercepto) == 0 else intercepto
+
+
+# Limites [início, fim) dos blocos de teste do TimeSeriesSplit (mesma regra do sklearn)
+def limites_time_series_split(n_amostras: int, n_splits: int):
+    n_folds = n_splits + 1
+    if n_splits < 2:
+        raise ValueError(f"n_splits deve ser pelo menos 2 (recebido {n_splits}).")
+    if n_folds > n_amostras:
+        raise ValueError(f"n_splits={n_splits} é grande demais para {n_amostras} amostras.")
+    tamanho_teste = n_amostras // n_folds
+    inicio = n_amostras - n_splits * tamanho_teste
+    return [(i, i + tamanho_teste) for i in range(inicio, n_amostras, tamanho_teste)]
+
+
+# R² e RMSE a partir dos acumulados do bloco de teste (mesmas convenções do sklearn)
+def metricas(n: int, ss_res: float, soma_y: float, soma_y2: float):
+    ss_tot = max(soma_y2 - soma_y * soma_y / n, 0.0)
+    if ss_tot == 0:
+        r2 = 1.0 if ss_res == 0 else 0.0
+    else:
+        r2 = 1.0 - ss_res / ss_tot
+    rmse = (ss_res / n) ** 0.5
+    return r2, rmse
+
+
+# Validação cruzada temporal incremental. Como os folds de treino do
+# TimeSeriesSplit são prefixos aninhados, as linhas podem chegar em ordem e em
+# blocos de qualquer tamanho: cada bloco de teste é avaliado com o modelo do
+# prefixo anterior e depois somado a ele, e cada fold é resolvido em O(p^3).
+class ValidacaoIncremental:
+    def __init__(self, n_amostras: int, n_splits: int, centro_x: np.ndarray, centro_y: float):
+        self.n_amostras = n_amostras
+        self.limites = limites_time_series_split(n_amostras, n_splits)
+        # Fim de cada segmento: o primeiro é só treino, os demais são os blocos de teste
+        self.fronteiras = [inicio for inicio, _ in self.limites] + [n_amostras]
+        self.centro_x = np.asarray(centro_x, dtype=float)
+        self.centro_y = float(centro_y)
+        self.segmento = 0
+        self.posicao = 0
+        self.acumulado = EstatisticasSuficientes(self.centro_x, self.centro_y)
+        self.bloco = EstatisticasSuficientes(self.centro_x, self.centro_y)
+        self.modelo_fold = None
+        self.folds = []
+
+    def adicionar(self, X: np.ndarray, y: np.ndarray):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        while len(X):
+            fim = self.fronteiras[self.segmento]
+            tamanho = min(len(X), fim - self.posicao)
+            if tamanho <= 0:
+                raise ValueError("Mais linhas do que o informado em n_amostras.")
+            Xs, ys = X[:tamanho], y[:tamanho]
+            self.bloco.adicionar(Xs, ys)
+            if self.modelo_fold is not None:
+                self._acumular_teste(Xs, ys)
+            self.posicao += tamanho
+            X, y = X[tamanho:], y[tamanho:]
+            if self.posicao == fim:
+                self._fechar_segmento()
+        return self
+
+    # Soma o erro do modelo do fold atual nas linhas do bloco de teste
+    def _acumular_teste(self, X: np.ndarray, y: np.ndarray):
+        coef, intercepto = self.modelo_fold
+        residuo = y - (X @ coef + intercepto)
+        yc = y - self.centro_y
+        self.teste["n"] += len(y)
+        self.teste["ss_res"] += float(residuo @ residuo)
+        self.teste["soma_y"] += float(yc.sum())
+        self.teste["soma_y2"] += float(yc @ yc)
+
+    def _fechar_segmento(self):
+        if self.modelo_fold is not None:
+            coef, intercepto = self.modelo_fold
+            r2, rmse = metricas(self.teste["n"], self.teste["ss_res"], self.teste["soma_y"], self.teste["soma_y2"])
+            inicio, fim = self.limites[self.segmento - 1]
+            self.folds.append({
+                "inicio_teste": inicio, "fim_teste": fim,
+                "coef": coef, "intercepto": intercepto,
+                "r2": r2, "rmse": rmse,
+            })
+        self.acumulado = self.acumulado.somar(self.bloco)
+        self.bloco = EstatisticasSuficientes(self.centro_x, self.centro_y)
+        self.segmento += 1
+        if self.segmento < len(self.fronteiras):
+            self.modelo_fold = self.acumulado.resolver()
+            self.teste = {"n": 0, "ss_res": 0.0, "soma_y": 0.0, "soma_y2": 0.0}
+        else:
+            self.modelo_fold = None
+
+    # Depois da última linha o acumulado cobre todos os dados: é o modelo final
+    def finalizar(self) -> dict:
+        if self.posicao != self.n_amostras:
+            raise ValueError(f"Recebidas {self.posicao} de {self.n_amostras} linhas.")
+        coef, intercepto = self.acumulado.resolver()
+        return {"folds": self.folds, "coef": coef, "intercepto": intercepto}
+
+
+# Estatísticas das linhas [inicio, fim) (um segmento entre duas fronteiras de fold)
+def _estatisticas_segmento(X, y, inicio: int, fim: int, centro_x, centro_y: float):
+    return EstatisticasSuficientes(centro_x, centro_y).adicionar(X[inicio:fim], y[inicio:fim])
+
+
+# R² e RMSE do modelo de um fold no seu bloco de teste [inicio, fim)
+# (com vários alvos, listas com um valor por alvo). As somas são feitas em
+# blocos de linhas, em float64, sem copiar o bloco de teste inteiro.
+def _metricas_teste(X, y, inicio: int, fim: int, coef, intercepto, centro_y):
+    ss_res = soma_y = soma_y2 = 0.0
+    for bloco in range(inicio, fim, LINHAS_POR_BLOCO):
+        fim_bloco = min(bloco + LINHAS_POR_BLOCO, fim)
+        residuo = y[bloco:fim_bloco] - (X[bloco:fim_bloco] @ coef + intercepto)
+        yc = y[bloco:fim_bloco] - centro_y
+        ss_res = ss_res + np.einsum("i...,i...->...", residuo, residuo)
+        soma_y = soma_y + yc.sum(axis=0)
+        soma_y2 = soma_y2 + np.einsum("i...,i...->...", yc, yc)
+    if y.ndim == 1:
+        return metricas(fim - inicio, float(ss_res), float(soma_y), float(soma_y2))
+    por_alvo = [
+        metricas(fim - inicio, float(ss_alvo), float(soma_alvo), float(soma2_alvo))
+        for ss_alvo, soma_alvo, soma2_alvo in zip(ss_res, soma_y, soma_y2)
+    ]
+    return [r2 for r2, _ in por_alvo], [rmse for _, rmse in por_alvo]
+
+
+# Dados em float32 continuam float32 (sem cópia); o resto vira float64
+def _como_float(valores) -> np.ndarray:
+    valores = np.asarray(valores)
+    return valores if valores.dtype in (np.float32, np.float64) else valores.astype(float)
+
+
+# Validação cruzada temporal com os dados em memória. Os segmentos entre as
+# fronteiras dos folds são independentes: o X^T X de cada um e depois o erro
+# de cada fold no seu bloco de teste rodam em paralelo (ver ml/paralelo.py).
+# As somas dos prefixos são feitas em ordem, então o resultado é idêntico ao
+# da ValidacaoIncremental qualquer que seja o executor.
+# `y` pode ter uma coluna por alvo: X^T X e sua decomposição são calculados
+# uma vez só e resolvidos para todos os alvos juntos (ver separar_alvos).
+def validacao_cruzada_incremental(X: np.ndarray, y: np.ndarray, n_splits: int = CV_N_SPLITS,
+                                  executor: str = None, workers: int = None) -> dict:
+    X = _como_float(X)
+    y = _como_float(y)
+    limites = limites_time_series_split(len(X), n_splits)
+    centro_x = X.mean(axis=0, dtype=float)
+    centro_y = float(y.mean(dtype=float)) if y.ndim == 1 else y.mean(axis=0, dtype=float)
+    fronteiras = [0] + [inicio for inicio, _ in limites] + [len(X)]
+
+    segmentos = mapear_em_ordem(_estatisticas_segmento, [
+        (X, y, inicio, fim, centro_x, centro_y) for inicio, fim in zip(fronteiras, fronteiras[1:])
+    ], executor, workers)
+    # O primeiro segmento é só treino: cada fold usa o prefixo até o seu bloco de teste
+    acumulado = EstatisticasSuficientes(centro_x, centro_y).somar(segmentos[0])
+    modelos = []
+    for segmento in segmentos[1:]:
+        modelos.append(acumulado.resolver())
+        acumulado = acumulado.somar(segmento)
+
+    resultados = mapear_em_ordem(_metricas_teste, [
+        (X, y, inicio, fim, coef, intercepto, centro_y) for (inicio, fim), (coef, intercepto) in zip(limites, modelos)
+    ], executor, workers)
+    folds = [
+        {"inicio_teste": inicio, "fim_teste": fim, "coef": coef, "intercepto": intercepto, "r2": r2, "rmse": rmse}
+        for (inicio, fim), (coef, intercepto), (r2, rmse) in zip(limites, modelos, resultados)
+    ]
+    coef, intercepto = acumulado.resolver()
+    return {"folds": folds, "coef": coef, "intercepto": intercepto}
+
+
+# Separa o resultado de uma validação com vários alvos em um resultado por
+# alvo, no mesmo formato da validação de um alvo só
+def separar_alvos(cv: dict) -> list:
+    return [{
+        "folds": [{
+            "inicio_teste": fold["inicio_teste"], "fim_teste": fold["fim_teste"],
+            "coef": fold["coef"][:, j], "intercepto": float(fold["intercepto"][j]),
+            "r2": fold["r2"][j], "rmse": fold["rmse"][j],
+        } for fold in cv["folds"]],
+        "coef": cv["coef"][:, j],
+        "intercepto": float(cv["intercepto"][j]),
+    } for j in range(len(cv["intercepto"]))]
+
+
+# Monta um LinearRegression já ajustado a partir dos coeficientes
+def criar_regressao(coef, intercepto: float, colunas=None):
+    from sklearn.linear_model import LinearRegression
+    modelo = LinearRegression()
+    modelo.coef_ = np.asarray(coef, dtype=float)
+    modelo.intercept_ = intercepto
+    modelo.n_features_in_ = len(modelo.coef_)
+    if colunas is not None:
+        modelo.feature_names_in_ = np.asarray(colunas, dtype=object)
+    return modelo
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# Os testes importam os módulos como o app (ml.*, ingestao, ...), a partir
+# de backend/, e usam o armazenamento em memória
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("ARMAZENAMENTO", "memoria")
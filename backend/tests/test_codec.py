@@ -0,0 +1,67 @@
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.app2 import descriptografar_binario
+from ml.codec import (
+    criptografar_bytes, descriptografar_bytes, criptografar_blocos, descriptografar_blocos,
+    criptografar_arquivo, descriptografar_arquivo, EscritorCriptografado,
+)
+
+
+# A cifra de antes do codec, byte a byte
+def criptografar_antigo(dados: bytes) -> bytes:
+    return bytes([(b + 1) % 256 for b in dados])
+
+
+def descriptografar_antigo(dados: bytes) -> bytes:
+    return bytes([(b - 1) % 256 for b in dados])
+
+
+@pytest.fixture
+def dados():
+    # Todos os valores de byte (inclusive 0 e 255, onde o módulo vira) + aleatórios
+    return bytes(range(256)) + np.random.default_rng(0).integers(0, 256, size=10_000, dtype=np.uint8).tobytes()
+
+
+def test_buffer_igual_a_cifra_antiga(dados):
+    assert criptografar_bytes(dados) == criptografar_antigo(dados)
+    assert criptografar_bytes(bytearray(dados)) == criptografar_antigo(dados)
+    assert criptografar_bytes(memoryview(dados)) == criptografar_antigo(dados)
+    assert descriptografar_bytes(dados) == descriptografar_antigo(dados)
+    assert descriptografar_bytes(criptografar_bytes(dados)) == dados
+
+
+@pytest.mark.parametrize("tamanho_bloco", [1, 7, 256, 1 << 20])
+def test_blocos_igual_a_cifra_antiga(dados, tamanho_bloco):
+    # Blocos de entrada de tamanhos diferentes do tamanho_bloco do codec
+    entrada = [dados[:100], dados[100:5000], b"", dados[5000:]]
+    assert b"".join(criptografar_blocos(entrada, tamanho_bloco)) == criptografar_antigo(dados)
+    assert b"".join(descriptografar_blocos(entrada, tamanho_bloco)) == descriptografar_antigo(dados)
+
+
+def test_arquivo_igual_a_cifra_antiga(dados):
+    destino = io.BytesIO()
+    assert criptografar_arquivo(io.BytesIO(dados), destino, tamanho_bloco=333) == len(dados)
+    assert destino.getvalue() == criptografar_antigo(dados)
+
+    destino = io.BytesIO()
+    descriptografar_arquivo(io.BytesIO(criptografar_antigo(dados)), destino, tamanho_bloco=333)
+    assert destino.getvalue() == dados
+
+
+def test_escritor_criptografado(dados):
+    destino = io.BytesIO()
+    with gzip.GzipFile(fileobj=EscritorCriptografado(destino), mode="wb") as arquivo:
+        arquivo.write(dados)
+    assert gzip.decompress(descriptografar_antigo(destino.getvalue())) == dados
+
+
+# Os .bin gravados antes do codec (CSV cifrado byte a byte) continuam legíveis
+def test_le_binario_csv_antigo():
+    df = pd.DataFrame({"a": [1.5, 2.0, -3.25], "b": [10, 20, 30]})
+    antigo = criptografar_antigo(df.to_csv(index=False).encode())
+    pd.testing.assert_frame_equal(descriptografar_binario(antigo), df)
@@ -0,0 +1,105 @@
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestao import ErroIngestao, ler_csv_incremental, _fim_ultima_linha
+
+
+def csv_exemplo(linhas=200):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"data": np.arange(linhas), "a": rng.normal(size=linhas).round(6),
+                       "b": rng.integers(0, 100, size=linhas), "alvo": rng.normal(size=linhas).round(6)})
+    df.loc[[3, 50, 51], "a"] = np.nan
+    return df.to_csv(index=False).encode()
+
+
+# Arquivo que conta quantos bytes já foram lidos (para conferir o fail-fast)
+class ArquivoContado(io.BytesIO):
+    lidos = 0
+
+    def read(self, tamanho=-1):
+        pedaco = super().read(tamanho)
+        self.lidos += len(pedaco)
+        return pedaco
+
+
+# Qualquer tamanho de pedaço (até 1 byte, cortando linhas e números no meio)
+# dá o mesmo X/y do read_csv do arquivo inteiro
+@pytest.mark.parametrize("tamanho_bloco", [1, 7, 64, 1000, 1 << 20])
+def test_igual_ao_read_csv(tamanho_bloco):
+    dados = csv_exemplo()
+    X, y, resumo = ler_csv_incremental(io.BytesIO(dados), "alvo", tamanho_bloco=tamanho_bloco)
+    df = pd.read_csv(io.BytesIO(dados))
+    pd.testing.assert_frame_equal(X, df.drop(columns="alvo"))
+    pd.testing.assert_frame_equal(y, df[["alvo"]])
+    assert resumo.hexdigest() == hashlib.sha256(dados).hexdigest()
+
+
+def test_varios_alvos_e_sem_alvo():
+    dados = csv_exemplo()
+    df = pd.read_csv(io.BytesIO(dados))
+    X, y, _ = ler_csv_incremental(io.BytesIO(dados), ["alvo", "a", "alvo"], tamanho_bloco=100)
+    assert list(y.columns) == ["alvo", "a"] and list(X.columns) == ["data", "b"]
+    pd.testing.assert_frame_equal(y, df[["alvo", "a"]])
+    X, y, _ = ler_csv_incremental(io.BytesIO(dados), tamanho_bloco=100)
+    assert y is None
+    pd.testing.assert_frame_equal(X, df)
+
+
+def test_sem_quebra_no_final_e_crlf():
+    X, y, _ = ler_csv_incremental(io.BytesIO(b"a,alvo\r\n1,2\r\n3,4"), "alvo", tamanho_bloco=3)
+    assert X["a"].tolist() == [1, 3] and y["alvo"].tolist() == [2, 4]
+
+
+def test_campo_inexistente_para_no_cabecalho():
+    arquivo = ArquivoContado(csv_exemplo(20_000))
+    with pytest.raises(ErroIngestao, match="'nao_existe' não encontrado"):
+        ler_csv_incremental(arquivo, "nao_existe", tamanho_bloco=1024)
+    assert arquivo.lidos == 1024
+
+
+def test_coluna_nao_numerica_para_no_bloco():
+    dados = csv_exemplo(20_000) + b"1,texto,3,4\n" + csv_exemplo(20_000).split(b"\n", 1)[1]
+    arquivo = ArquivoContado(dados)
+    with pytest.raises(ErroIngestao, match=r"não numéricas: \['a'\]"):
+        ler_csv_incremental(arquivo, "alvo", tamanho_bloco=64 * 1024)
+    assert arquivo.lidos < len(dados)
+
+
+def test_alvo_nao_numerico():
+    with pytest.raises(ErroIngestao, match="alvo 'alvo' não é numérico"):
+        ler_csv_incremental(io.BytesIO(b"a,alvo\n1,x\n"), "alvo")
+
+
+def test_csv_vazio():
+    with pytest.raises(ErroIngestao, match="vazio"):
+        ler_csv_incremental(io.BytesIO(b""), "alvo")
+    with pytest.raises(ErroIngestao, match="Cabeçalho"):
+        ler_csv_incremental(io.BytesIO(b"\n\n  \n"), "alvo")
+
+
+def test_so_cabecalho():
+    X, y, _ = ler_csv_incremental(io.BytesIO(b"a,b,alvo\n"), "alvo")
+    assert list(X.columns) == ["a", "b"] and list(y.columns) == ["alvo"] and len(X) == 0
+
+
+# Com o esquema explícito tudo vem no dtype pedido, e o erro ainda aponta a coluna
+def test_esquema_float32():
+    dados = csv_exemplo()
+    X, y, _ = ler_csv_incremental(io.BytesIO(dados), "alvo", tamanho_bloco=500, dtype="float32")
+    assert set(X.dtypes) == {np.dtype("float32")} and y["alvo"].dtype == np.float32
+    esperado = pd.read_csv(io.BytesIO(dados), dtype="float32")
+    pd.testing.assert_frame_equal(X, esperado.drop(columns="alvo"))
+    with pytest.raises(ErroIngestao, match=r"não numéricas: \['b'\]"):
+        ler_csv_incremental(io.BytesIO(b"a,b,alvo\n1,2,3\n4,x,6\n"), "alvo", dtype="float32")
+
+
+# Quebra de linha dentro de aspas não é fim de linha
+def test_fim_ultima_linha_respeita_aspas():
+    assert _fim_ultima_linha(b'1,2\n3,"a\nb') == 4
+    assert _fim_ultima_linha(b'1,2\n3,"a\nb"\n4') == 12
+    assert _fim_ultima_linha(b'1,"a\nb') == 0
+    assert _fim_ultima_linha(b"1,2") == 0
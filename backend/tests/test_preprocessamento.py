@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.preprocessamento import EscalonadorMinMax, montar_matriz, interpolar_no_lugar
+
+
+# Colunas com ausentes em todo tipo de posição: início, meio, fim, trechos
+# seguidos, coluna vazia e coluna sem ausentes
+def dados_com_ausentes(linhas=500, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(size=(linhas, 6)).cumsum(axis=0), columns=[f"x{i}" for i in range(6)])
+    for coluna in df.columns[:3]:
+        df.loc[rng.random(linhas) < 0.2, coluna] = np.nan
+    df.iloc[:5, 0] = np.nan
+    df.iloc[-7:, 1] = np.nan
+    df.iloc[100:160, 2] = np.nan
+    df["x4"] = np.nan
+    df.iloc[[0, linhas - 1], 5] = np.nan
+    return df
+
+
+def test_interpolar_igual_ao_pandas():
+    for seed in range(20):
+        df = dados_com_ausentes(seed=seed)
+        matriz = df.to_numpy(copy=True)
+        restaram = interpolar_no_lugar(matriz)
+        esperado = df.interpolate(method="linear")
+        np.testing.assert_array_equal(matriz, esperado.to_numpy())
+        np.testing.assert_array_equal(restaram, esperado.isna().any().to_numpy())
+
+
+def test_interpolar_float32():
+    df = dados_com_ausentes()
+    matriz = df.to_numpy(dtype=np.float32)
+    interpolar_no_lugar(matriz)
+    assert matriz.dtype == np.float32
+    esperado = df.astype(np.float32).interpolate(method="linear").to_numpy()
+    np.testing.assert_allclose(matriz, esperado, rtol=1e-6)
+
+
+@pytest.mark.parametrize("linhas", [0, 1, 2])
+def test_interpolar_poucas_linhas(linhas):
+    df = pd.DataFrame({"a": [np.nan, 1.0][:linhas], "b": [2.0, np.nan][:linhas]})
+    matriz = df.to_numpy(copy=True)
+    interpolar_no_lugar(matriz)
+    np.testing.assert_array_equal(matriz, df.interpolate(method="linear").to_numpy())
+
+
+def test_montar_matriz():
+    X = pd.DataFrame({"a": [1, 2, 3], "b": pd.array([1.5, None, 3.5], dtype="Float64")})
+    y = pd.Series([10.0, 20.0, 30.0], name="y")
+    matriz = montar_matriz(X, y, dtype=np.float64)
+    assert matriz.shape == (3, 3) and matriz.flags.c_contiguous
+    np.testing.assert_array_equal(matriz, [[1, 1.5, 10], [2, np.nan, 20], [3, 3.5, 30]])
+    assert montar_matriz(X, y, dtype=np.float32).dtype == np.float32
+
+
+def test_transformar_no_lugar_igual_ao_transform():
+    df = dados_com_ausentes().interpolate(method="linear").bfill()
+    df["constante"] = 3.0
+    escalonador = EscalonadorMinMax().fit(df)
+    matriz = df.to_numpy(copy=True)
+    escalonador.transformar_no_lugar(matriz)
+    np.testing.assert_array_equal(matriz, escalonador.transform(df).to_numpy())
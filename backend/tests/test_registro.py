@@ -0,0 +1,124 @@
+import uuid
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml import registro
+from ml.modelo_compacto import ModeloLinear
+from ml.preprocessamento import EscalonadorMinMax
+
+X = pd.DataFrame({"a": [0.0, 1.0, 2.0, 4.0], "b": [1.0, 3.0, 2.0, 5.0]})
+
+
+def criar_modelo(coef, intercepto=0.0):
+    escalonador = EscalonadorMinMax().fit(X)
+    return ModeloLinear.de_escalonador(escalonador, [coef], [intercepto], list(X.columns), ["alvo"])
+
+
+# Cada teste com uma sessão nova, a pasta local num diretório temporário e o
+# estado do processo zerado; TTL 0 para o ponteiro ser revalidado sempre
+@pytest.fixture
+def sessao(monkeypatch, tmp_path):
+    monkeypatch.setattr(registro, "REGISTRO_DIR_LOCAL", tmp_path)
+    monkeypatch.setattr(registro, "MODELO_CACHE_TTL", 0)
+    monkeypatch.setattr(registro, "_atuais", OrderedDict())
+    monkeypatch.setattr(registro, "_artefatos", weakref.WeakValueDictionary())
+    return f"teste-registro-{uuid.uuid4().hex[:8]}"
+
+
+# Outro worker: nada aberto no processo (e, opcionalmente, nada na pasta local)
+def simular_outro_worker(monkeypatch, tmp_path, pasta_vazia=False):
+    monkeypatch.setattr(registro, "_atuais", OrderedDict())
+    monkeypatch.setattr(registro, "_artefatos", weakref.WeakValueDictionary())
+    if pasta_vazia:
+        monkeypatch.setattr(registro, "REGISTRO_DIR_LOCAL", tmp_path / "outro")
+
+
+def test_publicar_e_reverter(sessao):
+    m1, m2 = criar_modelo([1.0, 2.0]), criar_modelo([3.0, -1.0], 5.0)
+    v1 = registro.publicar_modelo(m1, sessao)
+    v2 = registro.publicar_modelo(m2, sessao)
+    np.testing.assert_array_equal(registro.modelo_atual(sessao).predict(X), m2.predict(X))
+
+    versoes = registro.listar_versoes(sessao)
+    assert versoes["atual"] == v2
+    assert [v["versao"] for v in versoes["versoes"]] == [v2, v1]
+
+    # Volta para a anterior e desfaz a volta
+    assert registro.reverter_modelo(sessao) == v1
+    np.testing.assert_array_equal(registro.modelo_atual(sessao).predict(X), m1.predict(X))
+    assert registro.reverter_modelo(sessao, v2) == v2
+    np.testing.assert_array_equal(registro.modelo_atual(sessao).predict(X), m2.predict(X))
+    assert registro.bytes_modelo_atual(sessao) == m2.para_bytes()
+
+
+def test_reverter_sem_historico(sessao):
+    registro.publicar_modelo(criar_modelo([1.0, 1.0]), sessao)
+    with pytest.raises(ValueError, match="Não há versão anterior"):
+        registro.reverter_modelo(sessao)
+    with pytest.raises(ValueError, match="não está no histórico"):
+        registro.reverter_modelo(sessao, "20000101T000000000000Z-0000000000000000")
+
+
+def test_historico_limitado(sessao, monkeypatch):
+    monkeypatch.setattr(registro, "REGISTRO_HISTORICO", 2)
+    versoes = [registro.publicar_modelo(criar_modelo([float(i), 1.0]), sessao) for i in range(5)]
+    assert [v["versao"] for v in registro.listar_versoes(sessao)["versoes"]] == versoes[:-4:-1]
+
+
+# A troca feita por outro worker (aqui, o ponteiro gravado direto) é vista no
+# próximo modelo_atual, sem reiniciar
+def test_troca_feita_por_outro_worker(sessao):
+    m1, m2 = criar_modelo([1.0, 2.0]), criar_modelo([3.0, -1.0])
+    v1 = registro.publicar_modelo(m1, sessao)
+    v2 = registro.publicar_modelo(m2, sessao)
+    registro.modelo_atual(sessao)
+    registro._gravar_ponteiro({"versao": v1, "anteriores": [v2]}, sessao)
+    np.testing.assert_array_equal(registro.modelo_atual(sessao).predict(X), m1.predict(X))
+
+
+# Um worker novo abre o artefato da pasta local (mmap) ou, sem ele, baixa do armazenamento
+@pytest.mark.parametrize("pasta_vazia", [False, True])
+def test_worker_novo_carrega_versao(sessao, monkeypatch, tmp_path, pasta_vazia):
+    modelo = criar_modelo([2.0, 0.5], 1.0)
+    registro.publicar_modelo(modelo, sessao)
+    simular_outro_worker(monkeypatch, tmp_path, pasta_vazia)
+    antes = registro.estatisticas_registro()
+    np.testing.assert_array_equal(registro.modelo_atual(sessao).predict(X), modelo.predict(X))
+    depois = registro.estatisticas_registro()
+    assert depois["downloads"] - antes["downloads"] == int(pasta_vazia)
+    assert depois["mapeados"] - antes["mapeados"] == 1
+
+
+def test_alvo_desconhecido(sessao):
+    registro.publicar_modelo(criar_modelo([1.0, 2.0]), sessao)
+    with pytest.raises(ValueError, match="não tem o alvo 'outro'"):
+        registro.modelo_atual(sessao).predict(X, alvo="outro")
+
+
+# Publicação de outro worker na mesma sessão, com o artefato já gravado e o
+# ponteiro ainda não: a limpeza desta publicação não pode apagar o artefato dela
+def test_limpeza_nao_apaga_publicacao_em_andamento(sessao, monkeypatch):
+    monkeypatch.setattr(registro, "REGISTRO_HISTORICO", 1)
+    for i in range(3):
+        registro.publicar_modelo(criar_modelo([float(i), 1.0]), sessao)
+    outro = criar_modelo([9.0, 9.0])
+    dados = outro.para_bytes()
+    versao_outro = registro._nova_versao(outro.impressao)
+    registro.upload_bytes(dados, registro._nome_blob(versao_outro), "uploads", sessao=sessao)
+    registro.publicar_modelo(criar_modelo([4.0, 1.0]), sessao)
+    versoes = [v["versao"] for v in registro.listar_versoes(sessao)["versoes"]]
+    assert versao_outro in versoes and len(versoes) == 3
+
+
+# Artefato do ponteiro sumiu: usa a anterior mais recente em vez de falhar
+def test_usa_anterior_se_artefato_sumiu(sessao, monkeypatch, tmp_path):
+    m1, m2 = criar_modelo([1.0, 2.0]), criar_modelo([3.0, -1.0])
+    registro.publicar_modelo(m1, sessao)
+    v2 = registro.publicar_modelo(m2, sessao)
+    registro.apagar_blob(registro._nome_blob(v2), "uploads", sessao=sessao)
+    simular_outro_worker(monkeypatch, tmp_path, pasta_vazia=True)
+    np.testing.assert_array_equal(registro.modelo_atual(sessao).predict(X), m1.predict(X))
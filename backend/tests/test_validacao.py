@@ -0,0 +1,57 @@
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import TimeSeriesSplit
+
+from ml.validacao import validacao_cruzada_incremental
+
+
+# O que o treino fazia antes: um LinearRegression por fold do TimeSeriesSplit + o final
+def loop_sklearn(X, y, n_splits):
+    folds = []
+    for treino, teste in TimeSeriesSplit(n_splits=n_splits).split(X):
+        modelo = LinearRegression().fit(X[treino], y[treino])
+        y_pred = modelo.predict(X[teste])
+        folds.append((modelo.coef_, modelo.score(X[teste], y[teste]), np.sqrt(np.mean((y[teste] - y_pred) ** 2))))
+    return folds, LinearRegression().fit(X, y)
+
+
+def conferir(X, y, n_splits=5, atol=1e-8):
+    cv = validacao_cruzada_incremental(X, y, n_splits)
+    folds, final = loop_sklearn(X, y, n_splits)
+    for fold, (coef, r2, rmse) in zip(cv["folds"], folds):
+        np.testing.assert_allclose(fold["coef"], coef, rtol=1e-6, atol=atol)
+        np.testing.assert_allclose(fold["r2"], r2, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(fold["rmse"], rmse, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(cv["coef"], final.coef_, rtol=1e-6, atol=atol)
+    np.testing.assert_allclose(cv["intercepto"], final.intercept_, rtol=1e-6, atol=atol)
+
+
+def test_igual_ao_loop_do_sklearn():
+    rng = np.random.default_rng(0)
+    X = rng.random((3000, 8))
+    y = X @ rng.normal(size=8) + rng.normal(scale=0.1, size=3000)
+    conferir(X, y)
+
+
+# Variáveis quase colineares: resolver X^T X direto dava coeficientes da
+# ordem de 1e4 com sinais opostos; o LinearRegression dá os estáveis
+def test_variaveis_quase_colineares():
+    rng = np.random.default_rng(1)
+    x1 = rng.random(20000)
+    X = np.c_[x1, x1 + 1e-7 * rng.normal(size=20000), rng.random(20000)]
+    X = (X - X.min(axis=0)) / (X.max(axis=0) - X.min(axis=0))
+    y = 2 * X[:, 0] + 3 * X[:, 1] + X[:, 2] + rng.normal(scale=0.1, size=20000)
+    conferir(X, y, atol=1e-6)
+    coef = validacao_cruzada_incremental(X, y, 5)["coef"]
+    assert np.abs(coef).max() < 10
+
+
+def test_varios_alvos_igual_a_um_por_vez():
+    rng = np.random.default_rng(2)
+    X = rng.random((2000, 5))
+    Y = X @ rng.normal(size=(5, 3)) + rng.normal(scale=0.1, size=(2000, 3))
+    conjunto = validacao_cruzada_incremental(X, Y, 4)
+    for j in range(3):
+        separado = validacao_cruzada_incremental(X, Y[:, j], 4)
+        np.testing.assert_allclose(conjunto["coef"][:, j], separado["coef"], rtol=1e-10)
+        np.testing.assert_allclose([f["r2"][j] for f in conjunto["folds"]], [f["r2"] for f in separado["folds"]])
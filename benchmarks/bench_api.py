@@ -0,0 +1,241 @@
+"""Benchmark de ponta a ponta da API de ML.
+
+Gera CSVs sintéticos de séries temporais (tendência + sazonalidade +
+variáveis em passeio aleatório) para cada combinação de linhas x colunas
+e mede, com o app FastAPI rodando no próprio processo e o armazenamento
+em memória (ARMAZENAMENTO=memoria, ml/armazenamento.py):
+
+- as rotas /upload/, /avaliar/, /prever/ e /prever/csv/ (cada job é
+  acompanhado até terminar, gráfico incluído);
+- as funções normalizar_minmax, descriptografar_binario e treinar_modelo.
+
+Para cada etapa mostra p50/p95/p99, vazão (linhas/s e MB/s) e o pico de
+RSS do processo durante a etapa, e grava tudo em JSON. Com --comparar,
+compara com o JSON de outro commit e aponta as regressões (sai com
+código 1 se alguma etapa ficar mais lenta que a tolerância).
+
+Uso: python benchmarks/bench_api.py [--linhas 1000,100000] [--colunas 1,10,100] [--repeticoes 5] [--aquecimento 1]
+                                    [--saida bench_api.json] [--comparar anterior.json] [--tolerancia 0.1]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ / "backend"))
+
+# Armazenamento em memória e sem o cache de resultados (senão a partir da
+# 2ª repetição o /upload/ só devolveria o resultado guardado)
+os.environ["ARMAZENAMENTO"] = "memoria"
+os.environ["CACHE_RESULTADOS_MAX_MB"] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app  # noqa: E402
+from microlote import EstatisticasLatencia  # noqa: E402
+from ml.app2 import normalizar_minmax, descriptografar_binario, treinar_modelo  # noqa: E402
+
+SESSAO = "bench-api-sessao"
+CABECALHOS = {app.CABECALHO_SESSAO: SESSAO}
+
+
+def gerar_csv(linhas, colunas, semente=0):
+    rng = np.random.default_rng(semente)
+    t = np.arange(linhas)
+    X = np.cumsum(rng.normal(size=(linhas, colunas)), axis=0)
+    y = 0.01 * t + np.sin(2 * np.pi * t / 24) + X @ rng.normal(size=colunas) + rng.normal(scale=0.5, size=linhas)
+    df = pd.DataFrame(X, columns=[f"x{i}" for i in range(colunas)]).assign(alvo=y)
+    return df, df.to_csv(index=False).encode(), df.drop(columns="alvo").to_csv(index=False).encode()
+
+
+def rss_atual():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Sem /proc: o máximo do processo inteiro (ru_maxrss vem em KB no Linux, em bytes no macOS)
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximo if sys.platform == "darwin" else maximo * 1024
+
+
+# Amostra o RSS numa thread enquanto a etapa roda e guarda o maior valor
+class PicoRSS:
+    def __init__(self, intervalo=0.005):
+        self.intervalo = intervalo
+        self.pico = 0
+
+    def __enter__(self):
+        self.pico = rss_atual()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+        self._thread.start()
+        return self
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, rss_atual())
+
+    def __exit__(self, *erro):
+        self._parar.set()
+        self._thread.join()
+        self.pico = max(self.pico, rss_atual())
+
+
+def esperar_job(cliente, resposta):
+    if resposta.status_code not in (200, 202):
+        raise RuntimeError(f"{resposta.status_code}: {resposta.text}")
+    url = resposta.json()["status_url"]
+    while True:
+        job = cliente.get(url).json()
+        if job["status"] == "erro":
+            raise RuntimeError(job.get("erro"))
+        if job["status"] == "concluido" and job.get("pendentes", 0) == 0:
+            return job
+        time.sleep(0.002)
+
+
+def medir(nome, funcao, repeticoes, linhas, tamanho_bytes, aquecimento=1):
+    for _ in range(aquecimento):
+        funcao()
+    latencias = EstatisticasLatencia(amostras=repeticoes)
+    pico = 0
+    duracoes = []
+    for _ in range(repeticoes):
+        with PicoRSS() as rss:
+            inicio = time.perf_counter()
+            funcao()
+            duracao = time.perf_counter() - inicio
+        latencias.registrar(duracao)
+        duracoes.append(duracao)
+        pico = max(pico, rss.pico)
+    media = float(np.mean(duracoes))
+    p = latencias.percentis()
+    return {
+        "etapa": nome,
+        "repeticoes": repeticoes,
+        "p50_ms": p["p50_ms"], "p95_ms": p["p95_ms"], "p99_ms": p["p99_ms"],
+        "media_ms": round(media * 1000, 3),
+        "linhas_por_s": round(linhas / media, 1),
+        "mb_por_s": round(tamanho_bytes / media / 1e6, 3),
+        "rss_pico_mb": round(pico / 1e6, 1),
+    }
+
+
+def etapas_cenario(cliente, linhas, colunas):
+    df, csv, csv_x = gerar_csv(linhas, colunas)
+    X, y = df.drop(columns="alvo"), df[["alvo"]]
+    binario = app.criptografar_df(X)
+    arquivo = {"file": ("dados.csv", csv)}
+
+    def upload():
+        esperar_job(cliente, cliente.post("/upload/", files=arquivo, data={"campo": "alvo"}, headers=CABECALHOS))
+
+    def avaliar():
+        esperar_job(cliente, cliente.post("/avaliar/", files=arquivo, data={"campo": "alvo"}, headers=CABECALHOS))
+
+    def prever():
+        esperar_job(cliente, cliente.post("/prever/", files={"file": ("dados.csv", csv_x)}, headers=CABECALHOS))
+
+    def prever_csv():
+        resposta = cliente.get("/prever/csv/", headers=CABECALHOS)
+        if resposta.status_code != 200:
+            raise RuntimeError(resposta.text)
+
+    # A ordem importa: /avaliar/ usa o modelo do /upload/ e o /prever/csv/ o artefato do /prever/
+    return [
+        ("upload", upload, len(csv)),
+        ("avaliar", avaliar, len(csv)),
+        ("prever", prever, len(csv_x)),
+        ("prever_csv", prever_csv, len(csv_x)),
+        ("normalizar_minmax", lambda: normalizar_minmax(X), X.memory_usage(index=False).sum()),
+        ("descriptografar_binario", lambda: descriptografar_binario(binario), len(binario)),
+        ("treinar_modelo", lambda: treinar_modelo(X, y, sessao=SESSAO), X.memory_usage(index=False).sum()),
+    ]
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(resultados, arquivo_anterior, tolerancia):
+    anterior = json.loads(Path(arquivo_anterior).read_text())
+    chave = lambda r: (r["etapa"], r["linhas"], r["colunas"])  # noqa: E731
+    base = {chave(r): r for r in anterior["resultados"]}
+    print(f"\nComparação com {anterior.get('commit') or arquivo_anterior} (p50, tolerância {tolerancia:.0%})")
+    print(f"{'etapa':<24} {'linhas':>9} {'colunas':>7} {'antes (ms)':>11} {'agora (ms)':>11} {'variação':>9}")
+    regressoes = 0
+    for r in resultados:
+        antes = base.get(chave(r))
+        if antes is None:
+            continue
+        variacao = r["p50_ms"] / antes["p50_ms"] - 1 if antes["p50_ms"] else 0.0
+        marca = "  <- regressão" if variacao > tolerancia else ""
+        regressoes += bool(marca)
+        print(f"{r['etapa']:<24} {r['linhas']:>9} {r['colunas']:>7} {antes['p50_ms']:>11.2f} "
+              f"{r['p50_ms']:>11.2f} {variacao:>+8.1%}{marca}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", default="1000,100000")
+    parser.add_argument("--colunas", default="1,10,100")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--aquecimento", type=int, default=1, help="execuções não medidas antes de cada etapa")
+    parser.add_argument("--max-celulas", type=float, default=5e7,
+                        help="pula combinações com mais linhas x colunas que isso")
+    parser.add_argument("--saida", default="bench_api.json")
+    parser.add_argument("--comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.1)
+    args = parser.parse_args()
+
+    resultados = []
+    print(f"{'etapa':<24} {'linhas':>9} {'colunas':>7} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} "
+          f"{'linhas/s':>12} {'MB/s':>8} {'RSS (MB)':>9}")
+    with TestClient(app.app) as cliente:
+        for linhas in (int(float(n)) for n in args.linhas.split(",")):
+            for colunas in (int(c) for c in args.colunas.split(",")):
+                if linhas * colunas > args.max_celulas:
+                    print(f"(pulando {linhas} x {colunas}: acima de --max-celulas)")
+                    continue
+                for nome, funcao, tamanho in etapas_cenario(cliente, linhas, colunas):
+                    r = {"linhas": linhas, "colunas": colunas,
+                         **medir(nome, funcao, args.repeticoes, linhas, tamanho, args.aquecimento)}
+                    resultados.append(r)
+                    print(f"{nome:<24} {linhas:>9} {colunas:>7} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} "
+                          f"{r['p99_ms']:>10.2f} {r['linhas_por_s']:>12.0f} {r['mb_por_s']:>8.2f} "
+                          f"{r['rss_pico_mb']:>9.1f}")
+
+    saida = {
+        "commit": commit_atual(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "nucleos": os.cpu_count(),
+        "repeticoes": args.repeticoes,
+        "resultados": resultados,
+    }
+    Path(args.saida).write_text(json.dumps(saida, indent=2, ensure_ascii=False))
+    print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar and comparar(resultados, args.comparar, args.tolerancia):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark de throughput (MB/s) da cifra dos arquivos .bin.
+
+Compara a implementação antiga (lista byte a byte) com o codec por tabela.
+
+Uso: python benchmarks/bench_codec.py [--mb 64] [--repeticoes 3]
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ml.codec import (  # noqa: E402
+    criptografar_arquivo,
+    criptografar_blocos,
+    criptografar_bytes,
+    descriptografar_bytes,
+)
+
+
+def legado_criptografar(dados: bytes) -> bytes:
+    return bytes([(b + 1) % 256 for b in dados])
+
+
+def medir(nome, funcao, dados, repeticoes):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(dados)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    mb_s = len(dados) / melhor / 1e6
+    print(f"{nome:<32} {melhor * 1000:10.1f} ms {mb_s:10.1f} MB/s")
+    return mb_s
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=64)
+    parser.add_argument("--legado-mb", type=int, default=8, help="tamanho usado na versão antiga (lenta)")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    dados = os.urandom(args.mb * 1024 * 1024)
+    amostra = dados[: args.legado_mb * 1024 * 1024]
+
+    # Confere que o formato continua idêntico ao antigo
+    assert criptografar_bytes(amostra) == legado_criptografar(amostra)
+    assert descriptografar_bytes(criptografar_bytes(dados)) == dados
+
+    print(f"payload: {args.mb} MB (legado: {args.legado_mb} MB)")
+    medir("legado (lista por byte)", legado_criptografar, amostra, 1)
+    medir("codec bytes", criptografar_bytes, dados, args.repeticoes)
+    medir("codec memoryview", lambda d: criptografar_bytes(memoryview(d)), dados, args.repeticoes)
+    medir("codec blocos (stream)", lambda d: sum(len(b) for b in criptografar_blocos([d])), dados, args.repeticoes)
+    medir("codec arquivo", lambda d: criptografar_arquivo(BytesIO(d), BytesIO()), dados, args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
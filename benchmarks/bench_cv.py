@@ -0,0 +1,81 @@
+"""Benchmark da validação cruzada temporal do treinar_modelo.
+
+Compara o loop antigo (LinearRegression reajustado em cada fold do
+TimeSeriesSplit + ajuste final) com o motor incremental de estatísticas
+suficientes (ml/validacao.py) em datasets largos e longos, e confere que
+R²/RMSE por fold e os coeficientes finais batem.
+
+Uso: python benchmarks/bench_cv.py [--splits 5] [--cenarios largo,longo]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import TimeSeriesSplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ml.validacao import validacao_cruzada_incremental  # noqa: E402
+
+CENARIOS = {
+    "largo": (20_000, 500),
+    "longo": (2_000_000, 10),
+    "medio": (200_000, 50),
+}
+
+
+def gerar(n, p, semente=0):
+    rng = np.random.default_rng(semente)
+    X = rng.random((n, p))
+    y = X @ rng.normal(size=p) + rng.normal(scale=0.1, size=n)
+    return pd.DataFrame(X, columns=[f"x{i}" for i in range(p)]), pd.Series(y, name="y")
+
+
+def loop_antigo(X, y, n_splits):
+    r2s, rmses = [], []
+    for train_idx, test_idx in TimeSeriesSplit(n_splits=n_splits).split(X):
+        modelo = LinearRegression().fit(X.iloc[train_idx], y.iloc[train_idx])
+        y_pred = modelo.predict(X.iloc[test_idx])
+        r2s.append(modelo.score(X.iloc[test_idx], y.iloc[test_idx]))
+        rmses.append(mean_squared_error(y.iloc[test_idx], y_pred) ** 0.5)
+    final = LinearRegression().fit(X, y)
+    return r2s, rmses, final.coef_
+
+
+def motor_incremental(X, y, n_splits):
+    cv = validacao_cruzada_incremental(X.to_numpy(dtype=float), y.to_numpy(dtype=float), n_splits)
+    return [f["r2"] for f in cv["folds"]], [f["rmse"] for f in cv["folds"]], cv["coef"]
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--splits", type=int, default=5)
+    parser.add_argument("--cenarios", default="largo,longo")
+    args = parser.parse_args()
+
+    print(f"{'cenário':<8} {'n':>10} {'p':>5} {'antigo (s)':>11} {'incremental (s)':>16} {'speedup':>8}")
+    for nome in args.cenarios.split(","):
+        n, p = CENARIOS[nome]
+        X, y = gerar(n, p)
+        t_antigo, (r2_a, rmse_a, coef_a) = cronometrar(loop_antigo, X, y, args.splits)
+        t_novo, (r2_n, rmse_n, coef_n) = cronometrar(motor_incremental, X, y, args.splits)
+
+        assert np.allclose(r2_a, r2_n, rtol=1e-6, atol=1e-8), (r2_a, r2_n)
+        assert np.allclose(rmse_a, rmse_n, rtol=1e-6, atol=1e-8), (rmse_a, rmse_n)
+        assert np.allclose(coef_a, coef_n, rtol=1e-6, atol=1e-8)
+        print(f"{nome:<8} {n:>10} {p:>5} {t_antigo:>11.3f} {t_novo:>16.3f} {t_antigo / t_novo:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
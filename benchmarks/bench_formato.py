@@ -0,0 +1,73 @@
+"""Benchmark do formato dos .bin do container uploads.
+
+Compara o CSV cifrado (legado) com o formato colunar (ml/formato.py) em
+cada compressão disponível: tamanho do blob, tempo para gravar
+(serializar + cifrar) e tempo para ler (decifrar + parse), que é o que o
+/avaliar/ e o /prever/csv/ pagam a cada download.
+
+Uso: python benchmarks/bench_formato.py [--linhas 200000] [--colunas 20] [--repeticoes 3]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ml import formato  # noqa: E402
+from ml.codec import criptografar_bytes, descriptografar_bytes  # noqa: E402
+
+
+def gerar(linhas, colunas, semente=0):
+    rng = np.random.default_rng(semente)
+    df = pd.DataFrame(rng.normal(size=(linhas, colunas)), columns=[f"x{i}" for i in range(colunas)])
+    # Uma coluna inteira e uma "série" mais compressível, como nos dados reais
+    df["contador"] = np.arange(linhas)
+    df["nivel"] = np.round(np.cumsum(rng.normal(size=linhas)), 2)
+    return df
+
+
+def melhor_tempo(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=200_000)
+    parser.add_argument("--colunas", type=int, default=20)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    df = gerar(args.linhas, args.colunas)
+    variantes = [("csv", None)]
+    for compressao in ("nenhuma", "zlib", "lz4", "zstd"):
+        try:
+            formato.compressao_padrao(compressao)
+        except RuntimeError:
+            continue
+        variantes.append(("colunar", compressao))
+
+    print(f"{args.linhas} linhas x {df.shape[1]} colunas")
+    print(f"{'formato':<20} {'tamanho (MB)':>13} {'gravar (s)':>11} {'ler (s)':>9}")
+    for nome, compressao in variantes:
+        t_gravar, blob = melhor_tempo(
+            lambda: criptografar_bytes(formato.serializar_dataframe(df, nome, compressao)), args.repeticoes
+        )
+        t_ler, lido = melhor_tempo(
+            lambda: formato.desserializar_dataframe(descriptografar_bytes(blob)), args.repeticoes
+        )
+        assert np.allclose(lido.to_numpy(dtype=float), df.to_numpy(dtype=float))
+        rotulo = nome if compressao is None else f"{nome}/{compressao}"
+        print(f"{rotulo:<20} {len(blob) / 1e6:>13.1f} {t_gravar:>11.3f} {t_ler:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
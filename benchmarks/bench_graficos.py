@@ -0,0 +1,73 @@
+"""Benchmark da renderização do gráfico de avaliação.
+
+Compara o desenho antigo (série inteira + todos os pontos de dispersão,
+PNG a 300 dpi com bbox_inches='tight') com o novo (ml/graficos.py:
+séries reduzidas com LTTB, dispersão amostrada, PNG no GRAFICO_DPI ou
+SVG no modo "auto").
+
+Uso: python benchmarks/bench_graficos.py [--linhas 1000000]
+"""
+import argparse
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from matplotlib.figure import Figure
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ml import graficos  # noqa: E402
+from ml.app2 import figura_avaliacao  # noqa: E402
+
+
+def gerar(linhas, semente=0):
+    rng = np.random.default_rng(semente)
+    y = np.cumsum(rng.normal(size=linhas))
+    return np.arange(linhas), y, y + rng.normal(scale=0.5, size=linhas)
+
+
+def desenho_antigo(indices, y, y_pred):
+    fig = Figure(figsize=(12, 8))
+    ax1, ax2 = fig.subplots(2, 1)
+    ax1.plot(indices, y, color='blue', linewidth=2)
+    ax1.plot(indices, y_pred, color='red', linewidth=2)
+    ax2.scatter(y, y_pred, color='blue')
+    fig.tight_layout()
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def desenho_novo(indices, y, y_pred, formato):
+    fig = figura_avaliacao(indices, y, y_pred, 1.0, 0.9)
+    formato = graficos.formato_figura(fig, formato)
+    return graficos.figura_para_bytes(fig, formato)
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    indices, y, y_pred = gerar(args.linhas)
+    print(f"{args.linhas} linhas")
+    print(f"{'desenho':<22} {'tempo (s)':>10} {'tamanho (KB)':>13}")
+    for nome, funcao, extra in [
+        ("antigo (png 300dpi)", desenho_antigo, ()),
+        (f"novo (png {graficos.GRAFICO_DPI}dpi)", desenho_novo, ("png",)),
+        ("novo (auto)", desenho_novo, ("auto",)),
+    ]:
+        tempo, dados = cronometrar(funcao, indices, y, y_pred, *extra)
+        print(f"{nome:<22} {tempo:>10.2f} {len(dados) / 1024:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
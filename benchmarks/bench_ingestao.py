@@ -0,0 +1,88 @@
+"""Benchmark da leitura dos uploads CSV: arquivo inteiro vs. incremental.
+
+Compara, cada um num processo novo (para o pico de RSS ser só dele):
+
+- inteiro: o que os endpoints faziam antes, `file.read()` do upload todo,
+  `pd.read_csv(BytesIO(...))` e depois `df[[campo]]` / `df.drop(columns=...)`;
+- incremental: ingestao.ler_csv_incremental, que converte o CSV em pedaços
+  enquanto lê, separa X e y direto e calcula o hash no caminho.
+
+Mede o tempo, o pico de RSS acima do processo já com pandas carregado e o
+tempo até o erro quando o campo não existe no CSV.
+
+Uso: python benchmarks/bench_ingestao.py [--linhas 1000000] [--colunas 10] [--repeticoes 3]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+
+MEDICAO = r"""
+import hashlib, io, json, resource, sys, time
+import numpy as np, pandas as pd
+from ingestao import ErroIngestao, ler_csv_incremental
+
+caminho, modo, campo = sys.argv[1:4]
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+inicio = time.perf_counter()
+with open(caminho, "rb") as arquivo:
+    if modo == "inteiro":
+        conteudo = arquivo.read()
+        df = pd.read_csv(io.BytesIO(conteudo))
+        if campo not in df.columns:
+            raise SystemExit(json.dumps({"tempo": time.perf_counter() - inicio, "erro": True}))
+        hashlib.sha256(conteudo).hexdigest()
+        y, X = df[[campo]], df.drop(columns=[campo])
+    else:
+        try:
+            X, y, resumo = ler_csv_incremental(arquivo, campo)
+        except ErroIngestao:
+            raise SystemExit(json.dumps({"tempo": time.perf_counter() - inicio, "erro": True}))
+tempo = time.perf_counter() - inicio
+pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"tempo": tempo, "pico_mb": (pico - base) / 1024, "linhas": len(X)}))
+"""
+
+
+def rodar(caminho, modo, campo):
+    processo = subprocess.run([sys.executable, "-c", MEDICAO, str(caminho), modo, campo], cwd=BACKEND,
+                              capture_output=True, text=True)
+    saida = (processo.stdout or processo.stderr).strip().splitlines()[-1]
+    return json.loads(saida)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--colunas", type=int, default=10)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(args.linhas, args.colunas)), columns=[f"x{i}" for i in range(args.colunas)])
+    df["alvo"] = rng.normal(size=args.linhas)
+    with tempfile.NamedTemporaryFile(suffix=".csv") as arquivo:
+        df.to_csv(arquivo.name, index=False)
+        tamanho_mb = Path(arquivo.name).stat().st_size / 1e6
+        dados_mb = df.memory_usage(index=False).sum() / 1e6
+        del df
+        print(f"{args.linhas} linhas x {args.colunas + 1} colunas: CSV de {tamanho_mb:.1f} MB, "
+              f"DataFrame de {dados_mb:.1f} MB")
+        print(f"{'modo':<13} {'tempo (s)':>10} {'pico RSS (MB)':>14} {'erro de campo (s)':>18}")
+        for modo in ("inteiro", "incremental"):
+            medicoes = [rodar(arquivo.name, modo, "alvo") for _ in range(args.repeticoes)]
+            erros = [rodar(arquivo.name, modo, "inexistente") for _ in range(args.repeticoes)]
+            print(f"{modo:<13} {np.median([m['tempo'] for m in medicoes]):>10.3f} "
+                  f"{np.median([m['pico_mb'] for m in medicoes]):>14.1f} "
+                  f"{np.median([e['tempo'] for e in erros]):>18.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark da inicialização a frio do backend.
+
+Para cada repetição sobe um processo Python novo (armazenamento em
+memória) e mede:
+
+- import: tempo do `import app`;
+- 1ª página: GET / logo depois do import (o que um health check ou o
+  primeiro usuário paga numa instância nova);
+- 1º treino: o primeiro /upload/ com um CSV pequeno, até o job e o gráfico
+  terminarem (inclui carregar as bibliotecas de ML sob demanda).
+
+Também mostra quais bibliotecas pesadas já estão carregadas depois do import.
+
+Uso: python benchmarks/bench_inicializacao.py [--repeticoes 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+
+MEDICAO = r"""
+import json, sys, time
+inicio = time.perf_counter()
+import app
+t_import = time.perf_counter() - inicio
+pesados = sorted(m for m in ("pandas", "sklearn", "matplotlib", "scipy", "azure.storage.blob") if m in sys.modules)
+
+from fastapi.testclient import TestClient
+with TestClient(app.app) as cliente:
+    inicio = time.perf_counter()
+    assert cliente.get("/").status_code == 200
+    t_pagina = time.perf_counter() - inicio
+
+    csv = "x,alvo\n" + "\n".join(f"{i},{2 * i + (i % 3)}" for i in range(50))
+    inicio = time.perf_counter()
+    resposta = cliente.post("/upload/", files={"file": ("d.csv", csv.encode())}, data={"campo": "alvo"})
+    url = resposta.json()["status_url"]
+    while True:
+        job = cliente.get(url).json()
+        if job["status"] in ("concluido", "erro") and job.get("pendentes", 0) == 0:
+            break
+        time.sleep(0.005)
+    assert job["status"] == "concluido", job
+    t_treino = time.perf_counter() - inicio
+
+print(json.dumps({"import": t_import, "pagina": t_pagina, "treino": t_treino, "pesados": pesados}))
+"""
+
+
+def rodar():
+    ambiente = {**os.environ, "ARMAZENAMENTO": "memoria", "CACHE_RESULTADOS_MAX_MB": "0"}
+    saida = subprocess.run([sys.executable, "-c", MEDICAO], cwd=BACKEND, env=ambiente,
+                           capture_output=True, text=True, check=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    medicoes = [rodar() for _ in range(args.repeticoes)]
+    print(f"{args.repeticoes} processos novos")
+    print(f"{'etapa':<12} {'mediana (s)':>12} {'mínimo (s)':>11}")
+    for etapa in ("import", "pagina", "treino"):
+        valores = [m[etapa] for m in medicoes]
+        print(f"{etapa:<12} {np.median(valores):>12.3f} {min(valores):>11.3f}")
+    total = [m["import"] + m["pagina"] for m in medicoes]
+    print(f"{'até 1ª resp.':<12} {np.median(total):>12.3f} {min(total):>11.3f}")
+    print(f"carregados após o import: {', '.join(medicoes[-1]['pesados']) or 'nenhum'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark de memória do treinar_modelo em um dataset grande.
+
+Gera `--linhas` x `--colunas` (mais um alvo, com alguns ausentes para a
+interpolação ter o que fazer) e roda o treinar_modelo num processo novo
+para cada precisão (PRECISAO_DADOS=float64 e float32), com o armazenamento
+em memória. Mostra o tempo e o pico de RSS acima do processo já com os
+DataFrames de entrada carregados (ou seja, só o que o treino aloca; Linux).
+
+Uso: python benchmarks/bench_memoria_treino.py [--linhas 10000000] [--colunas 5] [--precisoes float64 float32]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+
+MEDICAO = r"""
+import json, resource, sys, time
+import numpy as np, pandas as pd
+from ml.app2 import treinar_modelo
+
+linhas, colunas = int(sys.argv[1]), int(sys.argv[2])
+rng = np.random.default_rng(0)
+# Gera coluna a coluna para o pico da geração não passar do pico do treino
+X = pd.DataFrame({f"x{i}": rng.normal(size=linhas).cumsum() for i in range(colunas)})
+alvo = rng.normal(size=linhas)
+for coluna in X.columns:
+    alvo += rng.normal() * X[coluna].to_numpy()
+    X.loc[rng.integers(1, linhas, size=linhas // 1000), coluna] = np.nan
+y = pd.DataFrame({"alvo": alvo})
+del alvo
+entrada_mb = (X.memory_usage(index=False).sum() + y.memory_usage(index=False).sum()) / 1e6
+# RSS atual (o ru_maxrss é o pico do processo inteiro)
+with open("/proc/self/status") as status:
+    base = next(int(linha.split()[1]) for linha in status if linha.startswith("VmRSS:"))
+inicio = time.perf_counter()
+resultado = treinar_modelo(X, y, sessao="bench-memoria")
+tempo = time.perf_counter() - inicio
+pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"tempo": tempo, "pico_mb": (pico - base) / 1024, "entrada_mb": entrada_mb,
+                  "r2_medio": resultado["metricas"]["r2_medio"]}))
+"""
+
+
+def rodar(linhas, colunas, precisao):
+    ambiente = {**os.environ, "ARMAZENAMENTO": "memoria", "PRECISAO_DADOS": precisao}
+    processo = subprocess.run([sys.executable, "-c", MEDICAO, str(linhas), str(colunas)], cwd=BACKEND,
+                              env=ambiente, capture_output=True, text=True)
+    saida = (processo.stdout or processo.stderr).strip().splitlines()[-1]
+    return json.loads(saida)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=10_000_000)
+    parser.add_argument("--colunas", type=int, default=5)
+    parser.add_argument("--precisoes", nargs="+", default=["float64", "float32"])
+    args = parser.parse_args()
+
+    print(f"{args.linhas} linhas x {args.colunas} variáveis + 1 alvo")
+    print(f"{'precisão':<9} {'entrada (MB)':>13} {'tempo (s)':>10} {'pico RSS (MB)':>14} {'R² médio':>10}")
+    for precisao in args.precisoes:
+        medicao = rodar(args.linhas, args.colunas, precisao)
+        print(f"{precisao:<9} {medicao['entrada_mb']:>13.1f} {medicao['tempo']:>10.2f} "
+              f"{medicao['pico_mb']:>14.1f} {medicao['r2_medio']:>10.6f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark do treino com vários alvos: um treino por alvo vs. todos juntos.
+
+Gera um CSV sintético com `--colunas` variáveis e `--alvos` colunas alvo e
+mede com o armazenamento em memória (ARMAZENAMENTO=memoria):
+
+- separado: treinar_modelo chamado uma vez por alvo (o que antes exigia um
+  upload por alvo);
+- conjunto: treinar_modelo com y tendo uma coluna por alvo, que monta X^T X
+  uma vez e resolve todos os alvos juntos.
+
+O tempo do treino e o do gráfico (o de cada alvo no separado, o relatório
+conjunto no conjunto) são mostrados à parte.
+
+Uso: python benchmarks/bench_multialvo.py [--linhas 200000] [--colunas 20] [--alvos 10] [--repeticoes 3]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ["ARMAZENAMENTO"] = "memoria"
+
+from ml.app2 import treinar_modelo  # noqa: E402
+from ml.graficos import renderizar_figura  # noqa: E402
+
+SESSAO = "bench-multialvo"
+
+
+def gerar_dados(linhas, colunas, alvos, semente=0):
+    rng = np.random.default_rng(semente)
+    X = pd.DataFrame(np.cumsum(rng.normal(size=(linhas, colunas)), axis=0),
+                     columns=[f"x{i}" for i in range(colunas)])
+    Y = X.to_numpy() @ rng.normal(size=(colunas, alvos)) + rng.normal(size=(linhas, alvos))
+    return X, pd.DataFrame(Y, columns=[f"alvo{j}" for j in range(alvos)])
+
+
+def medir(funcao, repeticoes):
+    duracoes = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        duracoes.append(time.perf_counter() - inicio)
+    return float(np.median(duracoes))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=200_000)
+    parser.add_argument("--colunas", type=int, default=20)
+    parser.add_argument("--alvos", type=int, default=10)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    X, Y = gerar_dados(args.linhas, args.colunas, args.alvos)
+    separado = lambda: [treinar_modelo(X, Y[[alvo]], sessao=SESSAO) for alvo in Y.columns]  # noqa: E731
+    conjunto = lambda: treinar_modelo(X, Y, sessao=SESSAO)  # noqa: E731
+    um_alvo = lambda: treinar_modelo(X, Y.iloc[:, :1], sessao=SESSAO)  # noqa: E731
+
+    resultados_separado, resultado_conjunto = separado(), conjunto()
+    graficos_separado = lambda: [renderizar_figura(r["figura"]) for r in resultados_separado]  # noqa: E731
+    grafico_conjunto = lambda: renderizar_figura(resultado_conjunto["figura"])  # noqa: E731
+
+    print(f"{args.linhas} linhas x {args.colunas} variáveis, {args.alvos} alvos (mediana de {args.repeticoes})")
+    print(f"{'modo':<22} {'treino (s)':>11} {'gráfico (s)':>12}")
+    print(f"{'1 alvo':<22} {medir(um_alvo, args.repeticoes):>11.3f} {'':>12}")
+    print(f"{'separado (1 por alvo)':<22} {medir(separado, args.repeticoes):>11.3f} "
+          f"{medir(graficos_separado, 1):>12.3f}")
+    print(f"{'conjunto':<22} {medir(conjunto, args.repeticoes):>11.3f} {medir(grafico_conjunto, 1):>12.3f}")
+
+    # Mesmos modelos nos dois modos (a menos de arredondamento)
+    diferenca = max(
+        abs(a["r2"] - b["r2"])
+        for j, r in enumerate(resultados_separado)
+        for a, b in zip(r["metricas"]["folds"], resultado_conjunto["metricas"]["alvos"][f"alvo{j}"]["folds"])
+    )
+    print(f"maior diferença de R² entre os modos: {diferenca:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark da validação cruzada e da figura por fold em paralelo.
+
+Roda o motor de validação cruzada (ml/validacao.py) e o preparo das
+séries da figura de validação (ml/app2.py) com cada executor de
+ml/paralelo.py ("serial", "threads", "processos"), confere que os
+folds e o PNG gerado são idênticos aos do serial e mostra o speedup.
+O ganho depende do número de núcleos da máquina (os.cpu_count()).
+
+Uso: python benchmarks/bench_paralelo.py [--linhas 2000000] [--colunas 20] [--splits 5] [--workers 0]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ml import paralelo  # noqa: E402
+from ml.app2 import figura_validacao  # noqa: E402
+from ml.graficos import figura_para_bytes  # noqa: E402
+from ml.validacao import validacao_cruzada_incremental  # noqa: E402
+
+EXECUTORES = ["serial", "threads", "processos"]
+
+
+def gerar(linhas, colunas, semente=0):
+    rng = np.random.default_rng(semente)
+    X = rng.random((linhas, colunas))
+    y = np.cumsum(rng.normal(size=linhas)) + X @ rng.normal(size=colunas)
+    return X, y
+
+
+def rodar(X, y, splits, executor, workers):
+    paralelo.CV_EXECUTOR = executor
+    inicio = time.perf_counter()
+    cv = validacao_cruzada_incremental(X, y, splits, executor=executor, workers=workers)
+    t_cv = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    fig = figura_validacao(np.arange(len(X)), X, y, cv)
+    t_figura = time.perf_counter() - inicio
+    return t_cv, t_figura, cv, figura_para_bytes(fig, "png")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=2_000_000)
+    parser.add_argument("--colunas", type=int, default=20)
+    parser.add_argument("--splits", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+
+    X, y = gerar(args.linhas, args.colunas)
+    workers = paralelo.numero_workers(args.splits + 1, args.workers)
+    print(f"{args.linhas} linhas x {args.colunas} colunas, {args.splits} folds, "
+          f"{workers} workers ({os.cpu_count()} núcleos)")
+    print(f"{'executor':<10} {'CV (s)':>8} {'figura (s)':>11} {'total (s)':>10} {'speedup':>8}")
+    base = None
+    for executor in EXECUTORES:
+        t_cv, t_figura, cv, png = rodar(X, y, args.splits, executor, args.workers)
+        if base is None:
+            base = (t_cv + t_figura, cv, png)
+        else:
+            for a, b in zip(base[1]["folds"], cv["folds"]):
+                assert a["r2"] == b["r2"] and a["rmse"] == b["rmse"], (executor, a, b)
+            assert png == base[2], f"figura diferente com {executor}"
+        total = t_cv + t_figura
+        print(f"{executor:<10} {t_cv:>8.3f} {t_figura:>11.3f} {total:>10.3f} {base[0] / total:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
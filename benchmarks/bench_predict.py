@@ -0,0 +1,71 @@
+"""Benchmark da previsão online (/predict) com e sem micro-lote.
+
+Sobe N clientes concorrentes, cada um pedindo previsões de poucas linhas
+em sequência, contra o MicroLote (backend/microlote.py) com um pipeline
+escalonador + regressão de verdade. Compara a janela 0 (um predict por
+pedido) com janelas de alguns ms e mostra p50/p95/p99 e a vazão.
+
+Uso: python benchmarks/bench_predict.py [--clientes 64] [--pedidos 50] [--linhas 4] [--janelas 0,1,2,5]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from microlote import MicroLote, EstatisticasLatencia  # noqa: E402
+from ml.preprocessamento import EscalonadorMinMax, criar_pipeline  # noqa: E402
+
+
+def criar_modelo(colunas, semente=0):
+    rng = np.random.default_rng(semente)
+    X = pd.DataFrame(rng.random((1000, colunas)), columns=[f"x{i}" for i in range(colunas)])
+    y = X.to_numpy() @ rng.normal(size=colunas)
+    return criar_pipeline(EscalonadorMinMax(), LinearRegression()).fit(X, y), X.columns
+
+
+async def rodar(modelo, colunas, janela_ms, clientes, pedidos, linhas):
+    lote = MicroLote(lambda chave, X: modelo.predict(X), janela_ms=janela_ms)
+    latencias = EstatisticasLatencia(amostras=clientes * pedidos)
+    rng = np.random.default_rng(1)
+    chave = ("bench", tuple(colunas))
+
+    async def cliente():
+        for _ in range(pedidos):
+            X = pd.DataFrame(rng.random((linhas, len(colunas))), columns=colunas)
+            inicio = time.perf_counter()
+            await lote.executar(chave, X)
+            latencias.registrar(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(clientes)))
+    duracao = time.perf_counter() - inicio
+    return latencias.percentis(), clientes * pedidos / duracao, lote.estatisticas()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clientes", type=int, default=64)
+    parser.add_argument("--pedidos", type=int, default=50)
+    parser.add_argument("--linhas", type=int, default=4)
+    parser.add_argument("--colunas", type=int, default=10)
+    parser.add_argument("--janelas", default="0,1,2,5")
+    args = parser.parse_args()
+
+    modelo, colunas = criar_modelo(args.colunas)
+    print(f"{args.clientes} clientes x {args.pedidos} pedidos de {args.linhas} linhas")
+    print(f"{'janela (ms)':>11} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'pedidos/s':>10} {'linhas/lote':>12}")
+    for janela in (float(j) for j in args.janelas.split(",")):
+        p, vazao, lote = asyncio.run(rodar(modelo, colunas, janela, args.clientes, args.pedidos, args.linhas))
+        print(f"{janela:>11.1f} {p['p50_ms']:>9.2f} {p['p95_ms']:>9.2f} {p['p99_ms']:>9.2f} "
+              f"{vazao:>10.0f} {lote['linhas_por_lote'] or args.linhas:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark do registro de modelos: pickle do Pipeline vs. formato compacto.
+
+Treina um modelo com `--colunas` variáveis e `--alvos` alvos e compara:
+
+- pickle: o que era salvo no modelo_final.pkl (um Pipeline por alvo) e
+  desserializado com pickle.loads a cada troca de modelo;
+- compacto: o artefato do registro (modelo_compacto.ModeloLinear), aberto
+  com mmap a partir da pasta local, sem cópia;
+
+medindo o tamanho do artefato, o tempo para abrir e o predict de uma linha e
+de um lote. Também confere que as previsões são as mesmas do Pipeline.
+
+Uso: python benchmarks/bench_registro.py [--colunas 50] [--alvos 10] [--lote 10000] [--repeticoes 200]
+"""
+import argparse
+import mmap
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ml.modelo_compacto import ModeloLinear  # noqa: E402
+from ml.preprocessamento import EscalonadorMinMax, criar_pipeline  # noqa: E402
+from ml.validacao import criar_regressao  # noqa: E402
+
+
+def medir(funcao, repeticoes):
+    duracoes = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        duracoes.append(time.perf_counter() - inicio)
+    return float(np.median(duracoes)) * 1e6
+
+
+def abrir_mmap(caminho):
+    with open(caminho, "rb") as arquivo:
+        return ModeloLinear.de_buffer(mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--colunas", type=int, default=50)
+    parser.add_argument("--alvos", type=int, default=10)
+    parser.add_argument("--lote", type=int, default=10_000)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    colunas = [f"x{i}" for i in range(args.colunas)]
+    alvos = [f"alvo{j}" for j in range(args.alvos)]
+    X = pd.DataFrame(rng.normal(size=(args.lote, args.colunas)), columns=colunas)
+    escalonador = EscalonadorMinMax().fit(X)
+    coefs, interceptos = rng.normal(size=(args.alvos, args.colunas)), rng.normal(size=args.alvos)
+
+    pipelines = {alvo: criar_pipeline(escalonador, criar_regressao(coefs[j], interceptos[j], colunas))
+                 for j, alvo in enumerate(alvos)}
+    dados_pickle = pickle.dumps(pipelines)
+    compacto = ModeloLinear.de_escalonador(escalonador, coefs, interceptos, colunas, alvos)
+    dados_compacto = compacto.para_bytes()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = Path(pasta) / "modelo.lin"
+        caminho.write_bytes(dados_compacto)
+        modelo_mmap = abrir_mmap(caminho)
+
+        pipeline = pipelines[alvos[0]]
+        uma_linha = X.iloc[:1]
+        diferenca = max(
+            float(np.max(np.abs(pipelines[alvo].predict(X) - modelo_mmap.predict(X, alvo=alvo))))
+            for alvo in alvos
+        )
+
+        print(f"{args.colunas} variáveis, {args.alvos} alvos, lote de {args.lote} linhas "
+              f"(mediana de {args.repeticoes}, em µs)")
+        print(f"{'formato':<10} {'tamanho (B)':>12} {'abrir':>10} {'1 linha':>10} {'lote':>10}")
+        print(f"{'pickle':<10} {len(dados_pickle):>12} "
+              f"{medir(lambda: pickle.loads(dados_pickle), args.repeticoes):>10.1f} "
+              f"{medir(lambda: pipeline.predict(uma_linha), args.repeticoes):>10.1f} "
+              f"{medir(lambda: pipeline.predict(X), args.repeticoes):>10.1f}")
+        print(f"{'compacto':<10} {len(dados_compacto):>12} "
+              f"{medir(lambda: abrir_mmap(caminho), args.repeticoes):>10.1f} "
+              f"{medir(lambda: modelo_mmap.predict(uma_linha), args.repeticoes):>10.1f} "
+              f"{medir(lambda: modelo_mmap.predict(X), args.repeticoes):>10.1f}")
+        print(f"maior diferença entre as previsões: {diferenca:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,79 @@
 // URL do backend - ajuste automático para produção
 const BACKEND_URL = window.location.origin;
 
+// ID da sessão (workspace) desta aba: separa os arquivos de cada usuário no Blob
+function obterSessao() {
+  let sessao = sessionStorage.getItem("sessao_id");
+  if (!sessao) {
+    sessao = (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`)
+      .replace(/[^A-Za-z0-9_-]/g, "");
+    sessionStorage.setItem("sessao_id", sessao);
+  }
+  return sessao;
+}
+const CABECALHOS_SESSAO = { "X-Sessao-Id": obterSessao() };
+
+// Intervalo entre as consultas de status do job (ms)
+const INTERVALO_STATUS_JOB = 1000;
+
+const esperar = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Extrai as mensagens de erro das respostas do backend
+function extrairErros(data) {
+  if (data.mensagens) return data.mensagens;
+  if (data.detail?.mensagens) return data.detail.mensagens;
+  if (typeof data.detail === "string") return [data.detail];
+  if (data.error) return [data.error];
+  return [data.message || "Erro desconhecido"];
+}
+
+// Consulta o job até ele terminar, mostrando o progresso na mensagem
+async function acompanharJob(statusUrl, mensagem) {
+  while (true) {
+    const res = await fetch(`${BACKEND_URL}${statusUrl}`, { headers: CABECALHOS_SESSAO });
+    const job = await res.json();
+    if (!res.ok) return { ok: false, data: job };
+    if (job.status === "concluido") return { ok: true, data: job.resultado };
+    if (job.status === "erro") return { ok: false, data: job.erro };
+
+    const pct = Math.round((job.progresso || 0) * 100);
+    mensagem.textContent = `Processando... ${pct}% — ${job.etapa}`;
+    await esperar(INTERVALO_STATUS_JOB);
+  }
+}
+
+// Resumo das métricas que o job devolve antes do gráfico ficar pronto
+function resumirMetricas(metricas) {
+  if (!metricas) return "";
+  if (metricas.resumo !== undefined) {
+    const { n_alvos, r2_medio, melhor_alvo, pior_alvo } = metricas.resumo;
+    return `${n_alvos} alvos | R² médio: ${r2_medio.toFixed(4)} | melhor: ${melhor_alvo} | pior: ${pior_alvo}`;
+  }
+  if (metricas.r2_medio !== undefined) {
+    return `R² médio: ${metricas.r2_medio.toFixed(4)} | RMSE médio: ${metricas.rmse_medio.toFixed(2)}`;
+  }
+  if (metricas.r2 !== undefined) {
+    return `R²: ${metricas.r2.toFixed(4)} | RMSE: ${metricas.rmse.toFixed(2)}`;
+  }
+  return `${metricas.linhas} linhas previstas`;
+}
+
+// O gráfico é gerado depois das métricas: consulta o job até ele sair
+async function aguardarGrafico(statusUrl, graficoImg) {
+  while (true) {
+    await esperar(INTERVALO_STATUS_JOB);
+    const res = await fetch(`${BACKEND_URL}${statusUrl}`, { headers: CABECALHOS_SESSAO });
+    if (!res.ok) return;
+    const job = await res.json();
+    if (job.pendentes > 0) continue;
+    if (job.resultado?.grafico_url) {
+      graficoImg.src = job.resultado.grafico_url;
+      graficoImg.style.display = "block";
+    }
+    return;
+  }
+}
+
 async function enviarArquivo(url, fileInputId, campoInputId, graficoId, mensagemId, proximaEtapaId) {
   const fileInput = document.getElementById(fileInputId);
   const campo = campoInputId ? document.getElementById(campoInputId).value : null;
@@ -10,15 +83,15 @@ async function enviarArquivo(url, fileInputId, campoInputId, graficoId, mensagem
   if (!fileInput.files.length) {
     mensagem.textContent = "Selecione um arquivo!";
     mensagem.style.color = "red";
-    return;
+    return false;
   }
   if (campoInputId && !campo.trim()) {
     mensagem.textContent = "Informe o campo alvo (y)!";
     mensagem.style.color = "red";
-    return;
+    return false;
   }
 
-  mensagem.textContent = "Processando...";
+  mensagem.textContent = "Enviando arquivo...";
   mensagem.style.color = "blue";
   graficoImg.style.display = "none";
 
@@ -27,11 +100,13 @@ async function enviarArquivo(url, fileInputId, campoInputId, graficoId, mensagem
   if (campoInputId) formData.append("campo", campo);
 
   try {
+    // O timeout vale só para o envio; o processamento é acompanhado pelo job
     const controller = new AbortController();
     const timeoutId = setTimeout(() => controller.abort(), 120000);
 
     const res = await fetch(url, {
       method: "POST",
+      headers: CABECALHOS_SESSAO,
       body: formData,
       signal: controller.signal
     });
@@ -44,40 +119,47 @@ async function enviarArquivo(url, fileInputId, campoInputId, graficoId, mensagem
       mensagem.textContent = "Resposta inválida do servidor.";
       mensagem.style.color = "red";
       console.error("Invalid JSON response", e);
-      return;
+      return false;
+    }
+
+    let ok = res.ok;
+    const statusUrl = data.status_url;
+    if (ok && statusUrl) {
+      mensagem.textContent = "Processando...";
+      ({ ok, data } = await acompanharJob(statusUrl, mensagem));
     }
 
-    if (!res.ok) {
-      let erros = [];
-      if (data.mensagens) erros = data.mensagens;
-      else if (data.detail?.mensagens) erros = data.detail.mensagens;
-      else if (data.error) erros = [data.error];
-      else erros = [data.message || "Erro desconhecido"];
-      mensagem.textContent = "Erro: " + erros.join(", ");
+    if (!ok) {
+      mensagem.textContent = "Erro: " + extrairErros(data).join(", ");
       mensagem.style.color = "red";
-      return;
+      return false;
     }
 
     if (data.grafico_url) {
       graficoImg.src = data.grafico_url;
       graficoImg.style.display = "block";
+    } else if (data.posteriores?.grafico_url?.status === "pendente") {
+      aguardarGrafico(statusUrl, graficoImg);
     }
 
-    mensagem.textContent = data.message || "Sucesso!";
+    const resumo = resumirMetricas(data.metricas);
+    mensagem.textContent = (data.message || "Sucesso!") + (resumo ? ` ${resumo}` : "");
     mensagem.style.color = "green";
 
     if (proximaEtapaId) {
       document.getElementById(proximaEtapaId).style.display = "block";
     }
+    return true;
 
   } catch (err) {
     console.error(err);
     mensagem.style.color = "red";
     if (err.name === "AbortError") {
-      mensagem.textContent = "Tempo de processamento excedido (2 minutos). Tente novamente.";
+      mensagem.textContent = "Tempo de envio excedido (2 minutos). Tente novamente.";
     } else {
       mensagem.textContent = "Erro ao enviar ou processar o arquivo: " + (err.message || err);
     }
+    return false;
   }
 }
 
@@ -89,9 +171,9 @@ function avaliarModelo() {
   enviarArquivo(`${BACKEND_URL}/avaliar/`, "file_avaliacao", "campo_avaliacao", "grafico_avaliacao", "mensagem_avaliacao", "etapa3");
 }
 
-function preverNovosDados() {
-  enviarArquivo(`${BACKEND_URL}/prever/`, "file_previsao", null, "grafico_previsao", "mensagem_previsao", null);
-  buscarDadosPrevisao();
+async function preverNovosDados() {
+  const ok = await enviarArquivo(`${BACKEND_URL}/prever/`, "file_previsao", null, "grafico_previsao", "mensagem_previsao", null);
+  if (ok) buscarDadosPrevisao();
 }
 
 // Variável global para armazenar os dados de previsão
@@ -100,7 +182,7 @@ let dadosPrevisao = null;
 // FUNÇÃO PARA BUSCAR DADOS CSV DA PREVISÃO
 async function buscarDadosPrevisao() {
   try {
-    const response = await fetch(`${BACKEND_URL}/prever/csv/`);
+    const response = await fetch(`${BACKEND_URL}/prever/csv/`, { headers: CABECALHOS_SESSAO });
     if (response.ok) {
       const csvText = await response.text();
       dadosPrevisao = csvText;